@@ -1,10 +1,16 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
 from rest_framework.exceptions import AuthenticationFailed
 
+from ..blacklist import BlacklistRefreshToken
+from .services import get_user_by_email
+
 
 class RegistrationSerializer(serializers.ModelSerializer):
     """Serializer for user registration.
@@ -61,7 +67,7 @@ class RegistrationSerializer(serializers.ModelSerializer):
             str: Normalized email (lowercase, no leading/trailing spaces).
         """
         value = value.strip().lower()
-        if User.objects.filter(email__iexact=value).exists():
+        if get_user_by_email(value) is not None:
             raise serializers.ValidationError("Email already exists")
         return value
 
@@ -80,7 +86,12 @@ class RegistrationSerializer(serializers.ModelSerializer):
         email = validated_data["email"]
         user = User(email=email, username=email, is_active=False)
         user.set_password(validated_data["password"])
-        user.save()
+        try:
+            with transaction.atomic():
+                user.save()
+        except IntegrityError:
+            # A concurrent registration won the unique email index
+            raise serializers.ValidationError({"email": ["Email already exists"]})
         return user
 
 
@@ -94,6 +105,7 @@ class LoginSerializer(TokenObtainPairSerializer):
 
     # Use email instead of username for authentication
     username_field = "email"
+    token_class = BlacklistRefreshToken
 
     def validate(self, attrs):
         """Validate user credentials.
@@ -116,10 +128,8 @@ class LoginSerializer(TokenObtainPairSerializer):
         email = attrs.get("email")
         password = attrs.get("password")
 
-        User = get_user_model()
-        try:
-            user = User.objects.get(email__iexact=email)
-        except User.DoesNotExist:
+        user = get_user_by_email(email)
+        if user is None:
             raise AuthenticationFailed(
                 "No active account found with the given credentials"
             )
@@ -143,6 +153,12 @@ class LoginSerializer(TokenObtainPairSerializer):
         }
 
 
+class CookieTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh serializer that checks the Redis token blacklist."""
+
+    token_class = BlacklistRefreshToken
+
+
 class PasswordResetRequestSerializer(serializers.Serializer):
     email = serializers.EmailField()
 
@@ -4,6 +4,9 @@ from django.urls import reverse
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 from django.contrib.auth.tokens import default_token_generator
+from django.contrib.auth import get_user_model
+
+from ..tasks import queue_email
 
 
 def absolute_url(request, path: str) -> str:
@@ -19,19 +22,38 @@ def absolute_url(request, path: str) -> str:
     return request.build_absolute_uri(path)
 
 
-def send_activation_email(user, request):
-    """Send an account activation email to a user.
+def get_user_by_email(email: str):
+    """Look up a user by email, ignoring case.
+
+    `email__iexact` compiles to `UPPER(email) = UPPER(%s)`, which is served
+    by the `auth_user_email_upper_idx` expression index on Postgres. A
+    unique index on the same expression allows one account per address;
+    ordering by pk only decides between legacy rows on other backends.
+
+    Args:
+        email (str): Email address as entered by the user.
+
+    Returns:
+        User | None: The matching user, or None if no account exists.
+    """
+    users = (
+        get_user_model().objects.filter(email__iexact=email.strip()).order_by("pk")[:1]
+    )
+    return users[0] if users else None
+
+
+def build_activation_email(user):
+    """Build an account activation email for a user.
 
     - Generates a unique activation token tied to the user.
     - Builds an activation URL containing the token and user ID.
-    - Sends a multi-part email (plain text + HTML) with the link.
+    - Renders a multi-part email (plain text + HTML) with the link.
 
     Args:
         user (User): The user instance to send the activation link to.
-        request (Request): DRF/Django request object used for absolute URL generation.
 
     Returns:
-        str: The generated activation token (useful for testing/debugging).
+        tuple: (EmailMultiAlternatives, str) the message and the activation token.
     """
     uidb64 = urlsafe_base64_encode(force_bytes(user.pk))
     token = default_token_generator.make_token(user)
@@ -126,25 +148,52 @@ def send_activation_email(user, request):
         to=[user.email],
     )
     msg.attach_alternative(html, "text/html")
+    return msg, token
+
+
+def send_activation_email(user, request):
+    """Send an account activation email to a user immediately.
+
+    Args:
+        user (User): The user instance to send the activation link to.
+        request (Request): DRF/Django request object used for absolute URL generation.
+
+    Returns:
+        str: The generated activation token (useful for testing/debugging).
+    """
+    msg, token = build_activation_email(user)
     msg.send(fail_silently=False)
+    return token
+
+
+def queue_activation_email(user, request):
+    """Queue an account activation email for background delivery.
+
+    Args:
+        user (User): The user instance to send the activation link to.
+        request (Request): DRF/Django request object used for absolute URL generation.
 
+    Returns:
+        str: The generated activation token (useful for testing/debugging).
+    """
+    msg, token = build_activation_email(user)
+    queue_email(msg)
     return token
 
 
-def send_password_reset_email(user, request):
-    """Send a password reset email to a user.
+def build_password_reset_email(user):
+    """Build a password reset email for a user.
 
     - Generates a password reset token tied to the user.
     - Builds a reset URL containing the token and user ID.
-    - Sends a multi-part email (plain text + HTML) with the link.
+    - Renders a multi-part email (plain text + HTML) with the link.
     - The link is valid only for a limited time (token expiration).
 
     Args:
         user (User): The user instance requesting the reset.
-        request (Request): DRF/Django request object used for absolute URL generation.
 
     Returns:
-        None
+        EmailMultiAlternatives: The rendered message.
     """
     uidb64 = urlsafe_base64_encode(force_bytes(user.pk))
     token = default_token_generator.make_token(user)
@@ -244,4 +293,30 @@ def send_password_reset_email(user, request):
         to=[user.email],
     )
     msg.attach_alternative(html, "text/html")
-    msg.send(fail_silently=True)
+    return msg
+
+
+def send_password_reset_email(user, request):
+    """Send a password reset email to a user immediately.
+
+    Args:
+        user (User): The user instance requesting the reset.
+        request (Request): DRF/Django request object used for absolute URL generation.
+
+    Returns:
+        None
+    """
+    build_password_reset_email(user).send(fail_silently=True)
+
+
+def queue_password_reset_email(user, request):
+    """Queue a password reset email for background delivery.
+
+    Args:
+        user (User): The user instance requesting the reset.
+        request (Request): DRF/Django request object used for absolute URL generation.
+
+    Returns:
+        None
+    """
+    queue_email(build_password_reset_email(user), fail_silently=True)
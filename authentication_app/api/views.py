@@ -1,8 +1,10 @@
+import logging
+
 from django.contrib.auth.models import User
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_decode
 from django.utils.encoding import force_str
-from rest_framework_simplejwt.tokens import RefreshToken, TokenError
+from rest_framework_simplejwt.tokens import TokenError
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
@@ -10,16 +12,27 @@ from rest_framework import status
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import default_token_generator as token_generator
 from django.conf import settings
+from django.db import transaction
+from redis.exceptions import RedisError
 from .serializers import (
     RegistrationSerializer,
     LoginSerializer,
+    CookieTokenRefreshSerializer,
     PasswordResetConfirmSerializer,
     PasswordResetRequestSerializer,
 )
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from .services import send_activation_email, send_password_reset_email
+from ..blacklist import BlacklistRefreshToken
+from ..tokens import revoke_user_tokens
+from .services import (
+    get_user_by_email,
+    queue_activation_email,
+    queue_password_reset_email,
+)
 from django.shortcuts import redirect
 
+logger = logging.getLogger(__name__)
+
 User = get_user_model()
 
 
@@ -28,7 +41,7 @@ class RegistrationView(APIView):
 
     - Accepts email and password (via RegistrationSerializer).
     - Creates a new inactive user account.
-    - Sends an activation email with a token link.
+    - Queues an activation email with a token link (sent by a worker).
     - Returns the new user’s ID and email, along with the activation token.
 
     Permissions:
@@ -54,8 +67,8 @@ class RegistrationView(APIView):
 
         user = serializer.save()
 
-        # Send activation email and return token for testing/debugging
-        token = send_activation_email(user, request)
+        # Queue activation email and return token for testing/debugging
+        token = queue_activation_email(user, request)
 
         return Response(
             {
@@ -228,7 +241,7 @@ class LogoutAndBlacklistView(APIView):
             )
 
         try:
-            RefreshToken(refresh_cookie).blacklist()
+            BlacklistRefreshToken(refresh_cookie).blacklist()
         except TokenError:
             return Response(
                 {"detail": "Refresh-Token expired."},
@@ -264,6 +277,8 @@ class CookieTokenRefreshView(TokenRefreshView):
           since refresh token is taken from cookies.
     """
 
+    serializer_class = CookieTokenRefreshSerializer
+
     def post(self, request, *args, **kwargs):
         """Handle POST requests to refresh the access token.
 
@@ -319,7 +334,7 @@ class PasswordResetRequestView(APIView):
     """API endpoint to request a password reset.
 
     - Accepts an email address from the user.
-    - If a matching account exists, sends a password reset email with a token link.
+    - If a matching account exists, queues a password reset email with a token link.
     - If no account exists, still responds with success (to prevent email enumeration).
     - Always returns HTTP 200 to avoid leaking account existence.
 
@@ -342,20 +357,16 @@ class PasswordResetRequestView(APIView):
         ser = PasswordResetRequestSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
 
-        email = ser.validated_data["email"]
-        User = get_user_model()
-
-        try:
-            user = User.objects.get(email__iexact=email)
-        except User.DoesNotExist:
+        user = get_user_by_email(ser.validated_data["email"])
+        if user is None:
             # Prevents leaking whether the email exists in the system
             return Response(
                 {"detail": "An email has been sent to reset your password."},
                 status=status.HTTP_200_OK,
             )
 
-        # Send password reset email with tokenized link
-        send_password_reset_email(user, request)
+        # Queue password reset email with tokenized link
+        queue_password_reset_email(user, request)
 
         return Response(
             {"detail": "An email has been sent to reset your password."},
@@ -368,7 +379,8 @@ class PasswordResetConfirmView(APIView):
 
     - Validates the reset link (UID + token).
     - Allows the user to set a new password.
-    - Invalidates all existing JWT tokens for security.
+    - Invalidates all existing JWT tokens for security; if they cannot be
+      revoked, the password is left unchanged and 503 is returned.
     - Clears authentication cookies to force fresh login.
 
     Permissions:
@@ -408,22 +420,21 @@ class PasswordResetConfirmView(APIView):
         ser = PasswordResetConfirmSerializer(data=request.data, context={"user": user})
         ser.is_valid(raise_exception=True)
 
-        user.set_password(ser.validated_data["new_password"])
-        user.save(update_fields=["password"])
-
-        # Invalidate all existing JWT tokens for the user (force logout everywhere)
+        # Invalidate all existing JWT tokens for the user (force logout
+        # everywhere). If that fails the password stays unchanged, so the
+        # reset link remains valid and the user can simply try again.
         try:
-            from rest_framework_simplejwt.token_blacklist.models import (
-                OutstandingToken,
-                BlacklistedToken,
+            with transaction.atomic():
+                user.set_password(ser.validated_data["new_password"])
+                user.save(update_fields=["password"])
+                revoke_user_tokens(user)
+        except RedisError:
+            logger.error("could not revoke tokens on password reset", exc_info=True)
+            return Response(
+                {"detail": "Password could not be reset, please try again."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
             )
 
-            for t in OutstandingToken.objects.filter(user=user):
-                BlacklistedToken.objects.get_or_create(token=t)
-        except Exception:
-            # Fail silently if token blacklist app is not enabled
-            pass
-
         resp = Response(
             {"detail": "Password has been reset successfully."},
             status=status.HTTP_200_OK,
@@ -0,0 +1,185 @@
+import hashlib
+import logging
+import time
+
+import django_rq
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from redis.exceptions import RedisError
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+# Redis layout of the refresh-token blacklist:
+# - revoked: one key per revoked JTI, expiring with the token
+# - bloom: one Bloom filter bitmap per expiry day of the revoked tokens
+# - version: counter bumped after every change of a bitmap
+REVOKED_KEY = "videoflix:jwt:revoked:{jti}"
+BLOOM_KEY = "videoflix:jwt:bloom:{bucket}"
+BLOOM_VERSION_KEY = "videoflix:jwt:bloom:{bucket}:version"
+
+BLOOM_HASHES = 7
+BUCKET_SECONDS = 24 * 60 * 60
+
+
+def bitmap_has(bitmap: bytes, position: int) -> bool:
+    """Test a bit in a Redis bitmap (bit 0 is the high bit of byte 0)."""
+    index = position >> 3
+    return index < len(bitmap) and bool(bitmap[index] & (0x80 >> (position & 7)))
+
+
+def bloom_positions(jti: str, size: int, hashes: int = BLOOM_HASHES) -> list:
+    """Return the bit positions of a JTI in a Bloom filter of `size` bits."""
+    digest = hashlib.blake2b(jti.encode(), digest_size=4 * hashes).digest()
+    return [
+        int.from_bytes(digest[i : i + 4], "big") % size for i in range(0, 4 * hashes, 4)
+    ]
+
+
+class RedisTokenBlacklist:
+    """Refresh-token blacklist stored in Redis.
+
+    Revoked JTIs are stored as keys that expire together with the token,
+    plus a Bloom filter bitmap per expiry day. Each process keeps a copy
+    of the bitmaps, so the common case (token not revoked) is answered
+    without a network round trip; only Bloom hits are confirmed against
+    Redis. Every JWT_BLOOM_REFRESH_SECONDS the copy is checked against a
+    version counter, and the bitmap is only downloaded again if it
+    changed. A revocation made by another process therefore becomes
+    visible here within JWT_BLOOM_REFRESH_SECONDS.
+
+    While Redis is unreachable the copy is still used, until it is older
+    than the refresh token lifetime; then checks fail.
+    """
+
+    def __init__(self):
+        # bucket -> (bitmap, version, time of the last successful sync)
+        self._bitmaps = {}
+
+    def _bitmap(self, conn, bucket: int) -> bytes:
+        now = time.monotonic()
+        cached = self._bitmaps.get(bucket)
+        if cached and now - cached[2] < settings.JWT_BLOOM_REFRESH_SECONDS:
+            return cached[0]
+
+        version_key = BLOOM_VERSION_KEY.format(bucket=bucket)
+        try:
+            version = conn.get(version_key)
+            if cached and version == cached[1]:
+                bitmap = cached[0]
+            else:
+                # Atomic, so the bitmap is at least as new as the version
+                pipe = conn.pipeline(transaction=True)
+                pipe.get(BLOOM_KEY.format(bucket=bucket))
+                pipe.get(version_key)
+                bitmap, version = pipe.execute()
+                bitmap = bitmap or b""
+        except RedisError:
+            lifetime = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+            if cached and now - cached[2] < lifetime:
+                logger.warning("token blacklist unavailable, using cached copy")
+                return cached[0]
+            raise
+
+        self._bitmaps[bucket] = (bitmap, version, now)
+        return bitmap
+
+    def is_revoked(self, jti: str, exp: int) -> bool:
+        """Return True if the token with this JTI and expiry was revoked.
+
+        Raises:
+            RedisError: If Redis cannot be reached and the answer is not
+                known from a recent enough copy of the Bloom filter.
+        """
+        conn = django_rq.get_connection("default")
+        bitmap = self._bitmap(conn, exp // BUCKET_SECONDS)
+        positions = bloom_positions(jti, settings.JWT_BLOOM_BITS)
+        if not all(bitmap_has(bitmap, p) for p in positions):
+            return False
+        return bool(conn.exists(REVOKED_KEY.format(jti=jti)))
+
+    def revoke(self, jti: str, exp: int) -> None:
+        """Revoke a token until it expires.
+
+        Raises:
+            RedisError: If Redis cannot be reached.
+        """
+        self.revoke_many([(jti, exp)])
+
+    def revoke_many(self, tokens) -> None:
+        """Revoke several tokens in one Redis round trip.
+
+        Args:
+            tokens (Iterable[tuple[str, int]]): (jti, exp) pairs.
+
+        Raises:
+            RedisError: If Redis cannot be reached.
+        """
+        now = time.time()
+        buckets = set()
+        pipe = django_rq.get_connection("default").pipeline(transaction=False)
+        for jti, exp in tokens:
+            if exp <= now:
+                continue  # already rejected by the expiry check
+            bucket = exp // BUCKET_SECONDS
+            bloom_key = BLOOM_KEY.format(bucket=bucket)
+            pipe.set(REVOKED_KEY.format(jti=jti), 1, ex=max(int(exp - now), 1))
+            for position in bloom_positions(jti, settings.JWT_BLOOM_BITS):
+                pipe.setbit(bloom_key, position, 1)
+            buckets.add(bucket)
+        # Versions are bumped after the bits are set, see `_bitmap`
+        for bucket in buckets:
+            expires = (bucket + 1) * BUCKET_SECONDS + 60
+            version_key = BLOOM_VERSION_KEY.format(bucket=bucket)
+            pipe.expireat(BLOOM_KEY.format(bucket=bucket), expires)
+            pipe.incr(version_key)
+            pipe.expireat(version_key, expires)
+        pipe.execute()
+
+        # Make the revocations visible to this process immediately
+        for bucket in buckets:
+            self._bitmaps.pop(bucket, None)
+
+
+token_blacklist = RedisTokenBlacklist()
+
+
+class BlacklistRefreshToken(RefreshToken):
+    """Refresh token checked against the Redis blacklist.
+
+    With JWT_REDIS_BLACKLIST disabled it behaves exactly like simplejwt's
+    RefreshToken (database blacklist). When enabled, the database tables
+    are only written as a durable mirror (JWT_BLACKLIST_DB_MIRROR) and are
+    consulted only if Redis is unavailable. Without the mirror, tokens are
+    rejected while Redis is down (fail closed).
+    """
+
+    def check_blacklist(self) -> None:
+        if not settings.JWT_REDIS_BLACKLIST:
+            return super().check_blacklist()
+
+        try:
+            revoked = token_blacklist.is_revoked(
+                self.payload[api_settings.JTI_CLAIM], self.payload["exp"]
+            )
+        except RedisError:
+            logger.warning("token blacklist unavailable", exc_info=True)
+            if settings.JWT_BLACKLIST_DB_MIRROR:
+                return super().check_blacklist()
+            raise TokenError(_("Token blacklist unavailable"))
+
+        if revoked:
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        if not settings.JWT_REDIS_BLACKLIST:
+            return super().blacklist()
+
+        token_blacklist.revoke(
+            self.payload[api_settings.JTI_CLAIM], self.payload["exp"]
+        )
+        if settings.JWT_BLACKLIST_DB_MIRROR:
+            return super().blacklist()
+        return None
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:10
+
+from django.db import migrations
+
+INDEX_NAME = "auth_user_email_upper_idx"
+
+
+def create_index(apps, schema_editor):
+    """Index UPPER(email), the expression `email__iexact` compiles to.
+
+    Built concurrently on Postgres so logins are not blocked while the
+    index is created on a large user table.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} "
+        "ON auth_user (UPPER(email))"
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
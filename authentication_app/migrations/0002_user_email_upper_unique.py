@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:20
+
+from django.db import migrations
+
+INDEX_NAME = "auth_user_email_upper_uniq"
+
+
+def create_index(apps, schema_editor):
+    """Allow each email address only once, ignoring case.
+
+    Blank emails (e.g. superusers created without one) are excluded. The
+    lookup index from 0001 stays: the planner cannot use this partial
+    index for `UPPER(email) = UPPER(%s)`.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT UPPER(email) FROM auth_user WHERE email <> '' "
+            "GROUP BY UPPER(email) HAVING COUNT(*) > 1 LIMIT 10"
+        )
+        duplicates = [row[0] for row in cursor.fetchall()]
+    if duplicates:
+        raise RuntimeError(
+            "Merge or rename the accounts sharing these emails first: "
+            + ", ".join(duplicates)
+        )
+    schema_editor.execute(
+        f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} "
+        "ON auth_user (UPPER(email)) WHERE email <> ''"
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("authentication_app", "0001_user_email_upper_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
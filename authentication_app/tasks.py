@@ -0,0 +1,172 @@
+import json
+import logging
+import smtplib
+import time
+import uuid
+
+import django_rq
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from redis.exceptions import RedisError
+from rq import Retry
+
+logger = logging.getLogger(__name__)
+
+# Redis layout of the mail queue:
+# - outbox: list of JSON-encoded messages waiting for delivery
+# - retry: sorted set of failed messages, score = earliest next attempt
+# - processing: messages taken by the running drain, until sent or retried
+# - lock: token of the running drain; only one drains at a time
+OUTBOX_KEY = "videoflix:mail:outbox"
+RETRY_KEY = "videoflix:mail:retry"
+PROCESSING_KEY = "videoflix:mail:processing"
+DRAIN_LOCK_KEY = "videoflix:mail:lock"
+
+# Seconds a drain holds the lock without renewing it (once per batch)
+DRAIN_LOCK_TTL = 300
+
+# Seconds to wait before the n-th retry of a single message
+RETRY_BACKOFF = [30, 120, 600, 1800]
+
+# Errors that concern a single message; smtplib resets the transaction,
+# so the session can go on with the next message
+MESSAGE_ERRORS = (
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+    smtplib.SMTPDataError,
+)
+
+
+def _serialize(msg: EmailMultiAlternatives, attempts: int = 0) -> str:
+    return json.dumps(
+        {
+            "subject": msg.subject,
+            "body": msg.body,
+            "from_email": msg.from_email,
+            "to": msg.to,
+            "alternatives": [list(alt) for alt in msg.alternatives],
+            "attempts": attempts,
+        }
+    )
+
+
+def _deserialize(raw: bytes, connection) -> tuple:
+    data = json.loads(raw)
+    msg = EmailMultiAlternatives(
+        subject=data["subject"],
+        body=data["body"],
+        from_email=data["from_email"],
+        to=data["to"],
+        connection=connection,
+    )
+    for content, mimetype in data["alternatives"]:
+        msg.attach_alternative(content, mimetype)
+    return msg, data["attempts"]
+
+
+def queue_email(msg: EmailMultiAlternatives, fail_silently: bool = False) -> None:
+    """Queue an email for background delivery and return immediately.
+
+    The message is pushed to the Redis outbox and a drain job is enqueued.
+    With EMAIL_QUEUE_ENABLED off (e.g. in tests), or if Redis is not
+    reachable, the message is sent inline instead.
+
+    Args:
+        msg (EmailMultiAlternatives): Fully rendered message.
+        fail_silently (bool): Passed to `send()` when sending inline.
+    """
+    if settings.EMAIL_QUEUE_ENABLED:
+        try:
+            django_rq.get_connection("default").rpush(OUTBOX_KEY, _serialize(msg))
+            django_rq.get_queue("default", autocommit=True).enqueue(
+                deliver_queued_emails,
+                retry=Retry(max=5, interval=[10, 30, 60, 120, 300]),
+            )
+            return
+        except RedisError:
+            logger.warning("mail queue unavailable, sending inline", exc_info=True)
+
+    msg.send(fail_silently=fail_silently)
+
+
+def _promote_due_retries(conn) -> None:
+    """Move failed messages whose backoff has elapsed back to the outbox."""
+    due = conn.zrangebyscore(RETRY_KEY, 0, time.time())
+    for raw in due:
+        if conn.zrem(RETRY_KEY, raw):
+            conn.rpush(OUTBOX_KEY, raw)
+
+
+def deliver_queued_emails(batch_size: int | None = None) -> int:
+    """Drain the outbox over a single, reused SMTP connection.
+
+    Returns without connecting if the outbox is empty or another drain is
+    running. Otherwise the connection is opened once and messages are
+    moved in batches (LMOVE) to a processing list and sent over it; each
+    leaves the list once sent or re-scheduled. Messages a crashed drain
+    left there are sent again first, so delivery is at-least-once.
+
+    A message that fails is re-scheduled with backoff (RETRY_BACKOFF) and
+    dropped after the last attempt. The connection is only reopened after
+    connection errors, not when a recipient or the data was refused.
+    If the SMTP server cannot be reached, nothing is taken and the job
+    fails, so RQ retries it later.
+
+    Args:
+        batch_size (int, optional): Messages per batch.
+            Defaults to EMAIL_QUEUE_BATCH_SIZE.
+
+    Returns:
+        int: Number of messages sent.
+    """
+    batch_size = batch_size or settings.EMAIL_QUEUE_BATCH_SIZE
+    conn = django_rq.get_connection("default")
+    _promote_due_retries(conn)
+    if not conn.llen(OUTBOX_KEY) and not conn.llen(PROCESSING_KEY):
+        return 0
+
+    token = uuid.uuid4().hex
+    if not conn.set(DRAIN_LOCK_KEY, token, nx=True, ex=DRAIN_LOCK_TTL):
+        return 0
+    try:
+        while conn.lmove(PROCESSING_KEY, OUTBOX_KEY, "RIGHT", "LEFT"):
+            pass
+        return _drain(conn, batch_size)
+    finally:
+        if conn.get(DRAIN_LOCK_KEY) == token.encode():
+            conn.delete(DRAIN_LOCK_KEY)
+
+
+def _drain(conn, batch_size: int) -> int:
+    sent = 0
+    with get_connection(fail_silently=False) as smtp:
+        while True:
+            conn.expire(DRAIN_LOCK_KEY, DRAIN_LOCK_TTL)
+            pipe = conn.pipeline(transaction=False)
+            for _ in range(batch_size):
+                pipe.lmove(OUTBOX_KEY, PROCESSING_KEY, "LEFT", "RIGHT")
+            batch = [raw for raw in pipe.execute() if raw is not None]
+            if not batch:
+                return sent
+
+            for raw in batch:
+                msg, attempts = _deserialize(raw, smtp)
+                try:
+                    sent += msg.send()
+                except MESSAGE_ERRORS as exc:
+                    _schedule_retry(conn, msg, attempts, exc)
+                except OSError as exc:  # smtplib errors are OSErrors
+                    smtp.close()  # reopened by the next send
+                    _schedule_retry(conn, msg, attempts, exc)
+                conn.lrem(PROCESSING_KEY, 1, raw)
+
+
+def _schedule_retry(conn, msg: EmailMultiAlternatives, attempts: int, exc) -> None:
+    if attempts >= len(RETRY_BACKOFF):
+        logger.error("giving up on email to %s: %s", msg.to, exc)
+        return
+    logger.warning("email to %s failed (%s), retrying", msg.to, exc)
+    conn.zadd(
+        RETRY_KEY,
+        {_serialize(msg, attempts + 1): time.time() + RETRY_BACKOFF[attempts]},
+    )
@@ -1,18 +1,40 @@
+import smtplib
+from datetime import timedelta
+from types import SimpleNamespace
+
+import django_rq
+import fakeredis
 import pytest
+from redis.exceptions import RedisError
 from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
 from django.core import mail
+from django.core.mail import EmailMultiAlternatives
+from django.core.mail.backends.base import BaseEmailBackend
 from django.test import RequestFactory
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 
 from core import settings
-from .api.services import send_activation_email
+from . import tasks
+from .api.services import get_user_by_email, send_activation_email
+from .blacklist import REVOKED_KEY, token_blacklist
+from .tasks import OUTBOX_KEY, PROCESSING_KEY, RETRY_KEY, deliver_queued_emails
+from .tokens import prune_expired_tokens, revoke_user_tokens
 from django.urls import reverse
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 
 # Tests for auth and email flows:
 # - login, registration, logout, refresh
 # - activation and password reset email content
+# - queued email delivery via the Redis outbox (idle runs stay offline,
+#   interrupted batches are resent, refused recipients keep the session)
 # Keep assertions tight and user-facing messages stable.
 
 
@@ -180,3 +202,210 @@ def test_refresh_with_valid_cookie():
     # Sanity check: JWTs have 2 dots (3 parts), and should rotate
     assert new_access_cookie.count(".") == 2
     assert new_access_cookie != old_access_cookie
+
+
+@pytest.mark.django_db
+def test_registration_queues_activation_email(settings, monkeypatch):
+    """Registration only queues the email; the worker drains the outbox."""
+    settings.EMAIL_QUEUE_ENABLED = True
+    conn = fakeredis.FakeRedis()
+    enqueued = []
+    monkeypatch.setattr(django_rq, "get_connection", lambda *a, **kw: conn)
+    queue = SimpleNamespace(enqueue=lambda func, **kw: enqueued.append(func))
+    monkeypatch.setattr(django_rq, "get_queue", lambda *a, **kw: queue)
+
+    resp = APIClient().post(
+        reverse("registration"),
+        {
+            "email": "new@test.com",
+            "password": "testpassword",
+            "confirmed_password": "testpassword",
+        },
+        format="json",
+    )
+
+    assert resp.status_code == 201, resp.data
+    assert enqueued == [deliver_queued_emails]
+    assert conn.llen(OUTBOX_KEY) == 1
+    assert len(mail.outbox) == 0
+
+    assert deliver_queued_emails() == 1
+    assert mail.outbox[0].to == ["new@test.com"]
+    assert resp.data["token"] in mail.outbox[0].body
+    assert conn.llen(OUTBOX_KEY) == 0
+
+
+def test_deliver_queued_emails_skips_empty_outbox_and_recovers(monkeypatch):
+    """An empty outbox opens no SMTP connection; a crashed batch is resent."""
+    conn = fakeredis.FakeRedis()
+    monkeypatch.setattr(django_rq, "get_connection", lambda *a, **kw: conn)
+    opened = []
+    get_connection = tasks.get_connection
+    monkeypatch.setattr(
+        tasks, "get_connection", lambda **kw: opened.append(1) or get_connection(**kw)
+    )
+
+    assert deliver_queued_emails() == 0
+    assert opened == []
+
+    # A drain died after taking the message off the outbox
+    msg = EmailMultiAlternatives("Hi", "Body", "from@test.com", ["to@test.com"])
+    conn.rpush(PROCESSING_KEY, tasks._serialize(msg))
+
+    assert deliver_queued_emails() == 1
+    assert mail.outbox[0].to == ["to@test.com"]
+    assert conn.llen(PROCESSING_KEY) == conn.llen(OUTBOX_KEY) == 0
+    assert not conn.exists(tasks.DRAIN_LOCK_KEY)
+
+
+def test_deliver_queued_emails_keeps_session_after_refused_recipient(monkeypatch):
+    """Only connection errors reopen SMTP; failed messages are retried."""
+    conn = fakeredis.FakeRedis()
+    monkeypatch.setattr(django_rq, "get_connection", lambda *a, **kw: conn)
+
+    class Backend(BaseEmailBackend):
+        errors = {
+            "refused@test.com": smtplib.SMTPRecipientsRefused({}),
+            "dropped@test.com": smtplib.SMTPServerDisconnected("gone"),
+        }
+        sent, closed = [], 0
+
+        def close(self):
+            Backend.closed += 1
+
+        def send_messages(self, messages):
+            for msg in messages:
+                if msg.to[0] in self.errors:
+                    raise self.errors[msg.to[0]]
+                self.sent.append(msg.to[0])
+            return len(messages)
+
+    monkeypatch.setattr(tasks, "get_connection", lambda **kw: Backend())
+    for to in ("a@test.com", "refused@test.com", "b@test.com"):
+        msg = EmailMultiAlternatives("Hi", "Body", "from@test.com", [to])
+        conn.rpush(OUTBOX_KEY, tasks._serialize(msg))
+
+    assert deliver_queued_emails() == 2
+    assert Backend.sent == ["a@test.com", "b@test.com"]
+    assert Backend.closed == 1  # only when the drain ends
+    assert conn.zcard(RETRY_KEY) == 1
+
+    msg = EmailMultiAlternatives("Hi", "Body", "from@test.com", ["dropped@test.com"])
+    conn.rpush(OUTBOX_KEY, tasks._serialize(msg))
+    assert deliver_queued_emails() == 0
+    assert Backend.closed == 3
+    assert conn.zcard(RETRY_KEY) == 2
+
+
+@pytest.mark.django_db
+def test_redis_blacklist_rejects_refresh_after_logout(settings, monkeypatch):
+    """Logout revokes the JTI in Redis; unrevoked tokens skip the lookup."""
+    settings.JWT_REDIS_BLACKLIST = True
+    settings.JWT_BLACKLIST_DB_MIRROR = False
+    conn = fakeredis.FakeRedis()
+    monkeypatch.setattr(django_rq, "get_connection", lambda *a, **kw: conn)
+    monkeypatch.setattr(token_blacklist, "_bitmaps", {})
+
+    email = "test@test.com"
+    User.objects.create_user(
+        username=email, email=email, password="testpassword", is_active=True
+    )
+    client = APIClient()
+    client.post(
+        reverse("login"), {"email": email, "password": "testpassword"}, format="json"
+    )
+    refresh_cookie = client.cookies["refresh_token"].value
+
+    lookups = []
+    exists = conn.exists
+    monkeypatch.setattr(
+        conn, "exists", lambda *keys: lookups.append(keys) or exists(*keys)
+    )
+    assert client.post(reverse("token_refresh")).status_code == 200
+    assert lookups == []  # answered by the Bloom filter
+
+    assert client.post(reverse("logout")).status_code == 200
+    assert not BlacklistedToken.objects.exists()
+    assert any(k.startswith(REVOKED_KEY.format(jti="").encode()) for k in conn.keys())
+
+    client.cookies["refresh_token"] = refresh_cookie
+    assert client.post(reverse("token_refresh")).status_code == 401
+    assert len(lookups) == 1
+
+    # Without Redis, the local copy answers until it is older than the
+    # refresh token lifetime; then tokens are rejected (no database mirror)
+    def unavailable(*args, **kwargs):
+        raise RedisError("down")
+
+    for command in ("get", "pipeline", "exists"):
+        monkeypatch.setattr(conn, command, unavailable)
+    settings.JWT_BLOOM_REFRESH_SECONDS = 0
+    client.post(
+        reverse("login"), {"email": email, "password": "testpassword"}, format="json"
+    )
+    assert client.post(reverse("token_refresh")).status_code == 200
+
+    lifetime = api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+    for bucket, (bitmap, version, synced) in token_blacklist._bitmaps.items():
+        token_blacklist._bitmaps[bucket] = (bitmap, version, synced - lifetime)
+    assert client.post(reverse("token_refresh")).status_code == 401
+
+
+@pytest.mark.django_db
+def test_revoke_and_prune_tokens(django_assert_num_queries):
+    """All tokens of a user are revoked at once; expired ones get pruned."""
+    user = User.objects.create_user(username="a@test.com", email="a@test.com")
+    for _ in range(3):
+        RefreshToken.for_user(user)
+    expired = OutstandingToken.objects.first()
+    expired.expires_at = expired.expires_at - timedelta(days=30)
+    expired.save()
+
+    with django_assert_num_queries(2):
+        assert revoke_user_tokens(user) == 2
+    assert BlacklistedToken.objects.count() == 2
+    assert revoke_user_tokens(user) == 0
+
+    BlacklistedToken.objects.create(token=expired)
+    assert prune_expired_tokens(batch_size=1) == 1
+    assert not OutstandingToken.objects.filter(pk=expired.pk).exists()
+    assert OutstandingToken.objects.count() == BlacklistedToken.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_password_reset_fails_if_tokens_cannot_be_revoked(settings, monkeypatch):
+    """A Redis error during revocation keeps the old password and the link."""
+    settings.JWT_REDIS_BLACKLIST = True
+    user = User.objects.create_user(
+        username="a@test.com", email="a@test.com", password="oldpassword"
+    )
+    RefreshToken.for_user(user)
+
+    def unavailable(tokens):
+        raise RedisError("down")
+
+    monkeypatch.setattr(token_blacklist, "revoke_many", unavailable)
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    token = default_token_generator.make_token(user)
+    url = reverse("password_confirm", args=[uid, token])
+    data = {"new_password": "newpassword1", "confirm_password": "newpassword1"}
+
+    resp = APIClient().post(url, data, format="json")
+
+    assert resp.status_code == 503
+    user.refresh_from_db()
+    assert user.check_password("oldpassword")
+    assert not BlacklistedToken.objects.exists()
+
+
+@pytest.mark.django_db
+def test_get_user_by_email_ignores_case():
+    """Login, registration and reset share one case-insensitive lookup."""
+    user = User.objects.create_user(username="a@test.com", email="a@test.com")
+
+    assert get_user_by_email(" A@Test.com ") == user
+    assert get_user_by_email("b@test.com") is None
+
+    # Rows from before the unique index: the oldest account wins
+    User.objects.create_user(username="legacy", email="A@TEST.COM")
+    assert get_user_by_email("a@test.com") == user
@@ -0,0 +1,128 @@
+import logging
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+from .blacklist import token_blacklist
+
+logger = logging.getLogger(__name__)
+
+
+def revoke_user_tokens(user) -> int:
+    """Revoke every unexpired refresh token of a user (e.g. after a reset).
+
+    Reads the user's outstanding tokens once and blacklists them with a
+    single bulk insert instead of one `get_or_create()` per token. With
+    the Redis blacklist enabled, the JTIs are revoked there in one
+    pipeline and the tables are only written as a mirror, afterwards, so
+    a retry after a Redis error revokes the same tokens again.
+
+    Args:
+        user (User): User whose tokens are revoked.
+
+    Raises:
+        RedisError: If the tokens could not be revoked in Redis.
+
+    Returns:
+        int: Number of tokens revoked.
+    """
+    tokens = list(
+        OutstandingToken.objects.filter(
+            user=user,
+            expires_at__gt=timezone.now(),
+            blacklistedtoken__isnull=True,
+        )
+        .order_by()
+        .values_list("id", "jti", "expires_at")
+    )
+    if not tokens:
+        return 0
+
+    if settings.JWT_REDIS_BLACKLIST:
+        token_blacklist.revoke_many(
+            (jti, int(expires_at.timestamp())) for _, jti, expires_at in tokens
+        )
+
+    if not settings.JWT_REDIS_BLACKLIST or settings.JWT_BLACKLIST_DB_MIRROR:
+        BlacklistedToken.objects.bulk_create(
+            [BlacklistedToken(token_id=token_id) for token_id, _, _ in tokens],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+    return len(tokens)
+
+
+def token_table_stats() -> dict:
+    """Return row counts and on-disk sizes of the token tables.
+
+    On Postgres the planner's row estimate is used, so this stays cheap
+    on large tables. Sizes are only reported there.
+
+    Returns:
+        dict: {table: {"rows": int, "bytes": int | None}}
+    """
+    models = [OutstandingToken, BlacklistedToken]
+    if connection.vendor != "postgresql":
+        return {
+            model._meta.db_table: {"rows": model.objects.count(), "bytes": None}
+            for model in models
+        }
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relname, reltuples::bigint, pg_total_relation_size(oid) "
+            "FROM pg_class WHERE relname = ANY(%s)",
+            [[model._meta.db_table for model in models]],
+        )
+        return {
+            name: {"rows": max(rows, 0), "bytes": size}
+            for name, rows, size in cursor.fetchall()
+        }
+
+
+def prune_expired_tokens(
+    batch_size: int | None = None, max_batches: int | None = None
+) -> int:
+    """Delete expired outstanding tokens and their blacklist entries.
+
+    Rows are deleted in batches of primary keys, so every statement locks
+    a bounded number of rows. Tokens are issued with a fixed lifetime, so
+    the oldest ids expire first and the scan along the primary key finds
+    them without an index on `expires_at`. Table sizes are logged after
+    the run.
+
+    Args:
+        batch_size (int, optional): Tokens per batch.
+            Defaults to JWT_PRUNE_BATCH_SIZE.
+        max_batches (int, optional): Upper bound of batches per run.
+            Defaults to JWT_PRUNE_MAX_BATCHES.
+
+    Returns:
+        int: Number of outstanding tokens deleted.
+    """
+    batch_size = batch_size or settings.JWT_PRUNE_BATCH_SIZE
+    max_batches = max_batches or settings.JWT_PRUNE_MAX_BATCHES
+    now = timezone.now()
+
+    deleted = 0
+    for _ in range(max_batches):
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=now)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        BlacklistedToken.objects.filter(token_id__in=ids).delete()
+        OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+    stats = token_table_stats()
+    logger.info("pruned expired tokens", extra={"deleted": deleted, "tables": stats})
+    return deleted
@@ -38,6 +38,17 @@ else:
     print(f"Superuser '{username}' already exists.")
 EOF
 
+# Metrics of all gunicorn and RQ worker processes are merged from this
+# directory by /metrics; stale files from a previous run must go
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 python manage.py rqworker default &
 
-exec gunicorn core.wsgi:application --bind 0.0.0.0:8000 --reload
+# Periodic jobs (see core/cron.py)
+rq cron core/cron.py --url "redis://${REDIS_HOST:-redis}:${REDIS_PORT:-6379}/${REDIS_DB:-0}" &
+
+# ASGI workers: the HLS playlist/segment views are async, so one process can
+# hold many concurrent (slow) segment downloads
+exec gunicorn core.asgi:application -k uvicorn_worker.UvicornWorker --bind 0.0.0.0:8000 --reload
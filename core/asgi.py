@@ -3,14 +3,32 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Static files are served by WhiteNoise (run in a thread, see core.static)
+before the request reaches Django, so every middleware in the Django
+stack runs natively async.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
 
+from asgiref.wsgi import WsgiToAsgi
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+from .static import with_static_files  # noqa: E402
+
+static_files = WsgiToAsgi(with_static_files())
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["path"].startswith(settings.STATIC_URL):
+        await static_files(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
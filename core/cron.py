@@ -0,0 +1,53 @@
+"""
+Periodic jobs for the RQ cron scheduler.
+
+Start the scheduler next to the workers with:
+    rq cron core/cron.py --url redis://<REDIS_HOST>:<REDIS_PORT>/<REDIS_DB>
+
+The scheduler only enqueues jobs; `rqworker default` executes them.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from rq import cron  # noqa: E402
+
+from authentication_app.tasks import deliver_queued_emails  # noqa: E402
+from authentication_app.tokens import prune_expired_tokens  # noqa: E402
+from videos_app.analytics import rollup_recent_hours  # noqa: E402
+from videos_app.progress import flush_progress  # noqa: E402
+from videos_app.tasks import purge_deleted_videos  # noqa: E402
+from videos_app.telemetry import (  # noqa: E402
+    ensure_partitions,
+    ingest_playback_events,
+)
+
+# Write buffered watch-progress heartbeats to Postgres
+cron.register(
+    flush_progress, "default", interval=settings.WATCH_PROGRESS_FLUSH_INTERVAL
+)
+
+# Roll Redis popularity counters up into hourly stats
+cron.register(
+    rollup_recent_hours, "default", interval=settings.VIDEO_STATS_ROLLUP_INTERVAL
+)
+
+# Bulk-insert QoE beacons from the Redis stream
+cron.register(ingest_playback_events, "default", interval=settings.QOE_INGEST_INTERVAL)
+
+# Prepare upcoming monthly telemetry partitions and drop expired ones
+cron.register(ensure_partitions, "default", cron="15 3 * * *")
+
+# Re-send account emails whose retry backoff has elapsed
+cron.register(deliver_queued_emails, "default", interval=60)
+
+# Delete expired refresh tokens in bounded batches
+cron.register(prune_expired_tokens, "default", cron="40 * * * *")
+
+# Hard-delete expired video tombstones and their media files
+cron.register(purge_deleted_videos, "default", cron="30 3 * * *")
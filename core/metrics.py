@@ -0,0 +1,136 @@
+"""
+Prometheus metrics and the `/metrics` exposition endpoint.
+
+Gunicorn workers and RQ workers are separate processes. When
+PROMETHEUS_MULTIPROC_DIR is set (see backend.entrypoint.sh), every
+process writes its samples to that directory and the endpoint merges
+them, so a scrape sees the totals of all processes regardless of which
+worker answers it. RQ queue sizes are read from Redis at scrape time.
+
+The endpoint requires METRICS_TOKEN as a Bearer token, or a staff
+session (e.g. from the admin) if no token is configured.
+"""
+
+import os
+import secrets
+
+import django_rq
+from django.conf import settings
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    values,
+)
+from prometheus_client.core import GaugeMetricFamily
+from redis.exceptions import RedisError
+from rq import Worker
+
+HTTP_REQUEST_DURATION = Histogram(
+    "videoflix_http_request_duration_seconds",
+    "Time until the response (headers) is ready, per route.",
+    ["route", "method", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+HLS_BYTES_SERVED = Counter(
+    "videoflix_hls_bytes_served",
+    "Bytes of HLS playlists and segments served, per rendition.",
+    ["resolution"],
+)
+
+TRANSCODE_DURATION = Histogram(
+    "videoflix_transcode_duration_seconds",
+    "Wall time of encoding one rendition.",
+    ["resolution"],
+    buckets=(10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400),
+)
+
+TRANSCODE_SPEED = Histogram(
+    "videoflix_transcode_speed_ratio",
+    "Seconds of media encoded per second of wall time, per rendition.",
+    ["resolution"],
+    buckets=(0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 20),
+)
+
+
+class RQCollector:
+    """Report queue length and failed job count of every RQ queue."""
+
+    def describe(self):
+        return []  # queried at scrape time only, never on registration
+
+    def collect(self):
+        jobs = GaugeMetricFamily(
+            "videoflix_rq_queue_jobs", "Jobs waiting in an RQ queue.", labels=["queue"]
+        )
+        failed = GaugeMetricFamily(
+            "videoflix_rq_failed_jobs",
+            "Jobs in the failed job registry of an RQ queue.",
+            labels=["queue"],
+        )
+        for name in settings.RQ_QUEUES:
+            try:
+                queue = django_rq.get_queue(name)
+                jobs.add_metric([name], queue.count)
+                failed.add_metric([name], queue.failed_job_registry.count)
+            except RedisError:
+                continue
+        yield jobs
+        yield failed
+
+
+RQ_COLLECTOR = RQCollector()
+REGISTRY.register(RQ_COLLECTOR)
+
+
+class MetricsWorker(Worker):
+    """RQ worker whose work horses write metrics under the worker's PID.
+
+    Every job runs in a newly forked work horse. In multiprocess mode each
+    PID gets its own files, so the directory, and the merge done on every
+    scrape, would grow by one set of files per job. A worker runs one
+    horse at a time, so its horses can share the worker's files: each one
+    picks up the totals of the previous horse.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            worker_pid = os.getpid()
+            values.ValueClass = values.MultiProcessValue(lambda: worker_pid)
+
+
+def build_registry() -> CollectorRegistry:
+    """Return the registry to expose, merged across processes if configured."""
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(RQ_COLLECTOR)
+    return registry
+
+
+def metrics_view(request):
+    """Serve all metrics in the Prometheus text format.
+
+    If METRICS_TOKEN is set, the scraper must send it as a Bearer token;
+    otherwise only staff users (session login) may read the metrics.
+    """
+    token = settings.METRICS_TOKEN
+    if token and not secrets.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponse(status=401)
+    if not token and not request.user.is_staff:
+        return HttpResponse(status=403)
+
+    return HttpResponse(
+        generate_latest(build_registry()), content_type=CONTENT_TYPE_LATEST
+    )
@@ -0,0 +1,134 @@
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from .metrics import HTTP_REQUEST_DURATION
+from .timing import RequestTiming, current_timing, install_db_wrapper
+
+logger = logging.getLogger(__name__)
+
+
+class ServerTimingMiddleware:
+    """Measure where request time goes, for a sample of requests.
+
+    For SERVER_TIMING_SAMPLE_RATE of all requests, total, DB (time and
+    query count), cache and auth time are collected, returned in a
+    `Server-Timing` header and logged as one structured line. Requests
+    that are not sampled only pay for one random number.
+
+    Works for sync and async views; place it first in MIDDLEWARE so the
+    total covers the whole stack.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+        # Connections opened before the middleware was loaded
+        for connection in connections.all(initialized_only=True):
+            install_db_wrapper(connection=connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        return self._finish(request, response, timing)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        return self._finish(request, response, timing)
+
+    @staticmethod
+    def _sampled() -> bool:
+        rate = settings.SERVER_TIMING_SAMPLE_RATE
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    @staticmethod
+    def _finish(request, response, timing: RequestTiming):
+        total = time.perf_counter() - timing.started
+        response["Server-Timing"] = (
+            f"total;dur={total * 1000:.1f}, "
+            f'db;dur={timing.db * 1000:.1f};desc="{timing.queries} queries", '
+            f"cache;dur={timing.cache * 1000:.1f}, "
+            f"auth;dur={timing.auth * 1000:.1f}"
+        )
+        match = getattr(request, "resolver_match", None)
+        logger.info(
+            "request timing",
+            extra={
+                "method": request.method,
+                "route": match.route if match else request.path,
+                "status": response.status_code,
+                "total_ms": round(total * 1000, 1),
+                "db_ms": round(timing.db * 1000, 1),
+                "queries": timing.queries,
+                "cache_ms": round(timing.cache * 1000, 1),
+                "auth_ms": round(timing.auth * 1000, 1),
+            },
+        )
+        return response
+
+
+class MetricsMiddleware:
+    """Record the latency of every request in a per-route histogram.
+
+    The route label is the URL name (e.g. "video-segment", "login"), so
+    it stays bounded no matter which IDs appear in the path. For streamed
+    responses the time until the headers are ready is recorded.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self._observe(request, response, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, response, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def _observe(request, response, seconds: float) -> None:
+        match = getattr(request, "resolver_match", None)
+        route = (match.url_name or match.route) if match else "unmatched"
+        HTTP_REQUEST_DURATION.labels(
+            route, request.method, response.status_code
+        ).observe(seconds)
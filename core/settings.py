@@ -31,10 +31,13 @@ SECRET_KEY = os.getenv(
     default="django-insecure-@#x5h3zj!g+8g1v@2^b6^9$8&f1r7g$@t3v!p4#=g0r5qzj4m3",
 )
 
-# SECURITY WARNING: don't run with debug turned on in production!
 
-# DEBUG = os.getenv("DEBUG", "False").lower() == "true"
-DEBUG = True
+def env_bool(name: str, default: bool = False) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = env_bool("DEBUG", default=False)
 COOKIE_SECURE = not DEBUG
 
 ALLOWED_HOSTS = os.environ.get("ALLOWED_HOSTS", default="localhost").split(",")
@@ -67,10 +70,10 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework_simplejwt",
     "django_rq",
-    "debug_toolbar",
     "import_export",
     "authentication_app",
     "videos_app.apps.VideosAppConfig",
@@ -79,11 +82,13 @@ INSTALLED_APPS = [
 
 IMPORT_EXPORT_USE_TRANSACTIONS = True
 
+# Every middleware must be async-capable, or Django adapts each request of
+# the ASGI stack to sync. Static files are served outside of it (core.static)
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
+    "core.middleware.ServerTimingMiddleware",
     "corsheaders.middleware.CorsMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -92,6 +97,11 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# The debug toolbar is far too heavy for production traffic
+if DEBUG:
+    INSTALLED_APPS.append("debug_toolbar")
+    MIDDLEWARE.insert(3, "debug_toolbar.middleware.DebugToolbarMiddleware")
+
 ROOT_URLCONF = "core.urls"
 
 TEMPLATES = [
@@ -110,6 +120,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "core.wsgi.application"
+ASGI_APPLICATION = "core.asgi.application"
 
 
 # Database
@@ -142,6 +153,8 @@ RQ_QUEUES = {
         "DB": int(os.getenv("REDIS_DB", 0)),
     }
 }
+# Work horses share their worker's metric files (see core.metrics)
+RQ = {"WORKER_CLASS": "core.metrics.MetricsWorker"}
 
 
 # Password validation
@@ -205,10 +218,6 @@ REST_FRAMEWORK = {
 # )
 
 
-def env_bool(name: str, default: bool = False) -> bool:
-    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
-
-
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 
 EMAIL_HOST = os.getenv("EMAIL_HOST")
@@ -220,6 +229,10 @@ EMAIL_USE_SSL = env_bool("EMAIL_USE_SSL", default=False)
 
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "no-reply@videoflix.local")
 
+# Deliver account emails from an RQ worker instead of the request
+EMAIL_QUEUE_ENABLED = env_bool("EMAIL_QUEUE_ENABLED", default=True)
+EMAIL_QUEUE_BATCH_SIZE = int(os.getenv("EMAIL_QUEUE_BATCH_SIZE", 50))
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=5),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
@@ -227,3 +240,119 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": True,
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
+
+# Home screen rows: newest videos per category, served from cache
+VIDEO_ROWS_PER_CATEGORY = int(os.getenv("VIDEO_ROWS_PER_CATEGORY", 10))
+VIDEO_ROWS_MAX_PER_CATEGORY = int(os.getenv("VIDEO_ROWS_MAX_PER_CATEGORY", 50))
+VIDEO_ROWS_CACHE_TIMEOUT = int(os.getenv("VIDEO_ROWS_CACHE_TIMEOUT", 300))
+
+# Full-text search: text search configuration and page size. Stored
+# vectors are built with the configuration of the time they were saved;
+# after changing it, re-save every video so documents and queries agree
+VIDEO_SEARCH_CONFIG = os.getenv("VIDEO_SEARCH_CONFIG", "simple")
+VIDEO_SEARCH_PAGE_SIZE = int(os.getenv("VIDEO_SEARCH_PAGE_SIZE", 20))
+
+# Delta sync: batch size and how long fresh changes are held back
+VIDEO_SYNC_PAGE_SIZE = int(os.getenv("VIDEO_SYNC_PAGE_SIZE", 500))
+VIDEO_SYNC_SETTLE_SECONDS = int(os.getenv("VIDEO_SYNC_SETTLE_SECONDS", 2))
+
+# Soft-deleted videos are kept as sync tombstones for this many days, then
+# purged together with their files. Sync cursors older than this expire
+VIDEO_TOMBSTONE_DAYS = int(os.getenv("VIDEO_TOMBSTONE_DAYS", 30))
+
+# Watch progress write-behind buffer (Redis -> Postgres)
+WATCH_PROGRESS_FLUSH_INTERVAL = int(os.getenv("WATCH_PROGRESS_FLUSH_INTERVAL", 30))
+WATCH_PROGRESS_FLUSH_BATCH_SIZE = int(
+    os.getenv("WATCH_PROGRESS_FLUSH_BATCH_SIZE", 1000)
+)
+WATCH_PROGRESS_REDIS_TTL = int(os.getenv("WATCH_PROGRESS_REDIS_TTL", 60 * 60 * 24 * 30))
+
+# Popularity analytics: rollup interval and trending API
+VIDEO_STATS_ROLLUP_INTERVAL = int(os.getenv("VIDEO_STATS_ROLLUP_INTERVAL", 300))
+VIDEO_TRENDING_CACHE_TIMEOUT = int(os.getenv("VIDEO_TRENDING_CACHE_TIMEOUT", 60))
+
+# Playlist requests of one viewer and video within this window count as
+# one play (rendition switches, reloads)
+VIDEO_PLAY_SESSION_SECONDS = int(os.getenv("VIDEO_PLAY_SESSION_SECONDS", 30 * 60))
+
+# Playback (QoE) telemetry: beacon limits, Redis stream and ingestion
+QOE_MAX_BEACON_BYTES = int(os.getenv("QOE_MAX_BEACON_BYTES", 64 * 1024))
+QOE_MAX_EVENTS_PER_BEACON = int(os.getenv("QOE_MAX_EVENTS_PER_BEACON", 200))
+QOE_STREAM_MAXLEN = int(os.getenv("QOE_STREAM_MAXLEN", 1_000_000))
+QOE_INGEST_INTERVAL = int(os.getenv("QOE_INGEST_INTERVAL", 10))
+QOE_INGEST_BATCH_SIZE = int(os.getenv("QOE_INGEST_BATCH_SIZE", 500))
+QOE_RETENTION_MONTHS = int(os.getenv("QOE_RETENTION_MONTHS", 6))
+
+# Refresh-token blacklist in Redis; Postgres tables kept as a durable mirror
+JWT_REDIS_BLACKLIST = env_bool("JWT_REDIS_BLACKLIST", default=True)
+JWT_BLACKLIST_DB_MIRROR = env_bool("JWT_BLACKLIST_DB_MIRROR", default=True)
+JWT_BLOOM_BITS = int(os.getenv("JWT_BLOOM_BITS", 2**20))
+JWT_BLOOM_REFRESH_SECONDS = int(os.getenv("JWT_BLOOM_REFRESH_SECONDS", 5))
+
+# Scheduled pruning of expired outstanding/blacklisted refresh tokens
+JWT_PRUNE_BATCH_SIZE = int(os.getenv("JWT_PRUNE_BATCH_SIZE", 5000))
+JWT_PRUNE_MAX_BATCHES = int(os.getenv("JWT_PRUNE_MAX_BATCHES", 200))
+
+# Request instrumentation (Server-Timing header + log line), share of requests
+SERVER_TIMING_SAMPLE_RATE = float(os.getenv("SERVER_TIMING_SAMPLE_RATE", 0.01))
+
+# Prometheus /metrics endpoint; if set, scrapers must send this Bearer token,
+# otherwise only staff users can read it
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Chunked parallel encoding of long videos (0 disables chunking)
+TRANSCODE_CHUNK_SECONDS = int(os.getenv("TRANSCODE_CHUNK_SECONDS", 300))
+TRANSCODE_CHUNK_MIN_DURATION = int(os.getenv("TRANSCODE_CHUNK_MIN_DURATION", 1200))
+TRANSCODE_CHUNK_WORKERS = int(os.getenv("TRANSCODE_CHUNK_WORKERS", 4))
+
+# Host core budget shared by all ffmpeg processes (0 = all CPUs), thread
+# budget per process and admission threshold; optional CPU pinning
+TRANSCODE_CORE_BUDGET = int(os.getenv("TRANSCODE_CORE_BUDGET", 0))
+TRANSCODE_MAX_THREADS = int(os.getenv("TRANSCODE_MAX_THREADS", 4))
+TRANSCODE_MIN_THREADS = int(os.getenv("TRANSCODE_MIN_THREADS", 2))
+TRANSCODE_CPU_AFFINITY = env_bool("TRANSCODE_CPU_AFFINITY", default=False)
+TRANSCODE_LEASE_TTL = int(os.getenv("TRANSCODE_LEASE_TTL", 60))
+TRANSCODE_ADMISSION_POLL = float(os.getenv("TRANSCODE_ADMISSION_POLL", 1.0))
+
+# Upload admission: bounded ffprobe check of new video files (0 = no limit)
+MEDIA_PROBE_TIMEOUT = int(os.getenv("MEDIA_PROBE_TIMEOUT", 10))
+MEDIA_PROBE_SIZE = int(os.getenv("MEDIA_PROBE_SIZE", 20 * 1024 * 1024))
+MEDIA_MIN_DURATION = float(os.getenv("MEDIA_MIN_DURATION", 1))
+MEDIA_MAX_DURATION = int(os.getenv("MEDIA_MAX_DURATION", 0))
+
+# Encode audio once into a shared audio-only rendition (EXT-X-MEDIA group)
+# instead of muxing a copy into every video rendition
+HLS_SHARED_AUDIO = env_bool("HLS_SHARED_AUDIO", default=False)
+HLS_AUDIO_BITRATE = os.getenv("HLS_AUDIO_BITRATE", "192k")
+
+# Per-title encoding: complexity analysis over sampled windows picks
+# CRF/maxrate/bufsize per rendition; reference = probe kbit/s of content
+# the nominal RENDITIONS bitrates fit
+TRANSCODE_PER_TITLE = env_bool("TRANSCODE_PER_TITLE", default=True)
+TRANSCODE_ANALYSIS_SAMPLES = int(os.getenv("TRANSCODE_ANALYSIS_SAMPLES", 4))
+TRANSCODE_ANALYSIS_SAMPLE_SECONDS = int(
+    os.getenv("TRANSCODE_ANALYSIS_SAMPLE_SECONDS", 4)
+)
+TRANSCODE_REFERENCE_COMPLEXITY = int(os.getenv("TRANSCODE_REFERENCE_COMPLEXITY", 400))
+
+# Progressive availability: encode the lowest rendition first with a
+# faster x264 preset and publish each rendition as soon as it is done;
+# the fast encode is replaced by a regular one at the end of the job
+TRANSCODE_PUBLISH_EARLY = env_bool("TRANSCODE_PUBLISH_EARLY", default=True)
+TRANSCODE_EARLY_PRESET = os.getenv("TRANSCODE_EARLY_PRESET", "superfast")
+
+# HLS segment length in seconds; keyframes of all renditions are forced on
+# this grid (shorter segments start faster, longer ones compress better)
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", 6))
+
+# I-frame-only playlists for trick play (on by default). Keyframes are
+# forced every HLS_KEYFRAME_INTERVAL seconds (must divide
+# HLS_SEGMENT_SECONDS; 0 = once per segment). Each extra keyframe raises the bitrate of every
+# rendition, so finer scrubbing is a storage trade-off
+HLS_IFRAME_PLAYLISTS = env_bool("HLS_IFRAME_PLAYLISTS", default=True)
+HLS_KEYFRAME_INTERVAL = int(os.getenv("HLS_KEYFRAME_INTERVAL", 0))
+
+# Local scratch directory (tmpfs / NVMe) for encoding; finished renditions
+# are moved into MEDIA_ROOT in one step. Empty = encode in a hidden
+# directory next to the published one
+TRANSCODE_SCRATCH_DIR = os.getenv("TRANSCODE_SCRATCH_DIR", "")
@@ -0,0 +1,34 @@
+"""
+Static file serving in front of Django.
+
+WhiteNoise is WSGI-only: as Django middleware it would make Django adapt
+every request of the ASGI stack to sync. Instead it wraps the WSGI
+application directly and, under ASGI, only sees requests for STATIC_URL.
+"""
+
+import re
+
+from django.conf import settings
+from whitenoise import WhiteNoise
+
+# Names written by the manifest storage carry a 12-digit content hash
+HASHED_NAME = re.compile(r"^.+\.[0-9a-f]{12}\..+$")
+
+
+def not_found(environ, start_response):
+    """WSGI fallback for static URLs that match no file."""
+    start_response("404 Not Found", [("Content-Type", "text/plain")])
+    return [b"Not Found"]
+
+
+def with_static_files(application=not_found) -> WhiteNoise:
+    """Wrap a WSGI application so it serves STATIC_ROOT under STATIC_URL.
+
+    Hashed file names are cached forever, everything else for a minute.
+    """
+    return WhiteNoise(
+        application,
+        root=settings.STATIC_ROOT,
+        prefix=settings.STATIC_URL,
+        immutable_file_test=lambda path, url: bool(HASHED_NAME.match(url)),
+    )
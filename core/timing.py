@@ -0,0 +1,70 @@
+"""
+Per-request timing collected by `core.middleware.ServerTimingMiddleware`.
+
+The timing of the current request lives in a context variable, so it
+follows the request into `sync_to_async` threads. Code outside a sampled
+request pays one context variable lookup per measured call.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+
+current_timing = ContextVar("current_timing", default=None)
+
+
+class RequestTiming:
+    """Durations (seconds) and query count of one request."""
+
+    __slots__ = ("started", "db", "queries", "cache", "auth")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db = 0.0
+        self.queries = 0
+        self.cache = 0.0
+        self.auth = 0.0
+
+
+@contextmanager
+def span(name: str):
+    """Add the duration of the block to `name` ("cache" or "auth")."""
+    timing = current_timing.get()
+    if timing is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(timing, name, getattr(timing, name) + time.perf_counter() - start)
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """Execute wrapper that counts queries and DB time of a sampled request."""
+    timing = current_timing.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.db += time.perf_counter() - start
+        timing.queries += 1
+
+
+def install_db_wrapper(sender=None, connection=None, **kwargs):
+    """Register `db_execute_wrapper` on a connection once.
+
+    Connections are per thread, so the wrapper is installed whenever a
+    connection is created instead of around each request.
+    """
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+
+connection_created.connect(install_db_wrapper, dispatch_uid="core.timing")
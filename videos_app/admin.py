@@ -1,5 +1,21 @@
+from django import forms
 from django.contrib import admin
-from .models import Video
+from .models import RenditionOutput, TranscodeJob, Video, VideoHourlyStats
+from .probe import validate_video_upload
+
+
+class VideoAdminForm(forms.ModelForm):
+    """Probe newly uploaded files before the video is saved."""
+
+    class Meta:
+        model = Video
+        fields = "__all__"
+
+    def clean_video_file(self):
+        upload = self.cleaned_data["video_file"]
+        if "video_file" in self.changed_data:
+            self.media_info = validate_video_upload(upload)
+        return upload
 
 
 @admin.register(Video)
@@ -9,8 +25,110 @@ class Video(admin.ModelAdmin):
     - Displays ID, title, category, and creation date in the list view.
     - Allows searching by title, description, and category.
     - Provides filters for category and creation date.
+    - Rejects uploads that ffprobe cannot read as video; stores the probed
+      duration and stream info of accepted ones.
+    - Deleting soft-deletes, so delta-sync clients receive a tombstone;
+      purge_deleted_videos removes the row and its files later.
     """
 
-    list_display = ("id", "title", "category", "created_at")
+    form = VideoAdminForm
+
+    list_display = ("id", "title", "category", "created_at", "updated_at")
     search_fields = ("title", "description", "category")
     list_filter = ("category", "created_at")
+    readonly_fields = ("duration", "ready_renditions")
+
+    def save_model(self, request, obj, form, change):
+        media = getattr(form, "media_info", None)
+        if media:
+            obj.duration = media["duration"]
+            obj.media_info = media
+        super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        obj.soft_delete()
+
+    def delete_queryset(self, request, queryset):
+        for video in queryset:
+            video.soft_delete()
+
+
+@admin.register(VideoHourlyStats)
+class VideoHourlyStatsAdmin(admin.ModelAdmin):
+    """Read-only popularity report built from the hourly rollups.
+
+    - Lists plays, unique viewers and segment hits per video, hour and rendition.
+    - Provides filters for rendition and hour, and a date drill-down.
+    """
+
+    list_display = (
+        "hour",
+        "video",
+        "resolution",
+        "plays",
+        "unique_viewers",
+        "segment_hits",
+    )
+    list_filter = ("resolution", "hour")
+    list_select_related = ("video",)
+    date_hierarchy = "hour"
+    ordering = ("-hour", "-plays")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class RenditionOutputInline(admin.TabularInline):
+    model = RenditionOutput
+    extra = 0
+    can_delete = False
+    fields = (
+        "resolution",
+        "status",
+        "wall_time",
+        "cpu_time",
+        "speed",
+        "media_duration",
+        "output_bytes",
+        "segment_count",
+        "error",
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TranscodeJob)
+class TranscodeJobAdmin(admin.ModelAdmin):
+    """Read-only history of HLS conversions.
+
+    - Lists status, wall time and CPU time per job.
+    - Shows the encode statistics of every rendition inline.
+    - Provides filters for status and creation date.
+    """
+
+    list_display = ("id", "video", "status", "wall_time", "cpu_time", "created_at")
+    list_filter = ("status", "created_at")
+    list_select_related = ("video",)
+    search_fields = ("video__title",)
+    date_hierarchy = "created_at"
+    ordering = ("-created_at",)
+    inlines = [RenditionOutputInline]
+    readonly_fields = (
+        "video",
+        "source",
+        "status",
+        "created_at",
+        "started_at",
+        "finished_at",
+        "wall_time",
+        "cpu_time",
+        "error",
+    )
+
+    def has_add_permission(self, request):
+        return False
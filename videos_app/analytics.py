@@ -0,0 +1,186 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+import django_rq
+from django.conf import settings
+from redis.exceptions import RedisError
+
+from .models import Video, VideoHourlyStats
+
+logger = logging.getLogger(__name__)
+
+# Redis layout, bucketed per UTC hour ("YYYYMMDDHH"):
+# - plays / hits: sorted sets, member "video_id:resolution", score = count
+# - uv: one HyperLogLog of user ids per video and rendition
+# - viewers: one HyperLogLog of user ids per video, across renditions
+PLAYS_KEY = "videoflix:stats:{hour}:plays"
+HITS_KEY = "videoflix:stats:{hour}:hits"
+VIEWERS_KEY = "videoflix:stats:{hour}:uv:{member}"
+VIDEO_VIEWERS_KEY = "videoflix:stats:{hour}:viewers:{video_id}"
+
+# Marker of a viewer's running playback of a video; while it exists,
+# further playlist requests (rendition switches) are not new plays
+SESSION_KEY = "videoflix:stats:session:{video_id}:{user_id}"
+
+# Counters are kept long enough for the rollup job to catch up after downtime
+COUNTER_TTL = 60 * 60 * 48
+
+# Longest trending window; the per-video viewer sets are kept for it, since
+# distinct viewers of a window can only be counted from the raw sets
+MAX_WINDOW_HOURS = 168
+VIDEO_VIEWERS_TTL = 60 * 60 * (MAX_WINDOW_HOURS + 1)
+
+
+def hour_bucket(moment: datetime | None = None) -> str:
+    """Return the hour bucket key ("YYYYMMDDHH", UTC) for a moment."""
+    return (moment or datetime.now(timezone.utc)).strftime("%Y%m%d%H")
+
+
+def record_playlist_view(video_id: int, resolution: str, user_id: int) -> None:
+    """Count a rendition playlist request as a play and record the viewer.
+
+    Only the first playlist a viewer loads within VIDEO_PLAY_SESSION_SECONDS
+    is a play (counted for that rendition); adaptive players load one
+    playlist per rendition they switch to. Repeated requests cost one
+    Redis round trip, a new play two.
+
+    Failures are logged and swallowed; analytics must never break playback.
+    """
+    hour = hour_bucket()
+    member = f"{video_id}:{resolution}"
+    session = SESSION_KEY.format(video_id=video_id, user_id=user_id)
+    viewers = VIDEO_VIEWERS_KEY.format(hour=hour, video_id=video_id)
+    try:
+        conn = django_rq.get_connection("default")
+        pipe = conn.pipeline(transaction=False)
+        pipe.set(session, 1, nx=True, ex=settings.VIDEO_PLAY_SESSION_SECONDS)
+        pipe.pfadd(VIEWERS_KEY.format(hour=hour, member=member), user_id)
+        pipe.expire(VIEWERS_KEY.format(hour=hour, member=member), COUNTER_TTL)
+        pipe.pfadd(viewers, user_id)
+        pipe.expire(viewers, VIDEO_VIEWERS_TTL)
+        started = pipe.execute()[0]
+        if started:
+            pipe = conn.pipeline(transaction=False)
+            pipe.zincrby(PLAYS_KEY.format(hour=hour), 1, member)
+            pipe.expire(PLAYS_KEY.format(hour=hour), COUNTER_TTL)
+            pipe.execute()
+    except RedisError:
+        logger.warning("could not record playlist view", exc_info=True)
+
+
+def record_segment_hit(video_id: int, resolution: str) -> None:
+    """Count a served segment. Failures are logged and swallowed."""
+    key = HITS_KEY.format(hour=hour_bucket())
+    try:
+        pipe = django_rq.get_connection("default").pipeline(transaction=False)
+        pipe.zincrby(key, 1, f"{video_id}:{resolution}")
+        pipe.expire(key, COUNTER_TTL)
+        pipe.execute()
+    except RedisError:
+        logger.warning("could not record segment hit", exc_info=True)
+
+
+def count_unique_viewers(video_ids: list, since: datetime) -> dict:
+    """Count the distinct viewers of videos in the hours starting at `since`.
+
+    PFCOUNT over several HyperLogLogs estimates the size of their union,
+    so a viewer seen in several hours or renditions is counted once
+    (unlike a sum of the hourly rollups). Windows are limited to
+    MAX_WINDOW_HOURS, the lifetime of the per-video sets.
+
+    Returns:
+        dict: {video_id: viewers}; empty if Redis is unavailable.
+    """
+    now = datetime.now(timezone.utc)
+    hour = since.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if hour < since:
+        hour += timedelta(hours=1)
+    buckets = []
+    while hour <= now:
+        buckets.append(hour_bucket(hour))
+        hour += timedelta(hours=1)
+    if not video_ids or not buckets:
+        return {}
+
+    try:
+        pipe = django_rq.get_connection("default").pipeline(transaction=False)
+        for video_id in video_ids:
+            pipe.pfcount(
+                *(VIDEO_VIEWERS_KEY.format(hour=b, video_id=video_id) for b in buckets)
+            )
+        return dict(zip(video_ids, pipe.execute()))
+    except RedisError:
+        logger.warning("could not count unique viewers", exc_info=True)
+        return {}
+
+
+def rollup_hour(hour_start: datetime) -> int:
+    """Copy the Redis counters of one hour into VideoHourlyStats.
+
+    The counters hold absolute totals for the hour, so the upsert is
+    idempotent and the current (still open) hour can be rolled up
+    repeatedly.
+
+    Args:
+        hour_start (datetime): Start of the hour (UTC).
+
+    Returns:
+        int: Number of rows written.
+    """
+    conn = django_rq.get_connection("default")
+    hour = hour_bucket(hour_start)
+    plays = dict(conn.zrange(PLAYS_KEY.format(hour=hour), 0, -1, withscores=True))
+    hits = dict(conn.zrange(HITS_KEY.format(hour=hour), 0, -1, withscores=True))
+
+    members = [m.decode() for m in plays.keys() | hits.keys()]
+    if not members:
+        return 0
+
+    pipe = conn.pipeline(transaction=False)
+    for member in members:
+        pipe.pfcount(VIEWERS_KEY.format(hour=hour, member=member))
+    viewers = pipe.execute()
+
+    video_ids = set(
+        Video.all_objects.filter(
+            id__in={int(m.split(":")[0]) for m in members}
+        ).values_list("id", flat=True)
+    )
+
+    rows = []
+    for member, unique_viewers in zip(members, viewers):
+        video_id, resolution = member.split(":")
+        if int(video_id) not in video_ids:
+            continue
+        key = member.encode()
+        rows.append(
+            VideoHourlyStats(
+                video_id=int(video_id),
+                hour=hour_start,
+                resolution=resolution,
+                plays=int(plays.get(key, 0)),
+                unique_viewers=unique_viewers,
+                segment_hits=int(hits.get(key, 0)),
+            )
+        )
+
+    VideoHourlyStats.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["video", "hour", "resolution"],
+        update_fields=["plays", "unique_viewers", "segment_hits"],
+    )
+    return len(rows)
+
+
+def rollup_recent_hours() -> int:
+    """Roll up the previous and the current hour.
+
+    Scheduled periodically; covering the previous hour makes sure its
+    final counts are persisted after the hour closes.
+
+    Returns:
+        int: Number of rows written.
+    """
+    current = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return rollup_hour(current - timedelta(hours=1)) + rollup_hour(current)
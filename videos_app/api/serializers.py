@@ -1,12 +1,18 @@
+from functools import partial
+
+from django.conf import settings
 from rest_framework import serializers
 from ..models import Video
+from ..probe import validate_video_upload
 
 
 class VideoSerializer(serializers.ModelSerializer):
     """Serializer for the Video model.
 
     Converts Video instances into JSON and validates incoming data
-    when creating or updating videos.
+    when creating or updating videos. Uploaded files are probed with
+    ffprobe; unusable inputs are rejected before any transcode is queued
+    and the probed duration and stream info are stored with the video.
     """
 
     video_file = serializers.FileField(required=True)
@@ -21,4 +27,89 @@ class VideoSerializer(serializers.ModelSerializer):
             "category",
             "created_at",
             "video_file",
+            "duration",
+            "ready_renditions",
         ]
+
+    def validate_video_file(self, value):
+        self._media = validate_video_upload(value)
+        return value
+
+    def _with_media(self, validated_data: dict) -> dict:
+        media = getattr(self, "_media", None)
+        if media and "video_file" in validated_data:
+            validated_data["duration"] = media["duration"]
+            validated_data["media_info"] = media
+        return validated_data
+
+    def create(self, validated_data):
+        return super().create(self._with_media(validated_data))
+
+    def update(self, instance, validated_data):
+        return super().update(instance, self._with_media(validated_data))
+
+
+class VideoListSerializer(serializers.BaseSerializer):
+    """Lean, read-only serializer for catalogue listings.
+
+    - Works on `.values()` rows (dicts) as well as `.only()` instances.
+    - Builds the absolute media URL prefix once per request instead of
+      once per row.
+    - Supports sparse fieldsets via `?fields=id,title,...`.
+    - Never exposes the raw upload path; playback goes through HLS.
+    """
+
+    FIELDS = ("id", "title", "description", "thumbnail_url", "category", "created_at")
+
+    @classmethod
+    def requested_fields(cls, request) -> tuple:
+        """Return the fields selected with `?fields=`, in canonical order.
+
+        Unknown names are ignored; no (valid) selection means all fields.
+        """
+        raw = request.query_params.get("fields", "") if request else ""
+        wanted = {name.strip() for name in raw.split(",") if name.strip()}
+        selected = tuple(name for name in cls.FIELDS if name in wanted)
+        return selected or cls.FIELDS
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._fields = fields
+        self._media_prefix = None
+
+    @property
+    def selected_fields(self) -> tuple:
+        if self._fields is None:
+            self._fields = self.requested_fields(self.context.get("request"))
+        return self._fields
+
+    @property
+    def media_prefix(self) -> str:
+        if self._media_prefix is None:
+            request = self.context.get("request")
+            self._media_prefix = (
+                request.build_absolute_uri(settings.MEDIA_URL)
+                if request
+                else settings.MEDIA_URL
+            )
+        return self._media_prefix
+
+    def to_representation(self, row):
+        get = row.get if isinstance(row, dict) else partial(getattr, row)
+        data = {}
+        for name in self.selected_fields:
+            value = get(name)
+            if name == "thumbnail_url":
+                value = f"{self.media_prefix}{value}" if value else None
+            elif name == "created_at":
+                value = value.isoformat().replace("+00:00", "Z")
+            data[name] = value
+        return data
+
+
+class WatchProgressSerializer(serializers.Serializer):
+    """Validates playback heartbeats and renders resume positions."""
+
+    position = serializers.FloatField(min_value=0)
+    duration = serializers.FloatField(min_value=0, required=False, allow_null=True)
+    updated_at = serializers.DateTimeField(read_only=True)
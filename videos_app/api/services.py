@@ -0,0 +1,370 @@
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Avg, Count, F, Max, Q, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from core.timing import span
+
+from ..analytics import count_unique_viewers
+from ..models import (
+    PlaybackEvent,
+    RenditionOutput,
+    TranscodeJob,
+    Video,
+    VideoHourlyStats,
+)
+from .serializers import VideoListSerializer
+
+CATALOGUE_VERSION_KEY = "video-catalogue-version"
+
+
+def catalogue_version() -> int:
+    """Return the current catalogue version used to namespace cache keys.
+
+    Returns:
+        int: Version number, starting at 1.
+    """
+    with span("cache"):
+        return cache.get_or_set(CATALOGUE_VERSION_KEY, 1, timeout=None)
+
+
+def bump_catalogue_version() -> None:
+    """Invalidate all cached catalogue views by bumping the version.
+
+    Old entries are never read again and simply expire.
+    """
+    try:
+        cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOGUE_VERSION_KEY, 2, timeout=None)
+
+
+def get_category_rows(request, per_row: int) -> list:
+    """Return the newest `per_row` videos of every category.
+
+    The ranking is done in a single query with
+    ROW_NUMBER() OVER (PARTITION BY category ORDER BY created_at DESC),
+    and the serialized result is cached per row size.
+
+    Args:
+        request (Request): Request used to build absolute media URLs.
+        per_row (int): Maximum number of videos per category.
+
+    Returns:
+        list: [{"category": str, "videos": [...]}, ...] ordered by category.
+    """
+    cache_key = f"video-rows:{catalogue_version()}:{per_row}"
+    with span("cache"):
+        rows = cache.get(cache_key)
+    if rows is not None:
+        return rows
+
+    ranked = (
+        Video.objects.annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F("category"),
+                order_by=F("created_at").desc(),
+            )
+        )
+        .filter(row_number__lte=per_row)
+        .order_by("category", "row_number")
+        .values(*VideoListSerializer.FIELDS)
+    )
+    data = VideoListSerializer(
+        ranked,
+        many=True,
+        fields=VideoListSerializer.FIELDS,
+        context={"request": request},
+    ).data
+
+    rows = []
+    for video in data:
+        if not rows or rows[-1]["category"] != video["category"]:
+            rows.append({"category": video["category"], "videos": []})
+        rows[-1]["videos"].append(video)
+
+    with span("cache"):
+        cache.set(cache_key, rows, timeout=settings.VIDEO_ROWS_CACHE_TIMEOUT)
+    return rows
+
+
+def update_search_vector(video_id: int) -> None:
+    """Recompute the stored full-text document of a single video.
+
+    Title is weighted highest, then description, then category.
+    Only PostgreSQL supports tsvector columns; other backends are skipped.
+
+    Args:
+        video_id (int): Primary key of the video to update.
+    """
+    if connection.vendor != "postgresql":
+        return
+
+    config = settings.VIDEO_SEARCH_CONFIG
+    Video.objects.filter(pk=video_id).update(
+        search_vector=SearchVector("title", weight="A", config=config)
+        + SearchVector("description", weight="B", config=config)
+        + SearchVector("category", weight="C", config=config)
+    )
+
+
+def search_videos(query: str):
+    """Return videos matching a free-text query, best matches first.
+
+    On PostgreSQL the GIN-indexed `search_vector` is matched with a
+    websearch-style query and ranked with ts_rank. Other backends fall
+    back to a simple icontains filter (development and tests only).
+
+    Args:
+        query (str): User supplied search string.
+
+    Returns:
+        QuerySet: Matching videos.
+    """
+    if connection.vendor != "postgresql":
+        return Video.objects.filter(
+            Q(title__icontains=query)
+            | Q(description__icontains=query)
+            | Q(category__icontains=query)
+        ).order_by("-created_at")
+
+    search_query = SearchQuery(
+        query, search_type="websearch", config=settings.VIDEO_SEARCH_CONFIG
+    )
+    return (
+        Video.objects.filter(search_vector=search_query)
+        .annotate(rank=SearchRank(F("search_vector"), search_query))
+        .order_by("-rank", "-created_at")
+    )
+
+
+class SyncCursorExpired(ValueError):
+    """Raised for a cursor older than the tombstone retention."""
+
+
+def encode_sync_cursor(updated_at: datetime, video_id: int) -> str:
+    """Encode a delta-sync position as "<iso timestamp>|<id>".
+
+    The timestamp is written in UTC with a "Z" suffix, so the cursor has
+    no "+" that would turn into a space if a client forgot to URL-encode it.
+    """
+    timestamp = updated_at.astimezone(dt_timezone.utc).isoformat()
+    return f"{timestamp.replace('+00:00', 'Z')}|{video_id}"
+
+
+def decode_sync_cursor(cursor: str):
+    """Decode a cursor produced by `encode_sync_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+
+    Returns:
+        tuple: (updated_at, video_id)
+    """
+    timestamp, _, video_id = cursor.partition("|")
+    # Older cursors carry "+00:00", which arrives as " 00:00" unencoded
+    updated_at = datetime.fromisoformat(timestamp.replace(" ", "+"))
+    if timezone.is_naive(updated_at):
+        updated_at = timezone.make_aware(updated_at)
+    return updated_at, int(video_id or 0)
+
+
+def get_catalogue_changes(request, cursor: str | None, limit: int) -> dict:
+    """Return videos created, changed or deleted after `cursor`.
+
+    Rows are read in (updated_at, id) keyset order using the composite
+    index, including soft-deleted tombstones. Changes younger than
+    VIDEO_SYNC_SETTLE_SECONDS are held back so that transactions still in
+    flight cannot be skipped by a client that advances its cursor.
+    Tombstones are purged after VIDEO_TOMBSTONE_DAYS, so older cursors
+    are refused: the client could miss deletions and must sync in full.
+
+    Args:
+        request (Request): Request used to build absolute media URLs.
+        cursor (str | None): Cursor from a previous response, None for a full sync.
+        limit (int): Maximum number of rows in this batch.
+
+    Raises:
+        SyncCursorExpired: If the cursor is older than VIDEO_TOMBSTONE_DAYS.
+        ValueError: If the cursor is malformed.
+
+    Returns:
+        dict: {"changed": [...], "deleted": [ids], "cursor": str | None,
+               "has_more": bool}
+    """
+    fields = VideoListSerializer.FIELDS
+    upper = timezone.now() - timedelta(seconds=settings.VIDEO_SYNC_SETTLE_SECONDS)
+    queryset = Video.all_objects.filter(updated_at__lt=upper)
+    if cursor:
+        updated_at, video_id = decode_sync_cursor(cursor)
+        if updated_at < timezone.now() - timedelta(days=settings.VIDEO_TOMBSTONE_DAYS):
+            raise SyncCursorExpired("cursor predates the tombstone retention")
+        queryset = queryset.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=video_id)
+        )
+    else:
+        # A full sync has nothing to delete on the client.
+        queryset = queryset.filter(deleted_at__isnull=True)
+
+    rows = list(
+        queryset.order_by("updated_at", "id").values(
+            *fields, "updated_at", "deleted_at"
+        )[: limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    serializer = VideoListSerializer(fields=fields, context={"request": request})
+    changed = [serializer.to_representation(r) for r in rows if r["deleted_at"] is None]
+    deleted = [r["id"] for r in rows if r["deleted_at"] is not None]
+
+    if rows:
+        cursor = encode_sync_cursor(rows[-1]["updated_at"], rows[-1]["id"])
+
+    return {
+        "changed": changed,
+        "deleted": deleted,
+        "cursor": cursor,
+        "has_more": has_more,
+    }
+
+
+def get_trending(request, hours: int, limit: int) -> list:
+    """Return the most played videos of the last `hours` hours.
+
+    Plays are read from the hourly rollups written by the analytics job.
+    Unique viewers cannot be added up across hours and renditions, so
+    they are counted from the Redis viewer sets of the window (None if
+    Redis is unavailable). The result is cached briefly.
+
+    Args:
+        request (Request): Request used to build absolute media URLs.
+        hours (int): Size of the time window.
+        limit (int): Maximum number of videos.
+
+    Returns:
+        list: Videos (listing fields) with "plays" and "unique_viewers",
+              most played first.
+    """
+    cache_key = f"video-trending:{hours}:{limit}"
+    with span("cache"):
+        trending = cache.get(cache_key)
+    if trending is not None:
+        return trending
+
+    since = timezone.now() - timedelta(hours=hours)
+    top = list(
+        VideoHourlyStats.objects.filter(hour__gte=since)
+        .values("video")
+        .annotate(plays=Sum("plays"))
+        .order_by("-plays", "video")[:limit]
+    )
+    viewers = count_unique_viewers([t["video"] for t in top], since)
+    videos = {
+        row["id"]: row
+        for row in Video.objects.filter(id__in=[t["video"] for t in top]).values(
+            *VideoListSerializer.FIELDS
+        )
+    }
+
+    serializer = VideoListSerializer(
+        fields=VideoListSerializer.FIELDS, context={"request": request}
+    )
+    trending = [
+        {
+            **serializer.to_representation(videos[t["video"]]),
+            "plays": t["plays"],
+            "unique_viewers": viewers.get(t["video"]),
+        }
+        for t in top
+        if t["video"] in videos
+    ]
+
+    with span("cache"):
+        cache.set(cache_key, trending, timeout=settings.VIDEO_TRENDING_CACHE_TIMEOUT)
+    return trending
+
+
+def get_qoe_report(hours: int, group_by: tuple) -> list:
+    """Aggregate playback telemetry into quality-of-experience metrics.
+
+    Args:
+        hours (int): Size of the time window.
+        group_by (tuple): Grouping columns, e.g. ("resolution",) or ("video_id",).
+
+    Returns:
+        list: One dict per group with sessions, avg_startup_ms, rebuffer_ms,
+              played_ms, rebuffer_events, switches and rebuffer_ratio
+              (stalled time / (played + stalled time)).
+    """
+    since = timezone.now() - timedelta(hours=hours)
+    rows = (
+        PlaybackEvent.objects.filter(received_at__gte=since)
+        .values(*group_by)
+        .annotate(
+            sessions=Count("session", distinct=True),
+            avg_startup_ms=Avg("value_ms", filter=Q(kind=PlaybackEvent.KIND_STARTUP)),
+            rebuffer_ms=Sum("value_ms", filter=Q(kind=PlaybackEvent.KIND_REBUFFER)),
+            played_ms=Sum("value_ms", filter=Q(kind=PlaybackEvent.KIND_PLAY)),
+            rebuffer_events=Count("id", filter=Q(kind=PlaybackEvent.KIND_REBUFFER)),
+            switches=Count("id", filter=Q(kind=PlaybackEvent.KIND_SWITCH)),
+        )
+        .order_by(*group_by)
+    )
+
+    report = []
+    for row in rows:
+        rebuffer_ms = row["rebuffer_ms"] or 0
+        watched_ms = (row["played_ms"] or 0) + rebuffer_ms
+        row["rebuffer_ratio"] = rebuffer_ms / watched_ms if watched_ms else None
+        report.append(row)
+    return report
+
+
+def get_transcode_stats(days: int) -> list:
+    """Aggregate per-rendition encode statistics of recent transcode jobs.
+
+    Args:
+        days (int): Size of the time window.
+
+    Returns:
+        list: One dict per resolution with encodes, failed, avg_wall_time,
+              max_wall_time, avg_cpu_time, avg_speed, output_bytes,
+              avg_segment_count and cpu_per_media_second (CPU seconds
+              needed per second of media, for capacity planning).
+    """
+    since = timezone.now() - timedelta(days=days)
+    succeeded = Q(status=TranscodeJob.STATUS_SUCCEEDED)
+    rows = (
+        RenditionOutput.objects.filter(job__created_at__gte=since)
+        .values("resolution")
+        .annotate(
+            encodes=Count("id"),
+            failed=Count("id", filter=Q(status=TranscodeJob.STATUS_FAILED)),
+            avg_wall_time=Avg("wall_time", filter=succeeded),
+            max_wall_time=Max("wall_time", filter=succeeded),
+            avg_cpu_time=Avg("cpu_time", filter=succeeded),
+            avg_speed=Avg("speed", filter=succeeded),
+            output_bytes=Sum("output_bytes", filter=succeeded),
+            avg_segment_count=Avg("segment_count", filter=succeeded),
+            cpu_time=Sum("cpu_time", filter=succeeded),
+            media_duration=Sum("media_duration", filter=succeeded),
+        )
+        .order_by("resolution")
+    )
+
+    stats = []
+    for row in rows:
+        cpu_time, media_duration = row.pop("cpu_time"), row.pop("media_duration")
+        row["cpu_per_media_second"] = (
+            cpu_time / media_duration if cpu_time and media_duration else None
+        )
+        stats.append(row)
+    return stats
@@ -1,18 +1,75 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
-from .views import VideoListView, VideoMasterView, VideoSegmentView
+from .views import (
+    PlaybackQualityReportView,
+    PlaybackTelemetryView,
+    TranscodeStatsView,
+    VideoCategoryRowsView,
+    VideoIFramePlaylistView,
+    VideoListView,
+    VideoMasterView,
+    VideoMultivariantView,
+    VideoSearchView,
+    VideoSegmentView,
+    VideoSyncView,
+    VideoTrendingView,
+    VideoUploadView,
+    WatchProgressView,
+)
 
 # URL routing for video-related API endpoints (HLS streaming).
 urlpatterns = [
     # Returns a list of all available videos (JSON response).
     path("video/", VideoListView.as_view(), name="video-list"),
+    # Admin upload of a new video; the file is probed before anything is queued.
+    path("video/upload/", VideoUploadView.as_view(), name="video-upload"),
+    # Returns the newest videos per category, grouped into home screen rows.
+    path("video/rows/", VideoCategoryRowsView.as_view(), name="video-rows"),
+    # Full-text search over the catalogue, ranked and paginated.
+    path("video/search/", VideoSearchView.as_view(), name="video-search"),
+    # Delta-sync: videos created, changed or deleted since a cursor.
+    path("video/sync/", VideoSyncView.as_view(), name="video-sync"),
+    # Most played videos of a recent time window (from hourly rollups).
+    path("video/trending/", VideoTrendingView.as_view(), name="video-trending"),
+    # Batched client playback (QoE) telemetry beacons.
+    path("video/telemetry/", PlaybackTelemetryView.as_view(), name="video-telemetry"),
+    # Admin report: startup time and rebuffer ratio per rendition/video.
+    path(
+        "video/telemetry/report/",
+        PlaybackQualityReportView.as_view(),
+        name="video-telemetry-report",
+    ),
+    # Admin report: encode time, speed and output size per rendition.
+    path(
+        "video/transcode/stats/",
+        TranscodeStatsView.as_view(),
+        name="video-transcode-stats",
+    ),
+    # Resume position of the current user (GET) and playback heartbeats (PUT).
+    path(
+        "video/<int:movie_id>/progress/",
+        WatchProgressView.as_view(),
+        name="video-progress",
+    ),
+    # Returns the master playlist of all renditions of a video.
+    path(
+        "video/<int:movie_id>/master.m3u8",
+        VideoMultivariantView.as_view(),
+        name="video-multivariant",
+    ),
     # Returns the HLS master playlist (index.m3u8) for a given video and resolution.
     path(
         "video/<int:movie_id>/<str:resolution>/index.m3u8",
         VideoMasterView.as_view(),
         name="video-master",
     ),
+    # Returns the I-frame-only playlist (trick play) of a rendition.
+    path(
+        "video/<int:movie_id>/<str:resolution>/iframes.m3u8",
+        VideoIFramePlaylistView.as_view(),
+        name="video-iframes",
+    ),
     # Returns a single HLS segment (.ts file) for a given video and resolution.
     path(
         "video/<int:movie_id>/<str:resolution>/<str:segment>/",
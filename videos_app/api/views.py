@@ -1,13 +1,49 @@
-from django.http import FileResponse, Http404
-from django.shortcuts import get_object_or_404
-from rest_framework.generics import ListAPIView
-from rest_framework.permissions import IsAuthenticated
+import asyncio
+import json
+from pathlib import Path
+from stat import S_ISREG
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+from django.views import View
+from rest_framework.generics import CreateAPIView, ListAPIView
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from core.metrics import HLS_BYTES_SERVED
+from core.timing import span
+
+from ..analytics import MAX_WINDOW_HOURS, record_playlist_view, record_segment_hit
+from ..hls import IFRAME_PLAYLIST
 from ..models import Video
-from ..tasks import get_hls_dir
-from .serializers import VideoSerializer
+from ..progress import get_progress, record_progress
+from ..telemetry import InvalidBeacon, append_beacon, validate_beacon
+from ..tasks import AUDIO_RENDITION, get_hls_dir, get_master_playlist
+from .serializers import (
+    VideoListSerializer,
+    VideoSerializer,
+    WatchProgressSerializer,
+)
+from .services import (
+    SyncCursorExpired,
+    get_catalogue_changes,
+    get_category_rows,
+    get_qoe_report,
+    get_transcode_stats,
+    get_trending,
+    search_videos,
+)
+
+# Bytes per read when streaming HLS segments
+STREAM_CHUNK_SIZE = 64 * 1024
 
 
 class CookieJWTAuthentication(JWTAuthentication):
@@ -22,36 +58,436 @@ class CookieJWTAuthentication(JWTAuthentication):
     """
 
     def authenticate(self, request):
-        # Case 1: Authorization header present
-        header = self.get_header(request)
-        if header is not None:
-            return super().authenticate(request)
+        with span("auth"):
+            # Case 1: Authorization header present
+            header = self.get_header(request)
+            if header is not None:
+                return super().authenticate(request)
 
-        # Case 2: Fallback to cookie
-        raw = request.COOKIES.get("access_token")
-        if not raw:
-            return None
+            # Case 2: Fallback to cookie
+            raw = request.COOKIES.get("access_token")
+            if not raw:
+                return None
 
-        token = self.get_validated_token(raw)
-        return self.get_user(token), token
+            token = self.get_validated_token(raw)
+            return self.get_user(token), token
 
 
 class VideoListView(ListAPIView):
     """
     API endpoint that returns a list of all available videos.
 
+    Query parameters:
+      - fields (str, optional): Comma-separated sparse fieldset, e.g. "id,title".
+
     Requires authentication (JWT via header or 'access_token' cookie).
     """
-    queryset = Video.objects.all()
+    serializer_class = VideoListSerializer
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Video.objects.values(*VideoListSerializer.requested_fields(self.request))
+
+
+class VideoUploadView(CreateAPIView):
+    """
+    Admin endpoint for uploading a new video (multipart form).
+
+    The file is probed with ffprobe before the video is saved; corrupt,
+    audio-only or non-video files are rejected with 400 and no transcode
+    is queued. Accepted uploads store the probed duration and stream info.
+    """
     serializer_class = VideoSerializer
     authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser, FormParser]
+
+
+class VideoCategoryRowsView(APIView):
+    """
+    API endpoint that returns the home screen rows: the newest videos
+    of every category, grouped by category.
+
+    Query parameters:
+      - per_row (int, optional): Videos per category, capped at
+        VIDEO_ROWS_MAX_PER_CATEGORY. Defaults to VIDEO_ROWS_PER_CATEGORY.
+    """
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            per_row = int(
+                request.query_params.get("per_row", settings.VIDEO_ROWS_PER_CATEGORY)
+            )
+        except ValueError:
+            per_row = settings.VIDEO_ROWS_PER_CATEGORY
+        per_row = max(1, min(per_row, settings.VIDEO_ROWS_MAX_PER_CATEGORY))
+
+        return Response(get_category_rows(request, per_row))
+
+
+class VideoSearchPagination(PageNumberPagination):
+    """Page-number pagination for search results (`?page=` / `?page_size=`)."""
+
+    page_size = settings.VIDEO_SEARCH_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class VideoSearchView(ListAPIView):
+    """
+    API endpoint for full-text search over title, description and category.
+
+    Query parameters:
+      - q (str): Search terms (websearch syntax: "quoted phrases", -exclude, or).
+      - page, page_size (int, optional): Pagination controls.
+
+    Results are ranked by relevance. An empty query returns an empty page.
+    Supports the same `fields` sparse fieldset as the list endpoint.
+    """
+    serializer_class = VideoListSerializer
+    pagination_class = VideoSearchPagination
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        query = self.request.query_params.get("q", "").strip()
+        if not query:
+            return Video.objects.none()
+        fields = VideoListSerializer.requested_fields(self.request)
+        return search_videos(query).values(*fields)
+
+
+class VideoSyncView(APIView):
+    """
+    API endpoint for delta-sync of locally cached catalogues.
+
+    Query parameters:
+      - cursor (str, optional): Cursor returned by the previous call,
+        URL-encoded like any query value. Omit it for a full (initial)
+        sync. A cursor older than VIDEO_TOMBSTONE_DAYS gets 410 Gone;
+        the client must then discard its cache and sync in full.
+      - limit (int, optional): Batch size, capped at VIDEO_SYNC_PAGE_SIZE.
+
+    Response:
+      - changed: Videos created or updated since the cursor.
+      - deleted: IDs of videos removed since the cursor.
+      - cursor: Pass this to the next call.
+      - has_more: True if another batch is immediately available.
+    """
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = int(
+                request.query_params.get("limit", settings.VIDEO_SYNC_PAGE_SIZE)
+            )
+        except ValueError:
+            limit = settings.VIDEO_SYNC_PAGE_SIZE
+        limit = max(1, min(limit, settings.VIDEO_SYNC_PAGE_SIZE))
+
+        try:
+            changes = get_catalogue_changes(
+                request, request.query_params.get("cursor"), limit
+            )
+        except SyncCursorExpired:
+            return Response(
+                {"detail": "Cursor expired, run a full sync."},
+                status=status.HTTP_410_GONE,
+            )
+        except ValueError:
+            return Response(
+                {"detail": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(changes)
+
+
+class VideoTrendingView(APIView):
+    """
+    API endpoint that returns the most played videos of a recent time window.
+
+    Query parameters:
+      - hours (int, optional): Window size, 1-168. Defaults to 24.
+      - limit (int, optional): Number of videos, 1-50. Defaults to 10.
+    """
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            hours = int(request.query_params.get("hours", 24))
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            hours, limit = 24, 10
+        hours = max(1, min(hours, MAX_WINDOW_HOURS))
+        limit = max(1, min(limit, 50))
+
+        return Response(get_trending(request, hours, limit))
+
+
+class PlaybackTelemetryView(APIView):
+    """
+    Beacon endpoint for batched client playback (QoE) events.
+
+    Body (JSON, any content type so navigator.sendBeacon works):
+        {"session": "<id>", "events": [[video_id, resolution, kind, value_ms], ...]}
+
+    kind is one of "startup", "rebuffer", "play", "switch". The batch is
+    validated with plain type checks and appended to a Redis stream as a
+    single entry; a background job bulk-inserts it into the database.
+    """
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        if len(request.body) > settings.QOE_MAX_BEACON_BYTES:
+            return Response(
+                {"detail": "Beacon too large."},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+
+        try:
+            session, events = validate_beacon(json.loads(request.body))
+        except (ValueError, InvalidBeacon) as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        append_beacon(session, events, request.user.pk)
+        return Response({"accepted": len(events)}, status=status.HTTP_202_ACCEPTED)
+
+
+class PlaybackQualityReportView(APIView):
+    """
+    Admin report of playback quality: startup time and rebuffer ratio.
+
+    Query parameters:
+      - group (str, optional): "rendition" (default), "video" or "video_rendition".
+      - hours (int, optional): Time window, 1-720. Defaults to 24.
+    """
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAdminUser]
+
+    GROUPS = {
+        "rendition": ("resolution",),
+        "video": ("video_id",),
+        "video_rendition": ("video_id", "resolution"),
+    }
+
+    def get(self, request):
+        group_by = self.GROUPS.get(request.query_params.get("group", "rendition"))
+        if group_by is None:
+            return Response(
+                {"detail": f"group must be one of {', '.join(self.GROUPS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            hours = int(request.query_params.get("hours", 24))
+        except ValueError:
+            hours = 24
+        hours = max(1, min(hours, 720))
+
+        return Response(get_qoe_report(hours, group_by))
+
+
+class TranscodeStatsView(APIView):
+    """
+    Admin report of encode performance per rendition (from TranscodeJob).
+
+    Query parameters:
+      - days (int, optional): Time window, 1-365. Defaults to 30.
+    """
+    authentication_classes = [CookieJWTAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            days = int(request.query_params.get("days", 30))
+        except ValueError:
+            days = 30
+        days = max(1, min(days, 365))
+
+        return Response(get_transcode_stats(days))
+
+
+class WatchProgressView(APIView):
+    """
+    API endpoint for the viewer's resume position in a video.
+
+    - GET returns the last known position (position 0 if never watched).
+    - PUT records a playback heartbeat {"position": float, "duration": float}.
+
+    Heartbeats are buffered in Redis and written to the database in
+    batches by a periodic job, so they never touch the database.
+    Heartbeats for unknown videos are dropped by the flush job.
+
+    URL parameters:
+      - movie_id (int): Primary key of the video.
+    """
+    authentication_classes = [CookieJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
+    def get(self, request, movie_id: int):
+        progress = get_progress(request.user.pk, movie_id) or {
+            "position": 0.0,
+            "duration": None,
+            "updated_at": None,
+        }
+        return Response(WatchProgressSerializer(progress).data)
+
+    def put(self, request, movie_id: int):
+        serializer = WatchProgressSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        progress = record_progress(
+            request.user.pk,
+            movie_id,
+            serializer.validated_data["position"],
+            serializer.validated_data.get("duration"),
+        )
+        return Response(
+            WatchProgressSerializer(progress).data, status=status.HTTP_202_ACCEPTED
+        )
+
+
+class AsyncJWTRequiredMixin:
+    """
+    Async-compatible JWT check for plain Django views.
+
+    Mirrors CookieJWTAuthentication + IsAuthenticated: the token is read from
+    the Authorization header or the 'access_token' cookie, and the user lookup
+    runs in a worker thread so the event loop is never blocked.
+    Responds with 401 if the request is not authenticated.
+    """
+
+    authenticator = CookieJWTAuthentication()
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            result = await sync_to_async(self.authenticator.authenticate)(request)
+        except AuthenticationFailed as exc:
+            detail = exc.detail
+            return self.unauthorized(
+                detail if isinstance(detail, dict) else {"detail": detail}
+            )
+
+        if result is None:
+            return self.unauthorized(
+                {"detail": "Authentication credentials were not provided."}
+            )
+
+        request.user, request.auth = result
+        return await super().dispatch(request, *args, **kwargs)
+
+    def unauthorized(self, detail: dict) -> JsonResponse:
+        response = JsonResponse(detail, status=401)
+        response["WWW-Authenticate"] = self.authenticator.authenticate_header(None)
+        return response
+
+
+async def read_file_chunks(
+    path: Path,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    start: int = 0,
+    length: int | None = None,
+):
+    """Yield a file's content in chunks, reading in a worker thread.
+
+    Args:
+        path (Path): File to stream.
+        chunk_size (int): Bytes per read.
+        start (int): Offset to start at.
+        length (int, optional): Bytes to read; default until the end.
+    """
+    f = await asyncio.to_thread(path.open, "rb")
+    try:
+        if start:
+            await asyncio.to_thread(f.seek, start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            chunk = await asyncio.to_thread(f.read, size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(f.close)
+
+
+def parse_byte_range(header: str, size: int) -> tuple | None:
+    """Parse a single-range `Range` header ("bytes=a-b", "a-", "-n").
+
+    Args:
+        header (str): Value of the Range header.
+        size (int): Size of the resource.
+
+    Raises:
+        ValueError: If the range cannot be satisfied.
+
+    Returns:
+        tuple | None: (start, end) inclusive, or None if the header is
+                      malformed or asks for several ranges (serve it all).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise ValueError("unsatisfiable range")
+    return start, end
+
+
+def file_size(path: Path) -> int | None:
+    """Return the size of a regular file, or None if it does not exist."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_size if S_ISREG(stat.st_mode) else None
+
+
+class VideoMultivariantView(AsyncJWTRequiredMixin, View):
+    """
+    Async endpoint that serves the master playlist listing every rendition
+    of a video (and the shared audio group, if encoded that way), so
+    players can switch renditions adaptively.
+
+    URL parameters:
+      - movie_id (int): Primary key of the video.
+
+    Raises:
+      - Http404 if the video has no master playlist (yet).
+    """
+
+    async def get(self, request, movie_id: int):
+        video = await aget_object_or_404(Video, pk=movie_id)
 
-class VideoMasterView(APIView):
+        try:
+            playlist = await asyncio.to_thread(get_master_playlist(video).read_bytes)
+        except OSError:
+            raise Http404("master not found")
+
+        HLS_BYTES_SERVED.labels("master").inc(len(playlist))
+        return HttpResponse(playlist, content_type="application/vnd.apple.mpegurl")
+
+
+class VideoMasterView(AsyncJWTRequiredMixin, View):
     """
-    API endpoint that serves the HLS master playlist (index.m3u8)
-    for a specific video at a given resolution.
+    Async endpoint that serves the HLS master playlist (index.m3u8)
+    for a specific video at a given resolution. Requests are counted as
+    plays for the popularity analytics (once per viewing session, see
+    `record_playlist_view`); the shared audio playlist is not counted.
 
     URL parameters:
       - movie_id (int): Primary key of the video.
@@ -61,30 +497,72 @@ class VideoMasterView(APIView):
       - Http404 if the resolution is invalid.
       - Http404 if the playlist file does not exist.
     """
-    authentication_classes = [CookieJWTAuthentication]
-    permission_classes = [IsAuthenticated]
 
-    def get(self, request, movie_id: int, resolution: str):
-        video = get_object_or_404(Video, pk=movie_id)
+    async def get(self, request, movie_id: int, resolution: str):
+        video = await aget_object_or_404(Video, pk=movie_id)
 
         try:
             hls_dir = get_hls_dir(video, resolution)
         except ValueError:
             raise Http404("resolution not available")
 
-        playlist_path = hls_dir / "index.m3u8"
-        if not playlist_path.exists():
+        try:
+            playlist = await asyncio.to_thread((hls_dir / "index.m3u8").read_bytes)
+        except OSError:
             raise Http404("master not found")
 
-        return FileResponse(
-            playlist_path.open("rb"),
-            content_type="application/vnd.apple.mpegurl",
-        )
+        if resolution != AUDIO_RENDITION:
+            await asyncio.to_thread(
+                record_playlist_view, video.pk, resolution, request.user.pk
+            )
+        HLS_BYTES_SERVED.labels(resolution).inc(len(playlist))
 
+        return HttpResponse(playlist, content_type="application/vnd.apple.mpegurl")
 
-class VideoSegmentView(APIView):
+
+class VideoIFramePlaylistView(AsyncJWTRequiredMixin, View):
     """
-    API endpoint that serves a single HLS video segment (.ts file).
+    Async endpoint that serves the I-frame-only playlist (iframes.m3u8)
+    of a rendition, used by players for fast-forward and scrubbing. It
+    lists keyframe byte ranges inside the rendition's segments.
+
+    URL parameters:
+      - movie_id (int): Primary key of the video.
+      - resolution (str): Target resolution, e.g. "480p", "720p", "1080p".
+
+    Raises:
+      - Http404 if the resolution is invalid.
+      - Http404 if the playlist file does not exist.
+    """
+
+    async def get(self, request, movie_id: int, resolution: str):
+        video = await aget_object_or_404(Video, pk=movie_id)
+
+        try:
+            hls_dir = get_hls_dir(video, resolution)
+        except ValueError:
+            raise Http404("resolution not available")
+
+        try:
+            playlist = await asyncio.to_thread((hls_dir / IFRAME_PLAYLIST).read_bytes)
+        except OSError:
+            raise Http404("I-frame playlist not found")
+
+        HLS_BYTES_SERVED.labels(resolution).inc(len(playlist))
+        return HttpResponse(playlist, content_type="application/vnd.apple.mpegurl")
+
+
+class VideoSegmentView(AsyncJWTRequiredMixin, View):
+    """
+    Async endpoint that streams a single HLS video segment (.ts file).
+
+    The segment is streamed in chunks read in a worker thread, so slow
+    clients hold a cheap coroutine instead of a worker process. Each
+    served segment is counted for the popularity analytics.
+
+    A single byte range (`Range` header) is answered with 206, so I-frame
+    playlists can fetch just a keyframe. Range requests are not counted
+    as segment hits.
 
     URL parameters:
       - movie_id (int): Primary key of the video.
@@ -97,16 +575,15 @@ class VideoSegmentView(APIView):
     Raises:
       - Http404 if the resolution is invalid.
       - Http404 if the segment does not exist or the name is invalid.
+      - 416 if the requested byte range is outside the segment.
     """
-    authentication_classes = [CookieJWTAuthentication]
-    permission_classes = [IsAuthenticated]
 
-    def get(self, request, movie_id: int, resolution: str, segment: str):
+    async def get(self, request, movie_id: int, resolution: str, segment: str):
         # Prevent directory traversal attempts
         if "/" in segment or "\\" in segment:
             raise Http404("invalid segment")
 
-        video = get_object_or_404(Video, pk=movie_id)
+        video = await aget_object_or_404(Video, pk=movie_id)
 
         try:
             hls_dir = get_hls_dir(video, resolution)
@@ -114,10 +591,34 @@ class VideoSegmentView(APIView):
             raise Http404("resolution not available")
 
         segment_path = hls_dir / segment
-        if not segment_path.exists():
+        size = await asyncio.to_thread(file_size, segment_path)
+        if size is None:
             raise Http404("segment not found")
 
-        return FileResponse(
-            segment_path.open("rb"),
+        try:
+            byte_range = parse_byte_range(request.headers.get("Range", ""), size)
+        except ValueError:
+            response = HttpResponse(
+                status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+            )
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+        if byte_range is None:
+            await asyncio.to_thread(record_segment_hit, video.pk, resolution)
+            start, end, http_status = 0, size - 1, status.HTTP_200_OK
+        else:
+            (start, end), http_status = byte_range, status.HTTP_206_PARTIAL_CONTENT
+        length = end - start + 1
+        HLS_BYTES_SERVED.labels(resolution).inc(length)
+
+        response = StreamingHttpResponse(
+            read_file_chunks(segment_path, start=start, length=length),
             content_type="video/MP2T",
+            status=http_status,
         )
+        response["Content-Length"] = str(length)
+        response["Accept-Ranges"] = "bytes"
+        if http_status == status.HTTP_206_PARTIAL_CONTENT:
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return response
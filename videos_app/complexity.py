@@ -0,0 +1,100 @@
+import math
+from pathlib import Path
+
+from django.conf import settings
+
+# Probe encodes: fixed low resolution and quality, so their bitrate only
+# depends on how hard the content is to compress
+PROBE_HEIGHT = 240
+PROBE_CRF = 23
+BASE_CRF = 23
+
+# Bounds of the per-title scale factor applied to the nominal bitrates
+MIN_FACTOR = 0.4
+MAX_FACTOR = 1.5
+
+
+def sample_windows(duration: float) -> list:
+    """Spread TRANSCODE_ANALYSIS_SAMPLES windows evenly over a video.
+
+    Returns:
+        list: [(start, length), ...] in seconds; one window covering the
+              whole video if it is too short to sample.
+    """
+    count = settings.TRANSCODE_ANALYSIS_SAMPLES
+    length = settings.TRANSCODE_ANALYSIS_SAMPLE_SECONDS
+    if duration <= count * length:
+        return [(0.0, duration)]
+    step = duration / count
+    return [(i * step + (step - length) / 2, length) for i in range(count)]
+
+
+def probe_command(
+    src: Path, start: float, length: float, output: Path, threads: int | None = None
+) -> list:
+    """Build the ffmpeg command of one probe encode (raw H.264, no audio)."""
+    return [
+        "ffmpeg",
+        "-y",
+        "-nostats",
+        "-loglevel",
+        "error",
+        *(["-threads", str(threads)] if threads else []),
+        "-ss",
+        f"{start:.3f}",
+        "-i",
+        str(src),
+        "-t",
+        f"{length:.3f}",
+        "-an",
+        "-vf",
+        f"scale=-2:{PROBE_HEIGHT}",
+        "-c:v",
+        "libx264",
+        "-preset",
+        "ultrafast",
+        "-crf",
+        str(PROBE_CRF),
+        *(["-threads", str(threads)] if threads else []),
+        "-f",
+        "h264",
+        str(output),
+    ]
+
+
+def encoding_profile(complexity: float, renditions: dict) -> dict:
+    """Derive per-rendition encoder settings from a complexity score.
+
+    The score is the probe bitrate in kbit/s. Relative to
+    TRANSCODE_REFERENCE_COMPLEXITY (content the nominal ladder was made
+    for) it scales the nominal bitrate of every rendition into a maxrate
+    cap, with a VBV buffer of twice that. Simple content also gets a
+    slightly higher CRF and complex content a slightly lower one.
+
+    Args:
+        complexity (float): Probe bitrate in kbit/s.
+        renditions (dict): Nominal renditions (RENDITIONS).
+
+    Returns:
+        dict: {"complexity", "factor", "renditions": {res: {"crf",
+              "maxrate", "bufsize"}}}
+    """
+    factor = complexity / settings.TRANSCODE_REFERENCE_COMPLEXITY
+    factor = min(MAX_FACTOR, max(MIN_FACTOR, factor))
+    crf = round(BASE_CRF + 2 * (1 - factor))
+
+    ladder = {}
+    for res, cfg in renditions.items():
+        if not cfg.get("v_bitrate"):
+            continue
+        maxrate = math.ceil(int(cfg["v_bitrate"].rstrip("k")) * factor)
+        ladder[res] = {
+            "crf": crf,
+            "maxrate": f"{maxrate}k",
+            "bufsize": f"{2 * maxrate}k",
+        }
+    return {
+        "complexity": round(complexity, 1),
+        "factor": round(factor, 3),
+        "renditions": ladder,
+    }
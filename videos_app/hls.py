@@ -0,0 +1,467 @@
+import errno
+import json
+import math
+import os
+import shutil
+import tempfile
+import uuid
+from pathlib import Path
+
+# Name of the playlist ffmpeg writes while encoding, the accumulated
+# playlist of segments finished before a crash, and the published playlist
+WORK_PLAYLIST = "encoding.m3u8"
+CHECKPOINT_PLAYLIST = "checkpoint.m3u8"
+PLAYLIST = "index.m3u8"
+
+# I-frame-only playlist of a rendition (keyframe byte ranges in its segments)
+IFRAME_PLAYLIST = "iframes.m3u8"
+
+TS_PACKET_SIZE = 188
+
+# Group ID of the shared audio rendition in the master playlist
+AUDIO_GROUP = "aud"
+
+# Largest difference (seconds) between the segment boundaries of two
+# renditions that still counts as aligned; covers one AAC frame
+ALIGNMENT_TOLERANCE = 0.1
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """Write a file so readers see either the old or the new content.
+
+    The data is written to a temporary file in the same directory, flushed
+    to disk and renamed over the target.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _fsync(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _version_prefix(target: Path) -> str:
+    return f".{target.name}.v-"
+
+
+def publish_directory(source: Path, target: Path) -> None:
+    """Publish a finished rendition directory under `target`.
+
+    The files are flushed to disk and the directory is moved to a new
+    hidden version directory next to `target` (copied sequentially if
+    `source` is on another file system, e.g. a local scratch disk).
+    `target` is a symlink to the current version: a new link is created
+    and renamed over it, so readers see either the old or the new
+    rendition, never a partial or missing one. The previous version is
+    deleted afterwards.
+
+    A `target` that is still a plain directory (published before
+    versioning) is moved aside just before the first swap.
+
+    Args:
+        source (Path): Directory with the finished rendition.
+        target (Path): Published path, e.g. MEDIA_ROOT/videos/x_hls_720p.
+    """
+    token = uuid.uuid4().hex[:8]
+    version = target.parent / f"{_version_prefix(target)}{token}"
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    for path in source.iterdir():
+        _fsync(path)
+    try:
+        os.rename(source, version)
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+        version.mkdir()
+        for path in sorted(source.iterdir()):
+            shutil.copyfile(path, version / path.name)
+            _fsync(version / path.name)
+        shutil.rmtree(source)
+    _fsync(version)
+
+    link = target.parent / f".{target.name}.link-{token}"
+    os.symlink(version.name, link)
+    if target.is_dir() and not target.is_symlink():
+        os.rename(target, target.parent / f"{_version_prefix(target)}old-{token}")
+    os.replace(link, target)
+    _fsync(target.parent)
+
+    # Earlier versions, including leftovers of interrupted publishes
+    prefix = _version_prefix(target)
+    for path in target.parent.iterdir():
+        if path.name.startswith(prefix) and path != version:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def remove_published(target: Path) -> None:
+    """Delete a published rendition: the link and every version behind it."""
+    if target.is_symlink():
+        target.unlink()
+    else:
+        shutil.rmtree(target, ignore_errors=True)
+    if target.parent.is_dir():
+        prefix = _version_prefix(target)
+        for path in target.parent.iterdir():
+            if path.name.startswith(prefix):
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def parse_playlist(playlist: Path) -> tuple:
+    """Read the segments of a media playlist.
+
+    Args:
+        playlist (Path): Playlist file; a missing file has no segments.
+
+    Returns:
+        tuple: ([(duration, uri), ...], ended) where `ended` is True if the
+               playlist carries #EXT-X-ENDLIST.
+    """
+    try:
+        lines = playlist.read_text().splitlines()
+    except FileNotFoundError:
+        return [], False
+
+    entries = []
+    duration = None
+    for line in lines:
+        line = line.strip()
+        if line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:") :].split(",", 1)[0])
+        elif line and not line.startswith("#") and duration is not None:
+            entries.append((duration, line))
+            duration = None
+    return entries, "#EXT-X-ENDLIST" in lines
+
+
+def render_vod_playlist(entries: list) -> str:
+    """Render a complete VOD media playlist from (duration, uri) entries."""
+    target = math.ceil(max((d for d, _ in entries), default=1))
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{target}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+        "#EXT-X-INDEPENDENT-SEGMENTS",
+    ]
+    for duration, uri in entries:
+        lines += [f"#EXTINF:{duration:.6f},", uri]
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def rendition_bandwidth(out_dir: Path) -> tuple:
+    """Measure the bitrate of a published rendition from its segments.
+
+    Returns:
+        tuple: (peak, average) in bits per second; peak is the highest
+               bitrate of any single segment.
+    """
+    peak = total_bits = total_duration = 0
+    for duration, uri in parse_playlist(out_dir / PLAYLIST)[0]:
+        bits = (out_dir / uri).stat().st_size * 8
+        total_bits += bits
+        total_duration += duration
+        if duration > 0:
+            peak = max(peak, bits / duration)
+    average = total_bits / total_duration if total_duration else 0
+    return math.ceil(peak), math.ceil(average)
+
+
+def _stream_attributes(
+    peak: int, average: int, codecs: list, resolution: str | None
+) -> str:
+    attributes = f"BANDWIDTH={peak},AVERAGE-BANDWIDTH={average}"
+    if codecs:
+        attributes += f',CODECS="{",".join(codecs)}"'
+    if resolution:
+        attributes += f",RESOLUTION={resolution}"
+    return attributes
+
+
+def render_master_playlist(
+    variants: list, audio: tuple | None = None, iframes: list = ()
+) -> str:
+    """Render a master playlist referencing the rendition playlists.
+
+    Args:
+        variants (list): [(uri, peak, average, codecs, resolution), ...] of
+            the video renditions; `codecs` is a list of RFC 6381 codec
+            strings, `resolution` "WIDTHxHEIGHT" or None if unknown.
+        audio (tuple, optional): (uri, peak, average, codecs) of a shared
+            audio rendition. Variants then reference it as an EXT-X-MEDIA
+            audio group, and their bandwidth and codecs include it.
+        iframes (list, optional): [(uri, peak, average, codecs,
+            resolution), ...] of I-frame playlists, advertised with
+            EXT-X-I-FRAME-STREAM-INF.
+
+    Returns:
+        str: The playlist text.
+    """
+    version = 4 if iframes else 3
+    lines = ["#EXTM3U", f"#EXT-X-VERSION:{version}", "#EXT-X-INDEPENDENT-SEGMENTS"]
+    group = ""
+    extra_peak, extra_average, extra_codecs = 0, 0, []
+    if audio:
+        lines.append(
+            f'#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="{AUDIO_GROUP}",NAME="Main",'
+            f'DEFAULT=YES,AUTOSELECT=YES,URI="{audio[0]}"'
+        )
+        group = f',AUDIO="{AUDIO_GROUP}"'
+        _, extra_peak, extra_average, extra_codecs = audio
+
+    for uri, peak, average, codecs, resolution in variants:
+        attributes = _stream_attributes(
+            peak + extra_peak,
+            average + extra_average,
+            codecs + extra_codecs if codecs else [],
+            resolution,
+        )
+        lines += [f"#EXT-X-STREAM-INF:{attributes}{group}", uri]
+    for uri, peak, average, codecs, resolution in iframes:
+        attributes = _stream_attributes(peak, average, codecs, resolution)
+        lines.append(f'#EXT-X-I-FRAME-STREAM-INF:{attributes},URI="{uri}"')
+    return "\n".join(lines) + "\n"
+
+
+def _pes_pts(payload: bytes) -> float | None:
+    """Return the PTS (seconds) of a PES packet header, if it has one."""
+    if len(payload) < 14 or not payload[7] & 0x80:
+        return None
+    p = payload[9:14]
+    ticks = (
+        ((p[0] >> 1) & 0x07) << 30
+        | p[1] << 22
+        | (p[2] >> 1) << 15
+        | p[3] << 7
+        | p[4] >> 1
+    )
+    return ticks / 90000
+
+
+def scan_keyframes(segment: Path) -> list:
+    """Locate the keyframes of an MPEG-TS segment.
+
+    A keyframe is a video PES packet whose TS packet carries the random
+    access indicator (as written by ffmpeg's muxer). Its byte range runs
+    up to the start of the next video frame.
+
+    Args:
+        segment (Path): The .ts file.
+
+    Returns:
+        list: [(pts, offset, length), ...] with pts in seconds.
+    """
+    data = segment.read_bytes()
+    video_pid = None
+    starts = []
+    for offset in range(0, len(data) - TS_PACKET_SIZE + 1, TS_PACKET_SIZE):
+        packet = data[offset : offset + TS_PACKET_SIZE]
+        # Only packets that start a PES packet (payload_unit_start)
+        if packet[0] != 0x47 or not packet[1] & 0x40:
+            continue
+        pid = (packet[1] & 0x1F) << 8 | packet[2]
+        if video_pid is not None and pid != video_pid:
+            continue
+
+        start, key = 4, False
+        if packet[3] & 0x20:
+            key = packet[4] > 0 and bool(packet[5] & 0x40)
+            start += 1 + packet[4]
+        payload = packet[start:]
+        if payload[:3] != b"\x00\x00\x01" or not 0xE0 <= payload[3] <= 0xEF:
+            continue
+        video_pid = pid
+        starts.append((offset, _pes_pts(payload), key))
+
+    keyframes = []
+    for index, (offset, pts, key) in enumerate(starts):
+        if key and pts is not None:
+            end = starts[index + 1][0] if index + 1 < len(starts) else len(data)
+            keyframes.append((pts, offset, end - offset))
+    return keyframes
+
+
+def write_iframe_playlist(out_dir: Path) -> bool:
+    """Write the I-frame-only playlist of a published rendition.
+
+    Every keyframe of the rendition's segments is listed as a byte range
+    of its segment, lasting until the next keyframe.
+
+    Args:
+        out_dir (Path): Output directory of the rendition.
+
+    Returns:
+        bool: False if no keyframes were found (nothing is written).
+    """
+    entries = parse_playlist(out_dir / PLAYLIST)[0]
+    frames = []
+    for _, uri in entries:
+        frames += [(pts, uri, o, n) for pts, o, n in scan_keyframes(out_dir / uri)]
+    if not frames:
+        (out_dir / IFRAME_PLAYLIST).unlink(missing_ok=True)
+        return False
+
+    end = frames[0][0] + sum(duration for duration, _ in entries)
+    items = []
+    for index, (pts, uri, offset, length) in enumerate(frames):
+        following = frames[index + 1][0] if index + 1 < len(frames) else end
+        items.append((max(following - pts, 0.0), uri, offset, length))
+
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:4",
+        f"#EXT-X-TARGETDURATION:{math.ceil(max(d for d, *_ in items)) or 1}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+        "#EXT-X-I-FRAMES-ONLY",
+    ]
+    for duration, uri, offset, length in items:
+        lines += [
+            f"#EXTINF:{duration:.6f},",
+            f"#EXT-X-BYTERANGE:{length}@{offset}",
+            uri,
+        ]
+    lines.append("#EXT-X-ENDLIST")
+    atomic_write_text(out_dir / IFRAME_PLAYLIST, "\n".join(lines) + "\n")
+    return True
+
+
+def iframe_bandwidth(out_dir: Path) -> tuple | None:
+    """Return (peak, average) bits per second of a rendition's I-frames.
+
+    None if the rendition has no I-frame playlist.
+    """
+    try:
+        lines = (out_dir / IFRAME_PLAYLIST).read_text().splitlines()
+    except FileNotFoundError:
+        return None
+
+    peak = total_bits = total_duration = 0
+    duration = 0.0
+    for line in lines:
+        if line.startswith("#EXTINF:"):
+            duration = float(line[len("#EXTINF:") :].split(",", 1)[0])
+        elif line.startswith("#EXT-X-BYTERANGE:"):
+            bits = int(line[len("#EXT-X-BYTERANGE:") :].split("@", 1)[0]) * 8
+            total_bits += bits
+            total_duration += duration
+            if duration > 0:
+                peak = max(peak, bits / duration)
+    average = total_bits / total_duration if total_duration else 0
+    return math.ceil(peak), math.ceil(average)
+
+
+def timeline_mismatches(playlists: dict) -> list:
+    """Compare the segment timelines of renditions.
+
+    Segment boundaries (cumulative EXTINF durations) of every rendition
+    must match those of the first one within ALIGNMENT_TOLERANCE, so
+    players can switch renditions at any segment boundary.
+
+    Args:
+        playlists (dict): {rendition name: playlist path}
+
+    Returns:
+        list: Human-readable descriptions of the mismatches; empty if
+              all timelines are aligned.
+    """
+    timelines = {}
+    for name, playlist in playlists.items():
+        ends, position = [], 0.0
+        for duration, _ in parse_playlist(playlist)[0]:
+            position += duration
+            ends.append(position)
+        timelines[name] = ends
+
+    (reference, expected), *others = timelines.items()
+    problems = []
+    for name, ends in others:
+        if len(ends) != len(expected):
+            problems.append(
+                f"{name} has {len(ends)} segments, {reference} has {len(expected)}"
+            )
+            continue
+        for index, (end, other) in enumerate(zip(expected, ends)):
+            if abs(end - other) > ALIGNMENT_TOLERANCE:
+                problems.append(
+                    f"segment {index} of {name} ends at {other:.3f}s, "
+                    f"in {reference} at {end:.3f}s"
+                )
+                break
+    return problems
+
+
+def completed_segments(out_dir: Path) -> list:
+    """Return the segments of an interrupted encode that can be kept.
+
+    Combines the checkpoint of earlier attempts with the segments ffmpeg
+    listed in its working playlist. The list is cut at the first entry
+    whose file is missing or empty.
+
+    Args:
+        out_dir (Path): Output directory of the rendition.
+
+    Returns:
+        list: [(duration, uri), ...] in playback order.
+    """
+    entries = parse_playlist(out_dir / CHECKPOINT_PLAYLIST)[0]
+    entries += parse_playlist(out_dir / WORK_PLAYLIST)[0]
+
+    kept = []
+    for duration, uri in entries:
+        path = out_dir / uri
+        if not path.is_file() or path.stat().st_size == 0:
+            break
+        kept.append((duration, uri))
+    return kept
+
+
+def read_manifest(path: Path) -> dict:
+    """Load a transcode manifest; a missing or corrupt file yields {}."""
+    try:
+        return json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_manifest(path: Path, manifest: dict) -> None:
+    """Atomically replace a transcode manifest."""
+    atomic_write_text(path, json.dumps(manifest, indent=2, sort_keys=True))
+
+
+def verify_rendition(out_dir: Path, record: dict) -> bool:
+    """Check that a rendition marked complete is still intact on disk.
+
+    Args:
+        out_dir (Path): Output directory of the rendition.
+        record (dict): Manifest entry with "segments" and "bytes".
+
+    Returns:
+        bool: True if the playlist is complete and every segment exists
+              with the recorded total size.
+    """
+    entries, ended = parse_playlist(out_dir / PLAYLIST)
+    if not ended or len(entries) != record.get("segments"):
+        return False
+
+    size = 0
+    for _, uri in entries:
+        try:
+            size += (out_dir / uri).stat().st_size
+        except OSError:
+            return False
+    return size == record.get("bytes")
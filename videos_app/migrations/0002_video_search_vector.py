@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:56
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+def populate_search_vector(apps, schema_editor):
+    """Backfill the search vector for videos created before this migration.
+
+    Uses VIDEO_SEARCH_CONFIG, like `update_search_vector` and the search
+    query, so backfilled rows match the queries.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    from django.contrib.postgres.search import SearchVector
+
+    config = settings.VIDEO_SEARCH_CONFIG
+    Video = apps.get_model("videos_app", "Video")
+    Video.objects.update(
+        search_vector=SearchVector("title", weight="A", config=config)
+        + SearchVector("description", weight="B", config=config)
+        + SearchVector("category", weight="C", config=config)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos_app", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="video",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False,
+                help_text="Weighted full-text document over title, description and category.",
+                null=True,
+                verbose_name="Search vector",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="video",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="video_search_vector_gin"
+            ),
+        ),
+        migrations.RunPython(populate_search_vector, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos_app", "0002_video_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="video",
+            name="deleted_at",
+            field=models.DateTimeField(
+                blank=True,
+                help_text="Set when the video was soft-deleted (tombstone).",
+                null=True,
+                verbose_name="Deleted at",
+            ),
+        ),
+        migrations.AddField(
+            model_name="video",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True,
+                help_text="Timestamp of the last change, used as delta-sync cursor.",
+                verbose_name="Updated at",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="video",
+            index=models.Index(
+                fields=["updated_at", "id"], name="video_updated_at_id_idx"
+            ),
+        ),
+    ]
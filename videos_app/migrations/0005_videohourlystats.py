@@ -0,0 +1,80 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos_app", "0004_watchprogress"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VideoHourlyStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "hour",
+                    models.DateTimeField(
+                        help_text="Start of the hour (UTC).", verbose_name="Hour"
+                    ),
+                ),
+                (
+                    "resolution",
+                    models.CharField(max_length=10, verbose_name="Resolution"),
+                ),
+                (
+                    "plays",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Playlist requests in this hour.",
+                        verbose_name="Plays",
+                    ),
+                ),
+                (
+                    "unique_viewers",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Approximate distinct users (HyperLogLog) for this rendition.",
+                        verbose_name="Unique viewers",
+                    ),
+                ),
+                (
+                    "segment_hits",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="Segments served in this hour.",
+                        verbose_name="Segment hits",
+                    ),
+                ),
+                (
+                    "video",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="hourly_stats",
+                        to="videos_app.video",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "video hourly stats",
+                "indexes": [models.Index(fields=["hour"], name="video_stats_hour_idx")],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("video", "hour", "resolution"),
+                        name="unique_video_hour_stats",
+                    )
+                ],
+            },
+        ),
+    ]
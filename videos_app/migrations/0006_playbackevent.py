@@ -0,0 +1,119 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:03
+
+from django.db import migrations, models
+
+# PostgreSQL: range-partition by received_at. The primary key has to include
+# the partition key; a DEFAULT partition catches rows until monthly
+# partitions are created by videos_app.telemetry.ensure_partitions.
+CREATE_PARTITIONED_TABLE = """
+CREATE TABLE videos_app_playbackevent (
+    id bigserial NOT NULL,
+    received_at timestamp with time zone NOT NULL,
+    session varchar(64) NOT NULL,
+    user_id bigint NULL,
+    video_id bigint NOT NULL,
+    resolution varchar(10) NOT NULL,
+    kind varchar(16) NOT NULL,
+    value_ms integer NOT NULL CHECK (value_ms >= 0),
+    PRIMARY KEY (id, received_at)
+) PARTITION BY RANGE (received_at);
+CREATE TABLE videos_app_playbackevent_default
+    PARTITION OF videos_app_playbackevent DEFAULT;
+CREATE INDEX playback_event_video_idx
+    ON videos_app_playbackevent (video_id, received_at);
+"""
+
+
+def create_table(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_PARTITIONED_TABLE)
+    else:
+        schema_editor.create_model(apps.get_model("videos_app", "PlaybackEvent"))
+
+
+def drop_table(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model("videos_app", "PlaybackEvent"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos_app", "0005_videohourlystats"),
+    ]
+
+    state_operations = [
+        migrations.CreateModel(
+            name="PlaybackEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "received_at",
+                    models.DateTimeField(
+                        help_text="Server time the beacon was received.",
+                        verbose_name="Received at",
+                    ),
+                ),
+                (
+                    "session",
+                    models.CharField(
+                        help_text="Client playback session ID.",
+                        max_length=64,
+                        verbose_name="Session",
+                    ),
+                ),
+                (
+                    "user_id",
+                    models.BigIntegerField(
+                        blank=True, null=True, verbose_name="User ID"
+                    ),
+                ),
+                ("video_id", models.BigIntegerField(verbose_name="Video ID")),
+                (
+                    "resolution",
+                    models.CharField(max_length=10, verbose_name="Resolution"),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("startup", "Startup time"),
+                            ("rebuffer", "Rebuffering"),
+                            ("play", "Played time"),
+                            ("switch", "Rendition switch"),
+                        ],
+                        max_length=16,
+                        verbose_name="Kind",
+                    ),
+                ),
+                (
+                    "value_ms",
+                    models.PositiveIntegerField(
+                        help_text="Duration in milliseconds (startup, stall or played time).",
+                        verbose_name="Value (ms)",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["video_id", "received_at"],
+                        name="playback_event_video_idx",
+                    )
+                ],
+            },
+        ),
+    ]
+
+    # The model enters the state first, so RunPython can resolve it.
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=state_operations),
+        migrations.RunPython(create_table, drop_table),
+    ]
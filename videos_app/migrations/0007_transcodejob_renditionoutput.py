@@ -0,0 +1,209 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos_app", "0006_playbackevent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TranscodeJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "source",
+                    models.CharField(
+                        help_text="Path of the input file.",
+                        max_length=500,
+                        verbose_name="Source",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("running", "Running"),
+                            ("succeeded", "Succeeded"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=16,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created at"),
+                ),
+                (
+                    "started_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Started at"
+                    ),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Finished at"
+                    ),
+                ),
+                (
+                    "wall_time",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Seconds from start to end of the job.",
+                        null=True,
+                        verbose_name="Wall time",
+                    ),
+                ),
+                (
+                    "cpu_time",
+                    models.FloatField(
+                        blank=True,
+                        help_text="User + system CPU seconds of all ffmpeg processes.",
+                        null=True,
+                        verbose_name="CPU time",
+                    ),
+                ),
+                (
+                    "error",
+                    models.TextField(
+                        blank=True,
+                        help_text="Set if the job failed.",
+                        verbose_name="Failure reason",
+                    ),
+                ),
+                (
+                    "video",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="transcode_jobs",
+                        to="videos_app.video",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="RenditionOutput",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "resolution",
+                    models.CharField(max_length=10, verbose_name="Resolution"),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("running", "Running"),
+                            ("succeeded", "Succeeded"),
+                            ("failed", "Failed"),
+                        ],
+                        default="running",
+                        max_length=16,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "wall_time",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Seconds of encoding.",
+                        null=True,
+                        verbose_name="Wall time",
+                    ),
+                ),
+                (
+                    "cpu_time",
+                    models.FloatField(
+                        blank=True,
+                        help_text="User + system CPU seconds of ffmpeg.",
+                        null=True,
+                        verbose_name="CPU time",
+                    ),
+                ),
+                (
+                    "speed",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Seconds of media encoded per second of wall time.",
+                        null=True,
+                        verbose_name="Speed",
+                    ),
+                ),
+                (
+                    "media_duration",
+                    models.FloatField(
+                        blank=True,
+                        help_text="Duration of the output in seconds (sum of EXTINF).",
+                        null=True,
+                        verbose_name="Media duration",
+                    ),
+                ),
+                (
+                    "output_bytes",
+                    models.BigIntegerField(
+                        blank=True,
+                        help_text="Size of all segments.",
+                        null=True,
+                        verbose_name="Output bytes",
+                    ),
+                ),
+                (
+                    "segment_count",
+                    models.PositiveIntegerField(
+                        blank=True, null=True, verbose_name="Segments"
+                    ),
+                ),
+                (
+                    "error",
+                    models.TextField(
+                        blank=True,
+                        help_text="Set if the encode failed.",
+                        verbose_name="Failure reason",
+                    ),
+                ),
+                (
+                    "job",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="renditions",
+                        to="videos_app.transcodejob",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="transcodejob",
+            index=models.Index(fields=["created_at"], name="transcode_job_created_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="renditionoutput",
+            constraint=models.UniqueConstraint(
+                fields=("job", "resolution"), name="unique_job_rendition"
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos_app", "0007_transcodejob_renditionoutput"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="video",
+            name="duration",
+            field=models.FloatField(
+                blank=True,
+                editable=False,
+                help_text="Length in seconds, probed with ffprobe at upload time.",
+                null=True,
+                verbose_name="Duration",
+            ),
+        ),
+        migrations.AddField(
+            model_name="video",
+            name="media_info",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="Container and stream summary (codecs, size, frame rate) from ffprobe.",
+                verbose_name="Media info",
+            ),
+        ),
+    ]
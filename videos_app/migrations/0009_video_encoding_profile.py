@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos_app", "0008_video_duration_media_info"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="video",
+            name="encoding_profile",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                help_text="Per-title complexity score and encoder settings per rendition.",
+                verbose_name="Encoding profile",
+            ),
+        ),
+    ]
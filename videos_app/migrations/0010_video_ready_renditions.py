@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-19 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos_app", "0009_video_encoding_profile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="video",
+            name="ready_renditions",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                editable=False,
+                help_text="Renditions that are encoded and playable, lowest first.",
+                verbose_name="Ready renditions",
+            ),
+        ),
+    ]
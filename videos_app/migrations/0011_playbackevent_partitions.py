@@ -0,0 +1,70 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:10
+
+from django.db import migrations
+
+# PostgreSQL: create the monthly partitions from the oldest row in the
+# DEFAULT partition up to two months ahead. Until now only the periodic
+# job created them, so rows may sit in DEFAULT; a partition cannot be
+# created while DEFAULT holds rows of its range, so each one is built as
+# a plain table, filled with those rows and attached. Frozen copy of
+# videos_app.telemetry.ensure_partitions as of this migration; expired
+# partitions are left to that job.
+CREATE_MONTHLY_PARTITIONS = """
+DO $$
+DECLARE
+    month_start timestamp := date_trunc('month', coalesce(
+        (SELECT min(received_at) FROM videos_app_playbackevent_default), now()
+    ) AT TIME ZONE 'UTC');
+    month_end timestamp;
+    last_month timestamp := date_trunc('month', now() AT TIME ZONE 'UTC')
+        + interval '2 months';
+    part text;
+BEGIN
+    LOCK TABLE videos_app_playbackevent_default IN ACCESS EXCLUSIVE MODE;
+    WHILE month_start <= last_month LOOP
+        month_end := month_start + interval '1 month';
+        part := 'videos_app_playbackevent_'
+            || to_char(month_start, '"y"YYYY"m"MM');
+        IF to_regclass(part) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I (LIKE videos_app_playbackevent '
+                'INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                part
+            );
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM videos_app_playbackevent_default '
+                'WHERE received_at >= %L AND received_at < %L RETURNING *) '
+                'INSERT INTO %I SELECT * FROM moved',
+                month_start AT TIME ZONE 'UTC',
+                month_end AT TIME ZONE 'UTC',
+                part
+            );
+            EXECUTE format(
+                'ALTER TABLE videos_app_playbackevent ATTACH PARTITION %I '
+                'FOR VALUES FROM (%L) TO (%L)',
+                part,
+                month_start AT TIME ZONE 'UTC',
+                month_end AT TIME ZONE 'UTC'
+            );
+        END IF;
+        month_start := month_end;
+    END LOOP;
+END
+$$;
+"""
+
+
+def create_partitions(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_MONTHLY_PARTITIONS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("videos_app", "0010_video_ready_renditions"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_partitions, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,28 @@
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
+class VideoManager(models.Manager):
+    """Default manager that hides soft-deleted videos (tombstones)."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Video(models.Model):
     """Database model representing a video entry.
 
     Stores metadata (title, description, category), the uploaded video file,
-    and an optional thumbnail image.
+    and an optional thumbnail image. `search_vector` is maintained on save
+    and backs the full-text search endpoint.
+
+    Deleting through `soft_delete()` keeps the row as a tombstone so that
+    delta-sync clients learn about the removal. `objects` hides tombstones,
+    `all_objects` includes them.
     """
 
     created_at = models.DateTimeField(
@@ -14,6 +30,17 @@ class Video(models.Model):
         auto_now_add=True,
         help_text="Timestamp when the video entry was created.",
     )
+    updated_at = models.DateTimeField(
+        _("Updated at"),
+        auto_now=True,
+        help_text="Timestamp of the last change, used as delta-sync cursor.",
+    )
+    deleted_at = models.DateTimeField(
+        _("Deleted at"),
+        blank=True,
+        null=True,
+        help_text="Set when the video was soft-deleted (tombstone).",
+    )
     title = models.CharField(
         _("Title"), max_length=200, help_text="Title of the video."
     )
@@ -37,3 +64,267 @@ class Video(models.Model):
         null=True,
         help_text="Optional thumbnail image stored in the 'thumbnails/' directory.",
     )
+    search_vector = SearchVectorField(
+        _("Search vector"),
+        null=True,
+        editable=False,
+        help_text="Weighted full-text document over title, description and category.",
+    )
+    duration = models.FloatField(
+        _("Duration"),
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Length in seconds, probed with ffprobe at upload time.",
+    )
+    media_info = models.JSONField(
+        _("Media info"),
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Container and stream summary (codecs, size, frame rate) from ffprobe.",
+    )
+    encoding_profile = models.JSONField(
+        _("Encoding profile"),
+        default=dict,
+        blank=True,
+        editable=False,
+        help_text="Per-title complexity score and encoder settings per rendition.",
+    )
+    ready_renditions = models.JSONField(
+        _("Ready renditions"),
+        default=list,
+        blank=True,
+        editable=False,
+        help_text="Renditions that are encoded and playable, lowest first.",
+    )
+
+    objects = VideoManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="video_search_vector_gin"),
+            models.Index(fields=["updated_at", "id"], name="video_updated_at_id_idx"),
+        ]
+
+    def soft_delete(self):
+        """Mark the video as deleted, keeping the row as a sync tombstone."""
+        self.deleted_at = timezone.now()
+        self.save(update_fields=["deleted_at", "updated_at"])
+
+
+class WatchProgress(models.Model):
+    """Last known playback position of a user in a video (resume point).
+
+    Rows are written in batches by the write-behind flush job; the most
+    recent heartbeats live in Redis (see `videos_app.progress`).
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="watch_progress",
+    )
+    video = models.ForeignKey(
+        Video, on_delete=models.CASCADE, related_name="watch_progress"
+    )
+    position = models.FloatField(
+        _("Position"), help_text="Playback position in seconds."
+    )
+    duration = models.FloatField(
+        _("Duration"),
+        blank=True,
+        null=True,
+        help_text="Total duration in seconds as reported by the player.",
+    )
+    updated_at = models.DateTimeField(
+        _("Updated at"), help_text="Time of the heartbeat that set this position."
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "video"], name="unique_watch_progress"
+            ),
+        ]
+
+
+class VideoHourlyStats(models.Model):
+    """Hourly popularity rollup per video and rendition.
+
+    Filled by the analytics rollup job from Redis counters; the request
+    path never writes to this table.
+    """
+
+    video = models.ForeignKey(
+        Video, on_delete=models.CASCADE, related_name="hourly_stats"
+    )
+    hour = models.DateTimeField(_("Hour"), help_text="Start of the hour (UTC).")
+    resolution = models.CharField(_("Resolution"), max_length=10)
+    plays = models.PositiveIntegerField(
+        _("Plays"), default=0, help_text="Playlist requests in this hour."
+    )
+    unique_viewers = models.PositiveIntegerField(
+        _("Unique viewers"),
+        default=0,
+        help_text="Approximate distinct users (HyperLogLog) for this rendition.",
+    )
+    segment_hits = models.PositiveIntegerField(
+        _("Segment hits"), default=0, help_text="Segments served in this hour."
+    )
+
+    class Meta:
+        verbose_name_plural = "video hourly stats"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["video", "hour", "resolution"], name="unique_video_hour_stats"
+            ),
+        ]
+        indexes = [models.Index(fields=["hour"], name="video_stats_hour_idx")]
+
+
+class PlaybackEvent(models.Model):
+    """Client-side quality-of-experience event (startup, rebuffer, ...).
+
+    On PostgreSQL the table is range-partitioned by `received_at` (monthly
+    partitions managed by `videos_app.telemetry`), so old data can be
+    dropped cheaply. Video and user are stored as plain IDs to keep bulk
+    ingestion free of foreign-key checks.
+    """
+
+    KIND_STARTUP = "startup"
+    KIND_REBUFFER = "rebuffer"
+    KIND_PLAY = "play"
+    KIND_SWITCH = "switch"
+    KIND_CHOICES = [
+        (KIND_STARTUP, "Startup time"),
+        (KIND_REBUFFER, "Rebuffering"),
+        (KIND_PLAY, "Played time"),
+        (KIND_SWITCH, "Rendition switch"),
+    ]
+
+    received_at = models.DateTimeField(
+        _("Received at"), help_text="Server time the beacon was received."
+    )
+    session = models.CharField(
+        _("Session"), max_length=64, help_text="Client playback session ID."
+    )
+    user_id = models.BigIntegerField(_("User ID"), null=True, blank=True)
+    video_id = models.BigIntegerField(_("Video ID"))
+    resolution = models.CharField(_("Resolution"), max_length=10)
+    kind = models.CharField(_("Kind"), max_length=16, choices=KIND_CHOICES)
+    value_ms = models.PositiveIntegerField(
+        _("Value (ms)"),
+        help_text="Duration in milliseconds (startup, stall or played time).",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["video_id", "received_at"], name="playback_event_video_idx"
+            ),
+        ]
+
+
+class TranscodeJob(models.Model):
+    """One run of the HLS conversion of an uploaded video.
+
+    Created when the conversion is enqueued and updated by
+    `convert_to_hls`; the per-rendition numbers are kept in
+    `RenditionOutput`.
+    """
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    video = models.ForeignKey(
+        Video, on_delete=models.CASCADE, related_name="transcode_jobs"
+    )
+    source = models.CharField(
+        _("Source"), max_length=500, help_text="Path of the input file."
+    )
+    status = models.CharField(
+        _("Status"), max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED
+    )
+    created_at = models.DateTimeField(_("Created at"), auto_now_add=True)
+    started_at = models.DateTimeField(_("Started at"), blank=True, null=True)
+    finished_at = models.DateTimeField(_("Finished at"), blank=True, null=True)
+    wall_time = models.FloatField(
+        _("Wall time"),
+        blank=True,
+        null=True,
+        help_text="Seconds from start to end of the job.",
+    )
+    cpu_time = models.FloatField(
+        _("CPU time"),
+        blank=True,
+        null=True,
+        help_text="User + system CPU seconds of all ffmpeg processes.",
+    )
+    error = models.TextField(
+        _("Failure reason"), blank=True, help_text="Set if the job failed."
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="transcode_job_created_idx"),
+        ]
+
+
+class RenditionOutput(models.Model):
+    """Encode statistics of one rendition within a transcode job."""
+
+    job = models.ForeignKey(
+        TranscodeJob, on_delete=models.CASCADE, related_name="renditions"
+    )
+    resolution = models.CharField(_("Resolution"), max_length=10)
+    status = models.CharField(
+        _("Status"),
+        max_length=16,
+        choices=TranscodeJob.STATUS_CHOICES,
+        default=TranscodeJob.STATUS_RUNNING,
+    )
+    wall_time = models.FloatField(
+        _("Wall time"), blank=True, null=True, help_text="Seconds of encoding."
+    )
+    cpu_time = models.FloatField(
+        _("CPU time"),
+        blank=True,
+        null=True,
+        help_text="User + system CPU seconds of ffmpeg.",
+    )
+    speed = models.FloatField(
+        _("Speed"),
+        blank=True,
+        null=True,
+        help_text="Seconds of media encoded per second of wall time.",
+    )
+    media_duration = models.FloatField(
+        _("Media duration"),
+        blank=True,
+        null=True,
+        help_text="Duration of the output in seconds (sum of EXTINF).",
+    )
+    output_bytes = models.BigIntegerField(
+        _("Output bytes"), blank=True, null=True, help_text="Size of all segments."
+    )
+    segment_count = models.PositiveIntegerField(_("Segments"), blank=True, null=True)
+    error = models.TextField(
+        _("Failure reason"), blank=True, help_text="Set if the encode failed."
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["job", "resolution"], name="unique_job_rendition"
+            ),
+        ]
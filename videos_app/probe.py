@@ -0,0 +1,146 @@
+import json
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+
+class MediaProbeError(ValueError):
+    """Raised when a file is not a usable video; the message is user-facing."""
+
+
+def run_ffprobe(path: str) -> dict:
+    """Run ffprobe on a file and return its format and stream information.
+
+    The probe is bounded: ffprobe reads at most MEDIA_PROBE_SIZE bytes and
+    is killed after MEDIA_PROBE_TIMEOUT seconds.
+
+    Raises:
+        MediaProbeError: If ffprobe fails, times out or is unavailable.
+
+    Returns:
+        dict: ffprobe's JSON output ("format" and "streams").
+    """
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-probesize",
+        str(settings.MEDIA_PROBE_SIZE),
+        "-show_format",
+        "-show_streams",
+        "-of",
+        "json",
+        str(path),
+    ]
+    try:
+        with subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        ) as proc:
+            try:
+                out, _ = proc.communicate(timeout=settings.MEDIA_PROBE_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                raise MediaProbeError("The file could not be analysed in time.")
+    except OSError as exc:
+        raise MediaProbeError("The file could not be analysed.") from exc
+
+    if proc.returncode != 0:
+        raise MediaProbeError("The file is not a readable media file.")
+    try:
+        return json.loads(out)
+    except ValueError as exc:
+        raise MediaProbeError("The file is not a readable media file.") from exc
+
+
+def _frame_rate(rate: str | None) -> float | None:
+    try:
+        num, den = (rate or "").split("/")
+        return round(int(num) / int(den), 3) if int(den) else None
+    except ValueError:
+        return None
+
+
+def summarize_probe(probe: dict) -> dict:
+    """Check ffprobe output and reduce it to what the app stores.
+
+    Raises:
+        MediaProbeError: If there is no video stream or the duration is
+            missing or outside MEDIA_MIN_DURATION / MEDIA_MAX_DURATION.
+
+    Returns:
+        dict: {"duration", "format", "video": {...}, "audio": {...} | None}
+    """
+    streams = probe.get("streams", [])
+    # Cover art in audio files shows up as a video stream with one picture
+    video = next(
+        (
+            s
+            for s in streams
+            if s.get("codec_type") == "video"
+            and not s.get("disposition", {}).get("attached_pic")
+        ),
+        None,
+    )
+    if video is None:
+        raise MediaProbeError("The file has no video stream.")
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+    fmt = probe.get("format", {})
+    try:
+        duration = float(fmt.get("duration") or video.get("duration"))
+    except (TypeError, ValueError):
+        raise MediaProbeError("The duration of the video could not be determined.")
+    if duration < settings.MEDIA_MIN_DURATION:
+        raise MediaProbeError("The video is too short.")
+    if settings.MEDIA_MAX_DURATION and duration > settings.MEDIA_MAX_DURATION:
+        raise MediaProbeError("The video is too long.")
+
+    if audio is not None:
+        audio = {
+            "codec": audio.get("codec_name"),
+            "channels": audio.get("channels"),
+            "sample_rate": audio.get("sample_rate"),
+        }
+
+    return {
+        "duration": round(duration, 3),
+        "format": fmt.get("format_name", ""),
+        "video": {
+            "codec": video.get("codec_name"),
+            "width": video.get("width"),
+            "height": video.get("height"),
+            "fps": _frame_rate(video.get("avg_frame_rate")),
+        },
+        "audio": audio,
+    }
+
+
+def validate_video_upload(upload) -> dict:
+    """Probe an uploaded file before any work is queued for it.
+
+    Large uploads are already on disk and probed in place; small ones are
+    held in memory and written to a temporary file first.
+
+    Args:
+        upload (UploadedFile): The uploaded video file.
+
+    Raises:
+        ValidationError: If the file is not a usable video.
+
+    Returns:
+        dict: Media summary, see `summarize_probe`.
+    """
+    try:
+        if hasattr(upload, "temporary_file_path"):
+            return summarize_probe(run_ffprobe(upload.temporary_file_path()))
+
+        with tempfile.NamedTemporaryFile(suffix=".upload") as tmp:
+            for chunk in upload.chunks():
+                tmp.write(chunk)
+            tmp.flush()
+            upload.seek(0)
+            return summarize_probe(run_ffprobe(tmp.name))
+    except MediaProbeError as exc:
+        raise ValidationError(str(exc), code="invalid_media") from exc
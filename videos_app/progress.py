@@ -0,0 +1,147 @@
+import time
+from datetime import datetime, timezone
+
+import django_rq
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from .models import Video, WatchProgress
+
+# Redis layout of the write-behind buffer:
+# - one hash per user, field = video id, value = "position|duration|epoch"
+# - one set of "user_id:video_id" members not yet written to Postgres
+PROGRESS_KEY = "videoflix:progress:{user_id}"
+DIRTY_KEY = "videoflix:progress:dirty"
+
+
+def _encode(position: float, duration: float | None, timestamp: float) -> str:
+    return f"{position}|{'' if duration is None else duration}|{timestamp}"
+
+
+def _decode(raw: bytes) -> dict:
+    position, duration, timestamp = raw.decode().split("|")
+    return {
+        "position": float(position),
+        "duration": float(duration) if duration else None,
+        "updated_at": datetime.fromtimestamp(float(timestamp), tz=timezone.utc),
+    }
+
+
+def record_progress(
+    user_id: int, video_id: int, position: float, duration: float | None = None
+) -> dict:
+    """Buffer a playback heartbeat in Redis.
+
+    The position is stored in the user's progress hash and the pair is
+    marked dirty so the next flush writes it to Postgres. No database
+    query is made.
+
+    Args:
+        user_id (int): ID of the viewer.
+        video_id (int): ID of the video being watched.
+        position (float): Playback position in seconds.
+        duration (float, optional): Total duration in seconds.
+
+    Returns:
+        dict: The recorded progress (position, duration, updated_at).
+    """
+    now = time.time()
+    key = PROGRESS_KEY.format(user_id=user_id)
+
+    pipe = django_rq.get_connection("default").pipeline(transaction=False)
+    pipe.hset(key, video_id, _encode(position, duration, now))
+    pipe.expire(key, settings.WATCH_PROGRESS_REDIS_TTL)
+    pipe.sadd(DIRTY_KEY, f"{user_id}:{video_id}")
+    pipe.execute()
+
+    return {
+        "position": position,
+        "duration": duration,
+        "updated_at": datetime.fromtimestamp(now, tz=timezone.utc),
+    }
+
+
+def get_progress(user_id: int, video_id: int) -> dict | None:
+    """Return the latest known progress, reading Redis first.
+
+    Falls back to the last flushed row in Postgres when the buffer has no
+    entry (e.g. after the Redis TTL expired).
+
+    Args:
+        user_id (int): ID of the viewer.
+        video_id (int): ID of the video.
+
+    Returns:
+        dict | None: Progress (position, duration, updated_at) or None.
+    """
+    raw = django_rq.get_connection("default").hget(
+        PROGRESS_KEY.format(user_id=user_id), video_id
+    )
+    if raw is not None:
+        return _decode(raw)
+
+    return (
+        WatchProgress.objects.filter(user_id=user_id, video_id=video_id)
+        .values("position", "duration", "updated_at")
+        .first()
+    )
+
+
+def flush_progress(batch_size: int | None = None) -> int:
+    """Write buffered heartbeats to Postgres in batches.
+
+    Dirty entries are popped from Redis and upserted with a single
+    `bulk_create(update_conflicts=True)` per batch, so database load
+    depends on the flush interval rather than on the number of viewers.
+    Entries of deleted users or videos are dropped. If a batch fails,
+    its entries are marked dirty again before the error is re-raised.
+
+    Args:
+        batch_size (int, optional): Entries per batch.
+            Defaults to WATCH_PROGRESS_FLUSH_BATCH_SIZE.
+
+    Returns:
+        int: Number of rows written.
+    """
+    batch_size = batch_size or settings.WATCH_PROGRESS_FLUSH_BATCH_SIZE
+    conn = django_rq.get_connection("default")
+    written = 0
+
+    while members := conn.spop(DIRTY_KEY, batch_size):
+        pairs = [tuple(map(int, m.decode().split(":"))) for m in members]
+
+        pipe = conn.pipeline(transaction=False)
+        for user_id, video_id in pairs:
+            pipe.hget(PROGRESS_KEY.format(user_id=user_id), video_id)
+        values = pipe.execute()
+
+        video_ids = set(
+            Video.all_objects.filter(id__in={v for _, v in pairs}).values_list(
+                "id", flat=True
+            )
+        )
+        user_ids = set(
+            get_user_model()
+            .objects.filter(id__in={u for u, _ in pairs})
+            .values_list("id", flat=True)
+        )
+
+        rows = [
+            WatchProgress(user_id=user_id, video_id=video_id, **_decode(raw))
+            for (user_id, video_id), raw in zip(pairs, values)
+            if raw is not None and user_id in user_ids and video_id in video_ids
+        ]
+
+        try:
+            WatchProgress.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=["user", "video"],
+                update_fields=["position", "duration", "updated_at"],
+            )
+        except Exception:
+            conn.sadd(DIRTY_KEY, *members)
+            raise
+        written += len(rows)
+
+    return written
@@ -0,0 +1,188 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import django_rq
+from django.conf import settings
+from redis.exceptions import RedisError, WatchError
+
+logger = logging.getLogger(__name__)
+
+# Redis layout of the host core budget: one key per core slot of a host,
+# holding the token of the lease that owns it. Keys expire unless the
+# holder keeps renewing them, so a crashed worker gives its cores back.
+CORE_KEY = "videoflix:transcode:cores:{host}:{slot}"
+
+
+class CoreLease:
+    """Cores granted to one ffmpeg process.
+
+    Attributes:
+        threads (int): Thread budget for decoder, filters and encoder.
+        cpus (list): CPU ids to pin the process to; empty if unpinned.
+    """
+
+    def __init__(self, threads: int, cpus: list | None = None):
+        self.threads = threads
+        self.cpus = cpus or []
+
+    def wrap(self, cmd: list) -> list:
+        """Prefix a command with `taskset` if the lease pins CPUs."""
+        if not self.cpus:
+            return cmd
+        return ["taskset", "-c", ",".join(map(str, self.cpus)), *cmd]
+
+
+class CoreScheduler:
+    """Hand out the CPU cores of a host to concurrent ffmpeg processes.
+
+    Every transcode process on a host (all RQ workers and the chunk
+    threads within them) draws from one budget of TRANSCODE_CORE_BUDGET
+    core slots kept in Redis. A process gets up to TRANSCODE_MAX_THREADS
+    slots and is only admitted once at least TRANSCODE_MIN_THREADS are
+    free, so the total number of encoder threads never exceeds the
+    number of cores. With TRANSCODE_CPU_AFFINITY the slots are also
+    mapped to CPUs the process is pinned to.
+
+    If Redis cannot be reached, processes run with TRANSCODE_MAX_THREADS
+    threads and no admission control.
+    """
+
+    def __init__(self):
+        self.host = socket.gethostname()
+
+    @staticmethod
+    def budget() -> int:
+        """Return the number of core slots of this host."""
+        return settings.TRANSCODE_CORE_BUDGET or os.cpu_count() or 1
+
+    def _key(self, slot: int) -> str:
+        return CORE_KEY.format(host=self.host, slot=slot)
+
+    def _cpus(self, slots: list) -> list:
+        if not settings.TRANSCODE_CPU_AFFINITY:
+            return []
+        allowed = sorted(os.sched_getaffinity(0))
+        return sorted({allowed[slot % len(allowed)] for slot in slots})
+
+    def _if_owner(self, conn, slot: int, token: str, action) -> None:
+        key = self._key(slot)
+        with conn.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.get(key) != token.encode():
+                    return
+                pipe.multi()
+                action(pipe, key)
+                pipe.execute()
+            except WatchError:
+                pass
+
+    def try_acquire(self, token: str, max_threads: int | None = None) -> list:
+        """Take free core slots for `token` without waiting.
+
+        Args:
+            token (str): Lease the slots are taken for.
+            max_threads (int, optional): Slots to take at most, for
+                processes that cannot use TRANSCODE_MAX_THREADS.
+
+        Returns:
+            list: The slots taken, or [] if fewer than
+                  TRANSCODE_MIN_THREADS were free.
+        """
+        conn = django_rq.get_connection("default")
+        budget = self.budget()
+        wanted = min(max_threads or settings.TRANSCODE_MAX_THREADS, budget)
+        minimum = min(settings.TRANSCODE_MIN_THREADS, wanted)
+
+        slots = []
+        for slot in range(budget):
+            if len(slots) == wanted:
+                break
+            if conn.set(
+                self._key(slot), token, nx=True, ex=settings.TRANSCODE_LEASE_TTL
+            ):
+                slots.append(slot)
+
+        if len(slots) < minimum:
+            self.release(token, slots)
+            return []
+        return slots
+
+    def release(self, token: str, slots: list) -> None:
+        """Give core slots back; slots owned by another token are kept."""
+        conn = django_rq.get_connection("default")
+        for slot in slots:
+            self._if_owner(conn, slot, token, lambda pipe, key: pipe.delete(key))
+
+    def renew(self, token: str, slots: list) -> None:
+        """Extend the expiry of core slots still owned by `token`."""
+        conn = django_rq.get_connection("default")
+        ttl = settings.TRANSCODE_LEASE_TTL
+        for slot in slots:
+            self._if_owner(conn, slot, token, lambda pipe, key: pipe.expire(key, ttl))
+
+    @contextmanager
+    def lease(self, max_threads: int | None = None):
+        """Wait for free cores and hold them for the duration of the block.
+
+        The slots are renewed in the background while the block runs and
+        released when it exits.
+
+        Args:
+            max_threads (int, optional): Thread budget at most, see
+                `try_acquire`.
+
+        Yields:
+            CoreLease: Thread budget (and CPUs) for one ffmpeg process.
+        """
+        token = uuid.uuid4().hex
+        try:
+            slots = self.try_acquire(token, max_threads)
+            waited = time.monotonic()
+            if not slots:
+                logger.info("waiting for free cores on %s", self.host)
+            while not slots:
+                # Jitter keeps waiting workers from retrying in lockstep
+                time.sleep(settings.TRANSCODE_ADMISSION_POLL * random.uniform(0.5, 1.5))
+                slots = self.try_acquire(token, max_threads)
+        except RedisError:
+            logger.warning("core scheduler unavailable", exc_info=True)
+            yield CoreLease(max_threads or settings.TRANSCODE_MAX_THREADS)
+            return
+
+        if time.monotonic() - waited > 1:
+            logger.info(
+                "admitted after %.1fs with %d threads",
+                time.monotonic() - waited,
+                len(slots),
+            )
+
+        stop = threading.Event()
+
+        def keep_alive():
+            while not stop.wait(settings.TRANSCODE_LEASE_TTL / 3):
+                try:
+                    self.renew(token, slots)
+                except RedisError:
+                    logger.warning("could not renew core lease", exc_info=True)
+
+        renewer = threading.Thread(target=keep_alive, daemon=True)
+        renewer.start()
+        try:
+            yield CoreLease(len(slots), self._cpus(slots))
+        finally:
+            stop.set()
+            renewer.join()
+            try:
+                self.release(token, slots)
+            except RedisError:
+                logger.warning("could not release core lease", exc_info=True)
+
+
+transcode_cores = CoreScheduler()
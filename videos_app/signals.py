@@ -1,35 +1,51 @@
-from .models import Video
+from .models import TranscodeJob, Video
 from django.dispatch import receiver
 from django.db.models.signals import post_save, post_delete
 import os
-from .tasks import convert_to_hls, extract_thumbnail
+from .tasks import convert_to_hls, delete_hls_output, extract_thumbnail
+from .api.services import bump_catalogue_version, update_search_vector
 import django_rq
 from pathlib import Path
 from django.conf import settings
 
 
+# Fields the full-text search vector is built from
+SEARCH_FIELDS = {"title", "description", "category"}
+
+
 @receiver(post_save, sender=Video)
-def video_post_save(sender, instance, created, **kwargs):
+def video_post_save(sender, instance, created, update_fields=None, **kwargs):
     """Signal handler that runs after a Video instance is saved.
 
+    - Refreshes the full-text search vector of the video, unless the save
+      was limited (`update_fields`) to fields it does not cover.
+    - Invalidates cached catalogue views (e.g. home screen rows).
     - On creation of a new Video:
-      * Enqueues a background job to convert the uploaded file into HLS format.
+      * Records a TranscodeJob and enqueues a background job to convert
+        the uploaded file into HLS format.
       * Enqueues a background job to generate a thumbnail image.
 
     Args:
         sender (Model): The model class (Video).
         instance (Video): The actual saved Video instance.
         created (bool): True if a new object was created, False if updated.
+        update_fields (frozenset | None): Fields passed to save(), if any.
         **kwargs: Additional arguments passed by the signal.
     """
     thumb_rel = f"thumbnails/{instance.pk}.jpg"
+    if update_fields is None or SEARCH_FIELDS & update_fields:
+        update_search_vector(instance.pk)
+    bump_catalogue_version()
 
     if created:
         # Use RQ (Redis Queue) to process tasks asynchronously in the background.
         queue = django_rq.get_queue("default", autocommit=True)
 
-        # Enqueue HLS video conversion
-        queue.enqueue(convert_to_hls, instance.video_file.path)
+        # Enqueue HLS video conversion, tracked as a TranscodeJob
+        job = TranscodeJob.objects.create(
+            video=instance, source=instance.video_file.path
+        )
+        queue.enqueue(convert_to_hls, instance.video_file.path, job_id=job.pk)
 
         # Only extract a thumbnail if the user did not upload one
         if not instance.thumbnail_url:
@@ -49,17 +65,22 @@ def auto_delete_file_on_delete(sender, instance, **kwargs):
     """Signal handler that deletes associated media files
     when a Video instance is removed.
 
-    - Deletes the original video file.
+    - Deletes the original video file and its HLS output.
     - Deletes the thumbnail image (if it exists).
+    - Invalidates cached catalogue views.
 
     Args:
         sender (Model): The model class (Video).
         instance (Video): The deleted Video instance.
         **kwargs: Additional arguments passed by the signal.
     """
-    # Delete video file if it exists
-    if instance.video_file and os.path.isfile(instance.video_file.path):
-        os.remove(instance.video_file.path)
+    bump_catalogue_version()
+
+    # Delete video file and HLS renditions if they exist
+    if instance.video_file:
+        delete_hls_output(instance)
+        if os.path.isfile(instance.video_file.path):
+            os.remove(instance.video_file.path)
 
     # Delete thumbnail file if it exists
     if instance.thumbnail_url and os.path.isfile(instance.thumbnail_url.path):
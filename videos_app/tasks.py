@@ -1,71 +1,858 @@
+import logging
+import math
+import os
+import resource
+import shutil
 import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from pathlib import Path
 
 from django.conf import settings
-from .models import Video
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.metrics import TRANSCODE_DURATION, TRANSCODE_SPEED
+from .complexity import BASE_CRF, encoding_profile, probe_command, sample_windows
+from .hls import (
+    CHECKPOINT_PLAYLIST,
+    IFRAME_PLAYLIST,
+    PLAYLIST,
+    WORK_PLAYLIST,
+    atomic_write_text,
+    completed_segments,
+    iframe_bandwidth,
+    parse_playlist,
+    publish_directory,
+    read_manifest,
+    remove_published,
+    render_master_playlist,
+    render_vod_playlist,
+    rendition_bandwidth,
+    timeline_mismatches,
+    verify_rendition,
+    write_iframe_playlist,
+    write_manifest,
+)
+from .models import RenditionOutput, TranscodeJob, Video
+from .scheduler import transcode_cores
+
+logger = logging.getLogger(__name__)
 
 # Supported output resolutions for HLS transcoding
 ALLOWED_RESOLUTIONS = {"480p", "720p", "1080p"}
 
+# x264 preset of all renditions except an early-published one
+DEFAULT_PRESET = "veryfast"
+
+# H.264 profile and level are fixed per rendition (levels allow 60 fps),
+# so the master playlist can declare the codecs players must support
+RENDITIONS = {
+    "480p": {
+        "height": 480,
+        "v_bitrate": "1200k",
+        "a_bitrate": "128k",
+        "profile": "main",
+        "level": "3.1",
+    },
+    "720p": {
+        "height": 720,
+        "v_bitrate": "2800k",
+        "a_bitrate": "128k",
+        "profile": "high",
+        "level": "3.2",
+    },
+    "1080p": {
+        "height": 1080,
+        "v_bitrate": "5000k",
+        "a_bitrate": "192k",
+        "profile": "high",
+        "level": "4.2",
+    },
+}
+
+# RFC 6381 codec strings: profile_idc + constraint flags of the H.264
+# profiles (the level is appended), and AAC-LC
+AVC_PROFILES = {"main": "4d40", "high": "6400"}
+AAC_CODEC = "mp4a.40.2"
+
+# Audio-only rendition shared by all video renditions (HLS_SHARED_AUDIO)
+AUDIO_RENDITION = "audio"
+
+
+def plan_renditions(shared_audio: bool) -> dict:
+    """Return the renditions to encode, in encoding order.
+
+    With shared audio the audio track is encoded once into an audio-only
+    rendition (at HLS_AUDIO_BITRATE) and the video renditions carry no
+    audio. A rendition without "height" has no video, one without
+    "a_bitrate" no audio.
+    """
+    if not shared_audio:
+        return dict(RENDITIONS)
+    plan = {AUDIO_RENDITION: {"height": None, "a_bitrate": settings.HLS_AUDIO_BITRATE}}
+    for res, cfg in RENDITIONS.items():
+        plan[res] = {**cfg, "a_bitrate": None}
+    return plan
+
+
+def rendition_codecs(cfg: dict) -> list:
+    """Return the codec strings (CODECS attribute) of a rendition."""
+    codecs = []
+    if cfg.get("height"):
+        level = round(float(cfg["level"]) * 10)
+        codecs.append(f"avc1.{AVC_PROFILES[cfg['profile']]}{level:02x}")
+    if cfg.get("a_bitrate"):
+        codecs.append(AAC_CODEC)
+    return codecs
+
+
+class TranscodeError(RuntimeError):
+    """Raised when ffmpeg fails; the message contains its error output."""
+
+
+def run_ffmpeg(cmd: list) -> float:
+    """Run an ffmpeg command and return the CPU time it used.
+
+    Args:
+        cmd (list): Command line, starting with "ffmpeg".
+
+    Raises:
+        TranscodeError: If ffmpeg exits with an error.
+
+    Returns:
+        float: User + system CPU seconds of the ffmpeg process.
+    """
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    try:
+        subprocess.run(cmd, check=True, stderr=subprocess.PIPE, text=True)
+    except subprocess.CalledProcessError as exc:
+        output = (exc.stderr or "").strip()[-2000:]
+        raise TranscodeError(
+            f"ffmpeg exited with status {exc.returncode}: {output}"
+        ) from exc
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+
+
+def _record_output(output, out_dir: Path, **stats) -> None:
+    """Store the statistics of a finished rendition read from disk."""
+    entries = parse_playlist(out_dir / PLAYLIST)[0]
+    output.status = TranscodeJob.STATUS_SUCCEEDED
+    output.media_duration = sum(d for d, _ in entries)
+    output.segment_count = len(entries)
+    output.output_bytes = sum((out_dir / uri).stat().st_size for _, uri in entries)
+    output.error = ""
+    for field, value in stats.items():
+        setattr(output, field, value)
+    output.save()
+
+
+def _ffprobe(src: Path, *args: str) -> str | None:
+    """Run ffprobe with plain-text output; None if it could not run."""
+    cmd = ["ffprobe", "-v", "error", *args, "-of", "csv=p=0", str(src)]
+    try:
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True) as proc:
+            try:
+                out, _ = proc.communicate(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                raise
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.strip() if proc.returncode == 0 else None
+
+
+def probe_duration(src: Path) -> float | None:
+    """Return the duration of a media file in seconds, or None if unknown."""
+    try:
+        return float(_ffprobe(src, "-show_entries", "format=duration"))
+    except (TypeError, ValueError):
+        return None
+
+
+def probe_resolution(src: Path) -> str | None:
+    """Return the "WIDTHxHEIGHT" of a media file's video, or None if unknown."""
+    out = _ffprobe(
+        src, "-select_streams", "v:0", "-show_entries", "stream=width,height"
+    )
+    return out.replace(",", "x") if out else None
+
+
+def probe_has_audio(src: Path) -> bool | None:
+    """Return whether a media file has an audio stream, or None if unknown."""
+    out = _ffprobe(src, "-select_streams", "a", "-show_entries", "stream=index")
+    return None if out is None else bool(out)
+
+
+def hls_command(
+    src: Path,
+    cfg: dict,
+    playlist: Path,
+    segment_pattern: Path,
+    start_number: int = 0,
+    offset: float = 0.0,
+    length: float | None = None,
+    threads: int | None = None,
+    audio: Path | None = None,
+) -> list:
+    """Build the ffmpeg command that encodes (part of) a rendition to HLS.
+
+    Keyframes are forced every HLS_SEGMENT_SECONDS of output time and
+    scene-cut keyframes are disabled, so every rendition (and every
+    chunk or resumed encode) cuts segments at the same timestamps.
+    Renditions without "height" are audio-only, those without
+    "a_bitrate" video-only.
+
+    Args:
+        src (Path): Input file.
+        cfg (dict): Rendition settings from RENDITIONS.
+        playlist (Path): Playlist ffmpeg writes.
+        segment_pattern (Path): Segment file pattern, e.g. ".../%03d.ts".
+        start_number (int): Number of the first segment.
+        offset (float): Input position to start at; output timestamps
+            continue from there.
+        length (float, optional): Seconds to encode; default until the end.
+        threads (int, optional): Thread budget for decoding, filtering and
+            encoding; default lets ffmpeg use every core.
+        audio (Path, optional): Audio track encoded beforehand (see
+            `audio_track_command`); it is copied in at the same position
+            instead of encoding the audio of `src`.
+
+    Returns:
+        list: The command line.
+    """
+    return [
+        "ffmpeg",
+        "-y",
+        "-nostats",
+        "-loglevel",
+        "error",
+        *(
+            ["-filter_threads", str(threads), "-threads", str(threads)]
+            if threads
+            else []
+        ),
+        *(["-ss", f"{offset:.6f}"] if offset else []),
+        "-i",
+        str(src),
+        *(
+            [*(["-ss", f"{offset:.6f}"] if offset else []), "-i", str(audio)]
+            if audio
+            else []
+        ),
+        *(["-t", f"{length:.6f}"] if length else []),
+        *(["-map", "0:v:0", "-map", "1:a:0"] if audio else []),
+        *(_video_args(cfg, threads) if cfg.get("height") else ["-vn"]),
+        *(
+            ["-c:a", "copy"]
+            if audio
+            else (
+                ["-c:a", "aac", "-b:a", cfg["a_bitrate"]]
+                if cfg.get("a_bitrate")
+                else ["-an"]
+            )
+        ),
+        *(["-output_ts_offset", f"{offset:.6f}"] if offset else []),
+        "-hls_time",
+        str(settings.HLS_SEGMENT_SECONDS),
+        "-hls_playlist_type",
+        "vod",
+        "-hls_flags",
+        "independent_segments+temp_file",
+        "-start_number",
+        str(start_number),
+        "-hls_segment_filename",
+        str(segment_pattern),
+        str(playlist),
+    ]
+
+
+def audio_track_command(src: Path, bitrate: str, output: Path) -> list:
+    """Build the ffmpeg command that encodes the whole audio of a source once."""
+    return [
+        "ffmpeg",
+        "-y",
+        "-nostats",
+        "-loglevel",
+        "error",
+        "-i",
+        str(src),
+        "-vn",
+        "-c:a",
+        "aac",
+        "-b:a",
+        bitrate,
+        "-f",
+        "mp4",
+        str(output),
+    ]
+
+
+def analyze_complexity(src: Path, duration: float) -> dict:
+    """Measure how hard a video is to compress and derive its encoder settings.
+
+    Short windows sampled across the video are encoded at a low, fixed
+    resolution and quality; their bitrate is the complexity score (see
+    `complexity.encoding_profile`).
+
+    Args:
+        src (Path): Input file.
+        duration (float): Duration of the input in seconds.
+
+    Raises:
+        TranscodeError: If a probe encode fails.
+
+    Returns:
+        dict: The encoding profile (complexity, factor, per-rendition
+              crf/maxrate/bufsize).
+    """
+    bits = seconds = 0
+    with tempfile.TemporaryDirectory(dir=src.parent) as tmp:
+        with transcode_cores.lease() as lease:
+            for index, (start, length) in enumerate(sample_windows(duration)):
+                output = Path(tmp) / f"probe_{index}.h264"
+                cmd = probe_command(src, start, length, output, lease.threads)
+                run_ffmpeg(lease.wrap(cmd))
+                bits += output.stat().st_size * 8
+                seconds += length
+
+    profile = encoding_profile(bits / seconds / 1000, RENDITIONS)
+    logger.info(
+        "complexity of %s: %.0f kbit/s (factor %.2f)",
+        src.name,
+        profile["complexity"],
+        profile["factor"],
+    )
+    return profile
+
+
+def keyframe_interval() -> int:
+    """Return the seconds between forced keyframes.
+
+    HLS_KEYFRAME_INTERVAL if set and it divides the segment length (so
+    segments still start on a keyframe), otherwise the segment length.
+    """
+    segment = settings.HLS_SEGMENT_SECONDS
+    interval = settings.HLS_KEYFRAME_INTERVAL
+    return interval if interval and segment % interval == 0 else segment
+
+
+def _video_args(cfg: dict, threads: int | None) -> list:
+    return [
+        "-vf",
+        f"scale=-2:{cfg['height']}",
+        "-c:v",
+        "libx264",
+        "-crf",
+        str(cfg.get("crf", BASE_CRF)),
+        "-preset",
+        cfg.get("preset", DEFAULT_PRESET),
+        "-profile:v",
+        cfg["profile"],
+        "-level:v",
+        cfg["level"],
+        *(
+            ["-maxrate", cfg["maxrate"], "-bufsize", cfg["bufsize"]]
+            if cfg.get("maxrate")
+            else []
+        ),
+        *(
+            ["-threads", str(threads), "-x264-params", f"threads={threads}"]
+            if threads
+            else []
+        ),
+        "-sc_threshold",
+        "0",
+        "-force_key_frames",
+        f"expr:gte(t,n_forced*{keyframe_interval()})",
+    ]
+
+
+def _encode_single(src: Path, res: str, cfg: dict, out_dir: Path) -> tuple:
+    """Encode a rendition with one ffmpeg process, resuming if interrupted.
+
+    Segments finished by an earlier, interrupted attempt are kept and
+    ffmpeg continues at the end of the last one (input seek plus
+    timestamp offset, numbering continues), so a crash only loses the
+    segment that was being written.
+
+    Returns:
+        tuple: (entries, cpu_time, resumed_at)
+    """
+    done = completed_segments(out_dir)
+    offset = sum(duration for duration, _ in done)
+    if done:
+        atomic_write_text(out_dir / CHECKPOINT_PLAYLIST, render_vod_playlist(done))
+        # Its segments are in the checkpoint now; if the next attempt dies
+        # before ffmpeg rewrites it, they must not be counted twice
+        (out_dir / WORK_PLAYLIST).unlink(missing_ok=True)
+        logger.info(
+            "resuming rendition %s of %s at %.1fs (%d segments kept)",
+            res,
+            src.name,
+            offset,
+            len(done),
+        )
+
+    # The AAC encoder is single-threaded
+    max_threads = None if cfg.get("height") else 1
+    with transcode_cores.lease(max_threads) as lease:
+        cmd = hls_command(
+            src,
+            cfg,
+            out_dir / WORK_PLAYLIST,
+            out_dir / "%03d.ts",
+            start_number=len(done),
+            offset=offset,
+            threads=lease.threads,
+        )
+        cpu_time = run_ffmpeg(lease.wrap(cmd))
 
-def convert_to_hls(source: str) -> str:
+    entries = done + parse_playlist(out_dir / WORK_PLAYLIST)[0]
+    (out_dir / WORK_PLAYLIST).unlink(missing_ok=True)
+    (out_dir / CHECKPOINT_PLAYLIST).unlink(missing_ok=True)
+    return entries, cpu_time, offset
+
+
+def _chunk_complete(out_dir: Path, playlist: Path) -> list | None:
+    """Return the entries of a finished chunk, or None if it must be redone."""
+    entries, ended = parse_playlist(playlist)
+    if not ended or not entries:
+        return None
+    for _, uri in entries:
+        path = out_dir / uri
+        if not path.is_file() or path.stat().st_size == 0:
+            return None
+    return entries
+
+
+def _encode_chunked(src: Path, res: str, cfg: dict, out_dir: Path, duration: float):
+    """Encode a long rendition as fixed-length chunks in parallel.
+
+    The source is cut on the forced keyframe grid into chunks of
+    TRANSCODE_CHUNK_SECONDS (a multiple of the segment length). Up to
+    TRANSCODE_CHUNK_WORKERS ffmpeg processes run at once, as far as the
+    host core budget admits them, each with timestamps offset to its
+    chunk start, so the chunks play back as one continuous stream.
+    Finished chunks survive a crash and are not encoded again. Segments
+    are renamed to one consecutive numbering when the chunks are
+    stitched together.
+
+    The audio is encoded once over the whole source and copied into the
+    chunks. AAC encoded per chunk would add encoder priming and padding,
+    i.e. an audible gap, at every chunk boundary.
+
+    Returns:
+        tuple: (entries, cpu_time, resumed_at)
+    """
+    segment = settings.HLS_SEGMENT_SECONDS
+    length = max(segment, settings.TRANSCODE_CHUNK_SECONDS // segment * segment)
+    count = math.ceil(duration / length)
+
+    audio = None
+    if cfg.get("a_bitrate") and probe_has_audio(src) is not False:
+        audio = out_dir / "audio.m4a"
+
+    def encode(index: int) -> list:
+        playlist = out_dir / f"chunk_{index:03d}.m3u8"
+        entries = _chunk_complete(out_dir, playlist)
+        if entries is None:
+            with transcode_cores.lease() as lease:
+                cmd = hls_command(
+                    src,
+                    cfg,
+                    playlist,
+                    out_dir / f"chunk_{index:03d}_%03d.ts",
+                    offset=index * length,
+                    length=length,
+                    threads=lease.threads,
+                    audio=audio,
+                )
+                run_ffmpeg(lease.wrap(cmd))
+            entries = parse_playlist(playlist)[0]
+        return entries
+
+    logger.info("encoding %s of %s in %d chunks", res, src.name, count)
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    if audio and not audio.is_file():
+        # Written under another name first, so a crash never leaves a
+        # truncated track behind that later attempts would reuse
+        partial = out_dir / "audio.part.m4a"
+        with transcode_cores.lease(1) as lease:
+            cmd = audio_track_command(src, cfg["a_bitrate"], partial)
+            run_ffmpeg(lease.wrap(cmd))
+        os.replace(partial, audio)
+    with ThreadPoolExecutor(max_workers=settings.TRANSCODE_CHUNK_WORKERS) as pool:
+        chunks = list(pool.map(encode, range(count)))
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_time = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+
+    entries = []
+    for chunk in chunks:
+        for segment_duration, uri in chunk:
+            name = f"{len(entries):03d}.ts"
+            os.replace(out_dir / uri, out_dir / name)
+            entries.append((segment_duration, name))
+    for index in range(count):
+        (out_dir / f"chunk_{index:03d}.m3u8").unlink(missing_ok=True)
+    if audio:
+        audio.unlink()
+    return entries, cpu_time, 0.0
+
+
+def _work_dir(out_dir: Path) -> Path:
+    """Return the directory a rendition is encoded in before it is published.
+
+    Under TRANSCODE_SCRATCH_DIR if set, otherwise a hidden directory next
+    to the published one.
+    """
+    scratch = settings.TRANSCODE_SCRATCH_DIR
+    if scratch:
+        return Path(scratch) / out_dir.name
+    return out_dir.parent / f".{out_dir.name}.work"
+
+
+def _encode_rendition(
+    src: Path,
+    res: str,
+    cfg: dict,
+    output,
+    manifest: dict,
+    manifest_path: Path,
+    duration: float | None = None,
+    reference: str | None = None,
+) -> Path:
+    """Encode one rendition, resuming an interrupted encode if possible.
+
+    - A rendition the manifest marks complete is skipped if its playlist
+      and segments are still intact.
+    - Video of sources longer than TRANSCODE_CHUNK_MIN_DURATION is encoded
+      in parallel chunks; shorter sources and audio-only renditions by a
+      single ffmpeg process.
+    - Encoding happens in a work directory (see `_work_dir`). Once ffmpeg
+      succeeded the playlist is written and its segment timeline is
+      checked against the `reference` rendition. Only an aligned
+      rendition is published (`publish_directory`) and marked complete
+      in the manifest; a misaligned one is discarded.
+
+    Args:
+        src (Path): Input file.
+        res (str): Rendition name, e.g. "720p".
+        cfg (dict): Rendition settings from RENDITIONS.
+        output (RenditionOutput | None): Row to fill, if the job is tracked.
+        manifest (dict): Transcode manifest, updated in place.
+        manifest_path (Path): Where the manifest is stored.
+        duration (float, optional): Source duration in seconds, if known.
+        reference (str, optional): Published rendition whose segment
+            boundaries this one must match.
+
+    Raises:
+        TranscodeError: If ffmpeg fails or the segments are not aligned
+            with the reference rendition.
+
+    Returns:
+        Path: The rendition playlist.
+    """
+    out_dir = src.parent / f"{src.stem}_hls_{res}"
+    playlist = out_dir / PLAYLIST
+
+    record = manifest["renditions"].get(res)
+    early = bool(cfg.get("early"))
+    if (
+        record
+        and record.get("early", False) == early
+        and verify_rendition(out_dir, record)
+    ):
+        logger.info("skipping complete rendition %s of %s", res, src.name)
+        if output and output.status != TranscodeJob.STATUS_SUCCEEDED:
+            _record_output(output, out_dir)
+        return playlist
+
+    work_dir = _work_dir(out_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    start = time.monotonic()
+    try:
+        chunked = duration and duration >= settings.TRANSCODE_CHUNK_MIN_DURATION
+        if chunked and cfg.get("height"):
+            entries, cpu_time, offset = _encode_chunked(
+                src, res, cfg, work_dir, duration
+            )
+        else:
+            entries, cpu_time, offset = _encode_single(src, res, cfg, work_dir)
+        if not entries:
+            raise TranscodeError(f"ffmpeg wrote no segments for {res}")
+
+        atomic_write_text(work_dir / PLAYLIST, render_vod_playlist(entries))
+        if reference:
+            reference_dir = src.parent / f"{src.stem}_hls_{reference}"
+            problems = timeline_mismatches(
+                {reference: reference_dir / PLAYLIST, res: work_dir / PLAYLIST}
+            )
+            if problems:
+                # Nothing of this encode is kept, so a retry starts over
+                shutil.rmtree(work_dir, ignore_errors=True)
+                if manifest["renditions"].pop(res, None):
+                    write_manifest(manifest_path, manifest)
+                raise TranscodeError(
+                    "renditions are not aligned: " + "; ".join(problems)
+                )
+    except TranscodeError as exc:
+        if output:
+            output.status = TranscodeJob.STATUS_FAILED
+            output.wall_time = time.monotonic() - start
+            output.error = str(exc)
+            output.save()
+        raise
+    elapsed = time.monotonic() - start
+
+    if cfg.get("height") and settings.HLS_IFRAME_PLAYLISTS:
+        if not write_iframe_playlist(work_dir):
+            logger.warning("no keyframes found in rendition %s of %s", res, src.name)
+    publish_directory(work_dir, out_dir)
+    manifest["renditions"][res] = {
+        "segments": len(entries),
+        "bytes": sum((out_dir / uri).stat().st_size for _, uri in entries),
+        "early": early,
+        "codecs": rendition_codecs(cfg),
+        "resolution": (
+            probe_resolution(out_dir / entries[0][1]) if cfg.get("height") else None
+        ),
+    }
+    write_manifest(manifest_path, manifest)
+
+    encoded = sum(duration for duration, _ in entries) - offset
+    TRANSCODE_DURATION.labels(res).observe(elapsed)
+    if encoded > 0 and elapsed > 0:
+        TRANSCODE_SPEED.labels(res).observe(encoded / elapsed)
+
+    if output:
+        _record_output(
+            output,
+            out_dir,
+            wall_time=elapsed,
+            cpu_time=cpu_time,
+            speed=encoded / elapsed if encoded > 0 and elapsed > 0 else None,
+        )
+
+    return playlist
+
+
+def convert_to_hls(source: str, job_id: int | None = None) -> str:
     """Convert a video file into HLS format with multiple renditions.
 
     Generates HLS playlists and segments for 480p, 720p, and 1080p resolutions.
-    Uses ffmpeg with H.264 (libx264) and AAC encoding.
+    Uses ffmpeg with H.264 (libx264) and AAC encoding. Wall time and
+    realtime speed of every rendition are recorded as metrics. If a
+    TranscodeJob is given, its status and per-rendition statistics
+    (RenditionOutput) are stored as well.
+
+    Progress is checkpointed in a manifest next to the source
+    (`<name>_hls_manifest.json`), so a retry after a worker crash skips
+    finished renditions and resumes the interrupted one. Output left
+    behind for a different source file is discarded first. Long sources
+    are encoded in parallel chunks (see TRANSCODE_CHUNK_SECONDS).
+
+    Unless TRANSCODE_PER_TITLE is off, a fast complexity analysis picks
+    CRF, maxrate and bufsize of every rendition for this video; the
+    profile is stored on the Video.
+
+    Renditions are encoded lowest first. After each one the master
+    playlist (`<name>_hls_master.m3u8`) is rewritten to list every
+    finished rendition with its measured bandwidth, and the rendition is
+    added to `Video.ready_renditions`. With TRANSCODE_PUBLISH_EARLY the
+    first video rendition uses a faster preset and does not wait for the
+    complexity analysis, so it is playable sooner; once the others are
+    done it is encoded again with the regular settings and swapped in.
+    With HLS_SHARED_AUDIO the audio is encoded once into an audio-only
+    rendition that the master playlist references as an audio group.
+    Before a video rendition is published, its segment timeline (EXTINF)
+    is checked to line up with the first video rendition, so players can
+    switch at any segment boundary; a misaligned rendition is neither
+    published nor marked complete. The audio-only rendition is not
+    compared: its last segment may end a little after the video.
 
     Args:
         source (str): Absolute path to the input video file.
+        job_id (int, optional): TranscodeJob to record the run in.
+
+    Raises:
+        TranscodeError: If ffmpeg fails for a rendition or the renditions
+            are not segmented at the same timestamps.
 
     Returns:
-        str: Path to the last generated playlist file (index.m3u8).
+        str: Path to the playlist (index.m3u8) of the last encoded rendition.
     """
     src = Path(source)
-    RENDITIONS = {
-        "480p": {"height": 480, "v_bitrate": "1200k", "a_bitrate": "128k"},
-        "720p": {"height": 720, "v_bitrate": "2800k", "a_bitrate": "128k"},
-        "1080p": {"height": 1080, "v_bitrate": "5000k", "a_bitrate": "192k"},
+    job = TranscodeJob.objects.filter(pk=job_id).first() if job_id else None
+    if job:
+        job.status = TranscodeJob.STATUS_RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=["status", "started_at"])
+
+    shared_audio = settings.HLS_SHARED_AUDIO and probe_has_audio(src) is not False
+    renditions = plan_renditions(shared_audio)
+
+    # Checkpoints only apply to the exact source file (and layout) they
+    # were made for
+    stat = src.stat()
+    fingerprint = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "shared_audio": shared_audio,
+        "segment_seconds": settings.HLS_SEGMENT_SECONDS,
     }
+    manifest_path = src.parent / f"{src.stem}_hls_manifest.json"
+    manifest = read_manifest(manifest_path)
+    if manifest.get("source") != fingerprint:
+        # Partial output of another source (or layout) must not be resumed
+        for res in (AUDIO_RENDITION, *RENDITIONS):
+            out_dir = src.parent / f"{src.stem}_hls_{res}"
+            shutil.rmtree(_work_dir(out_dir), ignore_errors=True)
+        manifest = {"source": fingerprint, "renditions": {}}
+        write_manifest(manifest_path, manifest)
 
-    for res, cfg in RENDITIONS.items():
-        out_dir = src.parent / f"{src.stem}_hls_{res}"
-        out_dir.mkdir(parents=True, exist_ok=True)
-        playlist = out_dir / "index.m3u8"
-        segments = out_dir / "%03d.ts"
-
-        # ffmpeg command for HLS conversion
-        cmd = [
-            "ffmpeg",
-            "-y",
-            "-i",
-            str(src),
-            "-vf",
-            f"scale=-2:{cfg['height']}",
-            "-c:v",
-            "libx264",
-            "-crf",
-            "23",
-            "-preset",
-            "veryfast",
-            "-c:a",
-            "aac",
-            "-b:a",
-            cfg["a_bitrate"],
-            "-hls_time",
-            "6",
-            "-hls_playlist_type",
-            "vod",
-            "-hls_flags",
-            "independent_segments",
-            "-hls_segment_filename",
-            str(segments),
-            str(playlist),
-        ]
-        subprocess.run(cmd, check=True)
+    duration = job.video.duration if job else None
+    if duration is None and (
+        settings.TRANSCODE_CHUNK_SECONDS or settings.TRANSCODE_PER_TITLE
+    ):
+        duration = probe_duration(src)
+
+    # The lowest video rendition goes first with a faster preset and
+    # without waiting for the complexity analysis, so the video becomes
+    # playable early. It is encoded again with the regular settings once
+    # the other renditions are done.
+    steps = list(renditions.items())
+    if settings.TRANSCODE_PUBLISH_EARLY:
+        index, (first, cfg) = next(
+            (i, step) for i, step in enumerate(steps) if step[1].get("height")
+        )
+        record = manifest["renditions"].get(first)
+        if record is None or record.get("early"):
+            early_cfg = {**cfg, "preset": settings.TRANSCODE_EARLY_PRESET}
+            steps[index] = (first, {**early_cfg, "early": True})
+            steps.append((first, cfg))
 
+    start = time.monotonic()
+    done = []
+    analysed, profile = False, None
+    try:
+        for res, cfg in steps:
+            if cfg.get("height") and not cfg.get("early"):
+                if not analysed:
+                    analysed = True
+                    profile = _per_title_profile(src, duration, manifest, manifest_path)
+                    if profile and job:
+                        Video.all_objects.filter(pk=job.video_id).update(
+                            encoding_profile=profile
+                        )
+                if profile:
+                    cfg = {**cfg, **profile["renditions"].get(res, {})}
+
+            # Video renditions are aligned with the first one; the audio
+            # track may legitimately end a segment later
+            videos = [r for r in done if r != AUDIO_RENDITION]
+            reference = videos[0] if videos else None
+
+            output = None
+            if job:
+                output, _ = RenditionOutput.objects.update_or_create(
+                    job=job,
+                    resolution=res,
+                    defaults={"status": TranscodeJob.STATUS_RUNNING},
+                )
+            playlist = _encode_rendition(
+                src,
+                res,
+                cfg,
+                output,
+                manifest,
+                manifest_path,
+                duration,
+                reference=reference if cfg.get("height") else None,
+            )
+            if res not in done:
+                done.append(res)
+            if res == AUDIO_RENDITION:
+                continue
+
+            # Publish every finished rendition right away
+            _write_master_playlist(src, done, manifest)
+            if job:
+                Video.all_objects.filter(pk=job.video_id).update(
+                    ready_renditions=[r for r in done if r != AUDIO_RENDITION]
+                )
+    except Exception as exc:
+        if job:
+            _finish_job(job, start, TranscodeJob.STATUS_FAILED, str(exc))
+        raise
+
+    if job:
+        _finish_job(job, start, TranscodeJob.STATUS_SUCCEEDED)
     return str(playlist)
 
 
+def _per_title_profile(
+    src: Path, duration: float | None, manifest: dict, manifest_path: Path
+) -> dict | None:
+    """Return the per-title encoding profile, analysing the source once.
+
+    The profile is kept in the manifest so retries encode with the same
+    settings as the renditions that are already done. None if
+    TRANSCODE_PER_TITLE is off or the analysis is not possible.
+    """
+    if not settings.TRANSCODE_PER_TITLE or not duration:
+        return None
+    if "profile" not in manifest:
+        try:
+            manifest["profile"] = analyze_complexity(src, duration)
+        except TranscodeError:
+            logger.warning("complexity analysis of %s failed", src.name, exc_info=True)
+            manifest["profile"] = None
+        write_manifest(manifest_path, manifest)
+    return manifest["profile"]
+
+
+def _write_master_playlist(src: Path, renditions, manifest: dict) -> Path:
+    """Write the master playlist of the given (encoded) renditions of a source.
+
+    Codecs and resolution of every rendition are taken from its manifest
+    entry.
+    """
+    variants, audio, iframes = [], None, []
+    for res in renditions:
+        out_dir = src.parent / f"{src.stem}_hls_{res}"
+        record = manifest["renditions"].get(res, {})
+        codecs, resolution = record.get("codecs", []), record.get("resolution")
+        if res == AUDIO_RENDITION:
+            audio = (f"{res}/{PLAYLIST}", *rendition_bandwidth(out_dir), codecs)
+            continue
+        variants.append(
+            (f"{res}/{PLAYLIST}", *rendition_bandwidth(out_dir), codecs, resolution)
+        )
+        if settings.HLS_IFRAME_PLAYLISTS and (bandwidth := iframe_bandwidth(out_dir)):
+            video_codecs = [c for c in codecs if c != AAC_CODEC]
+            iframes.append(
+                (f"{res}/{IFRAME_PLAYLIST}", *bandwidth, video_codecs, resolution)
+            )
+
+    master = src.parent / f"{src.stem}_hls_master.m3u8"
+    atomic_write_text(master, render_master_playlist(variants, audio, iframes))
+    return master
+
+
+def _finish_job(job: TranscodeJob, start: float, status: str, error: str = ""):
+    job.status = status
+    job.error = error
+    job.finished_at = timezone.now()
+    job.wall_time = time.monotonic() - start
+    job.cpu_time = job.renditions.aggregate(total=Sum("cpu_time"))["total"]
+    job.save()
+
+
 def extract_thumbnail(
     video_id: int,
     src_path: str,
@@ -98,6 +885,8 @@ def extract_thumbnail(
     cmd = [
         "ffmpeg",
         "-y",
+        "-threads",
+        "1",  # a single frame does not need the whole machine
         "-ss",
         str(second),  # seek position before input (faster)
         "-i",
@@ -116,7 +905,7 @@ def extract_thumbnail(
     # Update Video model with thumbnail reference
     video = Video.objects.get(pk=video_id)
     video.thumbnail_url.name = thumb_rel
-    video.save(update_fields=["thumbnail_url"])
+    video.save(update_fields=["thumbnail_url", "updated_at"])
 
     return thumb_abs
 
@@ -126,7 +915,8 @@ def get_hls_dir(video: Video, resolution: str) -> Path:
 
     Args:
         video (Video): Video model instance.
-        resolution (str): Desired resolution (must be in ALLOWED_RESOLUTIONS).
+        resolution (str): Desired resolution (must be in ALLOWED_RESOLUTIONS),
+                          or AUDIO_RENDITION for the shared audio track.
 
     Raises:
         ValueError: If the resolution is not supported.
@@ -134,15 +924,61 @@ def get_hls_dir(video: Video, resolution: str) -> Path:
     Returns:
         Path: Directory path of the HLS output files for the given video.
     """
-    if resolution not in ALLOWED_RESOLUTIONS:
+    if resolution not in ALLOWED_RESOLUTIONS and resolution != AUDIO_RENDITION:
         raise ValueError("unsupported resolution")
 
     source_absolute_path = Path(video.video_file.path)
-    suffix = {"480p": "_hls_480p", "720p": "_hls_720p", "1080p": "_hls_1080p"}[
-        resolution
-    ]
+    suffix = {
+        "480p": "_hls_480p",
+        "720p": "_hls_720p",
+        "1080p": "_hls_1080p",
+        AUDIO_RENDITION: "_hls_audio",
+    }[resolution]
 
     hls_dir = (
         Path(settings.MEDIA_ROOT) / "videos" / f"{source_absolute_path.stem}{suffix}"
     )
     return hls_dir
+
+
+def get_master_playlist(video: Video) -> Path:
+    """Return the path of the master playlist written by convert_to_hls."""
+    stem = Path(video.video_file.path).stem
+    return Path(settings.MEDIA_ROOT) / "videos" / f"{stem}_hls_master.m3u8"
+
+
+def delete_hls_output(video: Video) -> None:
+    """Delete everything convert_to_hls wrote for a video.
+
+    Removes the published renditions (with all their versions), work
+    directories, the master playlist and the transcode manifest.
+    """
+    for res in (AUDIO_RENDITION, *RENDITIONS):
+        out_dir = get_hls_dir(video, res)
+        remove_published(out_dir)
+        shutil.rmtree(_work_dir(out_dir), ignore_errors=True)
+    master = get_master_playlist(video)
+    master.unlink(missing_ok=True)
+    stem = Path(video.video_file.path).stem
+    master.with_name(f"{stem}_hls_manifest.json").unlink(missing_ok=True)
+
+
+def purge_deleted_videos() -> int:
+    """Hard-delete videos soft-deleted more than VIDEO_TOMBSTONE_DAYS ago.
+
+    Deleting the rows fires the post_delete handler, which removes the
+    source file, thumbnail and HLS output. Scheduled daily; delta-sync
+    cursors older than the retention are rejected, since their clients
+    could miss these deletions.
+
+    Returns:
+        int: Number of videos purged.
+    """
+    cutoff = timezone.now() - timedelta(days=settings.VIDEO_TOMBSTONE_DAYS)
+    purged = 0
+    for video in Video.all_objects.filter(deleted_at__lt=cutoff).iterator():
+        video.delete()
+        purged += 1
+    if purged:
+        logger.info("purged %d deleted videos", purged)
+    return purged
@@ -0,0 +1,218 @@
+import json
+from datetime import datetime, timezone
+
+import django_rq
+from django.conf import settings
+from django.db import connection, transaction
+from redis.exceptions import ResponseError
+
+from .models import PlaybackEvent
+from .tasks import ALLOWED_RESOLUTIONS
+
+# Redis stream holding raw beacon batches until they are ingested
+STREAM_KEY = "videoflix:qoe"
+CONSUMER_GROUP = "qoe-ingest"
+
+EVENT_KINDS = {kind for kind, _ in PlaybackEvent.KIND_CHOICES}
+
+# Upper bound for a single duration value (24 hours)
+MAX_VALUE_MS = 24 * 60 * 60 * 1000
+
+
+class InvalidBeacon(ValueError):
+    """Raised when a telemetry beacon does not match the expected format."""
+
+
+def validate_beacon(payload) -> tuple:
+    """Validate a beacon with plain type checks (no per-event serializer).
+
+    Expected format:
+        {"session": "<id>", "events": [[video_id, resolution, kind, value_ms], ...]}
+
+    Raises:
+        InvalidBeacon: If the payload is malformed.
+
+    Returns:
+        tuple: (session, events)
+    """
+    if not isinstance(payload, dict):
+        raise InvalidBeacon("payload must be an object")
+
+    session = payload.get("session")
+    events = payload.get("events")
+    if not isinstance(session, str) or not 0 < len(session) <= 64:
+        raise InvalidBeacon("session must be a string of 1-64 characters")
+    if not isinstance(events, list) or not events:
+        raise InvalidBeacon("events must be a non-empty list")
+    if len(events) > settings.QOE_MAX_EVENTS_PER_BEACON:
+        raise InvalidBeacon("too many events")
+
+    for event in events:
+        if not (isinstance(event, list) and len(event) == 4):
+            raise InvalidBeacon("events must be [video_id, resolution, kind, ms]")
+        video_id, resolution, kind, value_ms = event
+        if (
+            type(video_id) is not int
+            or video_id <= 0
+            or resolution not in ALLOWED_RESOLUTIONS
+            or kind not in EVENT_KINDS
+            or type(value_ms) is not int
+            or not 0 <= value_ms <= MAX_VALUE_MS
+        ):
+            raise InvalidBeacon(f"invalid event {event!r}")
+
+    return session, events
+
+
+def append_beacon(session: str, events: list, user_id: int | None) -> None:
+    """Append a validated beacon to the Redis stream as a single entry."""
+    django_rq.get_connection("default").xadd(
+        STREAM_KEY,
+        {
+            "session": session,
+            "user": "" if user_id is None else user_id,
+            "received": datetime.now(timezone.utc).timestamp(),
+            "events": json.dumps(events, separators=(",", ":")),
+        },
+        maxlen=settings.QOE_STREAM_MAXLEN,
+        approximate=True,
+    )
+
+
+def _to_rows(fields: dict) -> list:
+    received_at = datetime.fromtimestamp(float(fields[b"received"]), tz=timezone.utc)
+    session = fields[b"session"].decode()
+    user_id = int(fields[b"user"]) if fields[b"user"] else None
+    return [
+        PlaybackEvent(
+            received_at=received_at,
+            session=session,
+            user_id=user_id,
+            video_id=video_id,
+            resolution=resolution,
+            kind=kind,
+            value_ms=value_ms,
+        )
+        for video_id, resolution, kind, value_ms in json.loads(fields[b"events"])
+    ]
+
+
+def ingest_playback_events(consumer: str = "worker", count: int | None = None) -> int:
+    """Move beacons from the Redis stream into PlaybackEvent in bulk.
+
+    Reads through a consumer group, so several workers can share the work.
+    Entries left pending by a crashed worker are reclaimed after a minute.
+    Entries are acknowledged and deleted only after the insert committed.
+
+    Args:
+        consumer (str): Consumer name inside the group.
+        count (int, optional): Stream entries per batch.
+            Defaults to QOE_INGEST_BATCH_SIZE.
+
+    Returns:
+        int: Number of events inserted.
+    """
+    count = count or settings.QOE_INGEST_BATCH_SIZE
+    conn = django_rq.get_connection("default")
+    try:
+        conn.xgroup_create(STREAM_KEY, CONSUMER_GROUP, id="0", mkstream=True)
+    except ResponseError:
+        pass  # group already exists
+
+    inserted = 0
+    _, entries, *_ = conn.xautoclaim(
+        STREAM_KEY, CONSUMER_GROUP, consumer, min_idle_time=60_000, count=count
+    )
+    while True:
+        if not entries:
+            response = conn.xreadgroup(
+                CONSUMER_GROUP, consumer, {STREAM_KEY: ">"}, count=count
+            )
+            entries = response[0][1] if response else []
+        if not entries:
+            return inserted
+
+        rows = [row for _, fields in entries if fields for row in _to_rows(fields)]
+        PlaybackEvent.objects.bulk_create(rows, batch_size=1000)
+
+        ids = [entry_id for entry_id, _ in entries]
+        conn.xack(STREAM_KEY, CONSUMER_GROUP, *ids)
+        conn.xdel(STREAM_KEY, *ids)
+        inserted += len(rows)
+        entries = []
+
+
+def _month_start(year: int, month: int) -> datetime:
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return datetime(year, month, 1, tzinfo=timezone.utc)
+
+
+def _attach_month(cursor, table: str, start: datetime) -> None:
+    """Create the partition of one month, taking over its rows from DEFAULT.
+
+    A partition cannot be created while the DEFAULT partition holds rows
+    of its range, so it is built as a plain table, filled with those rows
+    and attached. DEFAULT is locked meanwhile so no new rows slip in.
+    """
+    end = _month_start(start.year, start.month + 1)
+    name = f"{table}_{start:y%Ym%m}"
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0] is not None:
+        return
+
+    cursor.execute(f"LOCK TABLE {table}_default IN ACCESS EXCLUSIVE MODE")
+    cursor.execute(
+        f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    )
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {table}_default "
+        f"WHERE received_at >= %s AND received_at < %s RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved",
+        [start, end],
+    )
+    cursor.execute(
+        f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)",
+        [start, end],
+    )
+
+
+def ensure_partitions(months_ahead: int = 2) -> None:
+    """Create monthly partitions ahead of time and drop expired ones.
+
+    Keeps QOE_RETENTION_MONTHS months of data; dropping a partition is a
+    metadata operation instead of a large DELETE. Rows that landed in the
+    DEFAULT partition (before the job first ran, or while it was down) are
+    moved into their monthly partition, or deleted once expired. No-op on
+    other backends.
+
+    Args:
+        months_ahead (int): Number of future months to prepare.
+    """
+    if connection.vendor != "postgresql":
+        return
+
+    table = PlaybackEvent._meta.db_table
+    today = datetime.now(timezone.utc)
+    oldest = _month_start(today.year, today.month - settings.QOE_RETENTION_MONTHS)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table}_default WHERE received_at < %s", [oldest])
+        cursor.execute(f"SELECT min(received_at) FROM {table}_default")
+        first = cursor.fetchone()[0] or today
+        month = _month_start(first.year, first.month)
+        last = _month_start(today.year, today.month + months_ahead)
+        while month <= last:
+            _attach_month(cursor, table, month)
+            month = _month_start(month.year, month.month + 1)
+
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s AND c.relname ~ '_y[0-9]{4}m[0-9]{2}$'",
+            [table],
+        )
+        for (name,) in cursor.fetchall():
+            suffix = name.rsplit("_", 1)[1]
+            if _month_start(int(suffix[1:5]), int(suffix[6:8])) < oldest:
+                cursor.execute(f"DROP TABLE {name}")
@@ -1,16 +1,88 @@
 import pytest
+from asgiref.sync import async_to_sync
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APIClient
+from .analytics import rollup_recent_hours
+from .models import (
+    RenditionOutput,
+    TranscodeJob,
+    Video,
+    VideoHourlyStats,
+    WatchProgress,
+)
+from .progress import flush_progress
+from .telemetry import ingest_playback_events
 from .tasks import convert_to_hls, extract_thumbnail, get_hls_dir
+from datetime import timedelta
+from django.utils import timezone
 from types import SimpleNamespace
 from pathlib import Path
+import errno
+import os
+import django_rq
+import fakeredis
+import videos_app.analytics as analytics
+import videos_app.hls as hls
+import videos_app.probe as probe
+import videos_app.scheduler as scheduler
+import videos_app.signals as signals
 import videos_app.tasks as tasks
 
 # Tests for video API & HLS task helpers:
 # - Authenticated GET /video/ returns a list
 # - get_hls_dir builds the expected path
 # - convert_to_hls invokes ffmpeg (mocked)
+# - home screen rows group the newest videos per category
+# - search returns paginated matches; only text changes refresh the index
+# - listing supports sparse fieldsets and hides the upload path
+# - delta sync reports changes and tombstones after a cursor; expired
+#   tombstones are purged with their files
+# - async playlist/segment views require auth and stream files
+# - watch progress is buffered in Redis and flushed in batches
+# - playback counters roll up into hourly stats and the trending list
+# - QoE beacons are validated, ingested in bulk and reported
+# - sampled requests carry a Server-Timing header
+# - /metrics exposes per-route latency, RQ queues and bytes served
+# - the ASGI middleware stack runs without sync adapters
+# - transcode jobs record per-rendition statistics and failures
+# - an interrupted transcode skips finished renditions and resumes
+# - repeated crashes and a replaced source do not corrupt a resumed encode
+# - long sources are encoded in parallel chunks (with one audio encode)
+#   and stitched in order
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    """Replace the RQ queue with a recorder so no Redis is needed."""
+    calls = []
+    queue = SimpleNamespace(enqueue=lambda func, *a, **kw: calls.append(func))
+    monkeypatch.setattr(django_rq, "get_queue", lambda *a, **kw: queue)
+    return calls
+
+
+@pytest.fixture
+def redis_conn(monkeypatch):
+    """Route Redis access through an in-memory fake server."""
+    conn = fakeredis.FakeRedis()
+    monkeypatch.setattr(django_rq, "get_connection", lambda *a, **kw: conn)
+    return conn
+
+
+def auth_client(email="viewer@test.com"):
+    """Return an APIClient authenticated with a Bearer access token."""
+    client = APIClient()
+    password = "testpassword"
+    User.objects.create_user(
+        username=email, email=email, password=password, is_active=True
+    )
+    resp = client.post(
+        reverse("login"), {"email": email, "password": password}, format="json"
+    )
+    access = resp.cookies["access_token"].value
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+    return client
 
 
 @pytest.mark.django_db
@@ -46,20 +118,959 @@ def test_get_hls_dir(tmp_path, settings):
     assert p == Path(tmp_path) / "videos" / "clip_hls_720p"
 
 
-def test_convert_to_hls(monkeypatch, tmp_path):
+def fake_ffmpeg(cmd, **kwargs):
+    """Write two segments and their playlist where ffmpeg would put them."""
+    if "-hls_segment_filename" not in cmd:
+        Path(cmd[-1]).write_bytes(b"x" * 100)
+        return
+    playlist = Path(cmd[-1])
+    pattern = Path(cmd[cmd.index("-hls_segment_filename") + 1]).name
+    first = int(cmd[cmd.index("-start_number") + 1])
+    # A 10 s source; a resumed encode only writes what is left of it
+    resumed_at = 0.0
+    if "-ss" in cmd and "-t" not in cmd:
+        resumed_at = float(cmd[cmd.index("-ss") + 1])
+    durations = [d for end, d in ((6.0, 6.0), (10.0, 4.0)) if end > resumed_at]
+    lines = ["#EXTM3U"]
+    for n, duration in enumerate(durations, start=first):
+        (playlist.parent / (pattern % n)).write_bytes(b"x" * 100)
+        lines += [f"#EXTINF:{duration},", pattern % n]
+    playlist.write_text("\n".join(lines + ["#EXT-X-ENDLIST"]) + "\n")
+
+
+def test_convert_to_hls(redis_conn, monkeypatch, tmp_path):
     """convert_to_hls issues one ffmpeg call per rendition (3 total)."""
     src = tmp_path / "movie.mp4"
     src.write_bytes(b"x")  # dummy file
 
     calls = []
 
-    def fake_run(cmd, check=True):
+    def fake_run(cmd, **kwargs):
         calls.append(cmd)
+        fake_ffmpeg(cmd)
 
-    # Patch subprocess.run so no real ffmpeg is executed
+    # Patch subprocess.run and ffprobe so no real ffmpeg is executed
     monkeypatch.setattr(tasks.subprocess, "run", fake_run)
+    monkeypatch.setattr(tasks, "probe_duration", lambda path: None)
 
     out = tasks.convert_to_hls(str(src))
 
     assert Path(out).name == "index.m3u8"
     assert len(calls) == 3  # 480p, 720p, 1080p
+
+
+@pytest.mark.django_db
+def test_category_rows_newest_per_category(enqueued):
+    """Rows contain at most `per_row` videos per category, newest first."""
+    for category in ("Drama", "Action"):
+        for i in range(3):
+            Video.objects.create(
+                title=f"{category} {i}",
+                category=category,
+                video_file=f"videos/{category}{i}.mp4",
+            )
+
+    resp = auth_client().get(reverse("video-rows"), {"per_row": 2})
+
+    assert resp.status_code == 200
+    assert [row["category"] for row in resp.data] == ["Action", "Drama"]
+    assert [v["title"] for v in resp.data[0]["videos"]] == ["Action 2", "Action 1"]
+    assert all(len(row["videos"]) == 2 for row in resp.data)
+
+
+@pytest.mark.django_db
+def test_search_returns_paginated_matches(enqueued):
+    """Search matches on title/description and wraps results in a page."""
+    Video.objects.create(
+        title="Ocean Life", category="Nature", video_file="videos/a.mp4"
+    )
+    Video.objects.create(
+        title="City Lights",
+        description="A night in the ocean city",
+        category="Drama",
+        video_file="videos/b.mp4",
+    )
+    Video.objects.create(title="Desert", category="Nature", video_file="videos/c.mp4")
+
+    resp = auth_client().get(reverse("video-search"), {"q": "ocean"})
+
+    assert resp.status_code == 200
+    assert resp.data["count"] == 2
+    assert {v["title"] for v in resp.data["results"]} == {"Ocean Life", "City Lights"}
+
+
+@pytest.mark.django_db
+def test_search_vector_only_refreshed_for_text_changes(enqueued, monkeypatch):
+    """Saves limited to non-text fields skip the search vector update."""
+    refreshed = []
+    monkeypatch.setattr(signals, "update_search_vector", refreshed.append)
+    video = Video.objects.create(title="A", category="B", video_file="videos/a.mp4")
+
+    video.thumbnail_url.name = "thumbnails/1.jpg"
+    video.save(update_fields=["thumbnail_url", "updated_at"])
+    video.title = "A (director's cut)"
+    video.save(update_fields=["title", "updated_at"])
+
+    assert refreshed == [video.pk, video.pk]
+
+
+@pytest.mark.django_db
+def test_video_list_sparse_fields(enqueued):
+    """`?fields=` limits the payload; the raw upload path is never exposed."""
+    Video.objects.create(
+        title="Clip",
+        category="Drama",
+        video_file="videos/clip.mp4",
+        thumbnail_url="thumbnails/1.jpg",
+    )
+    client = auth_client()
+
+    full = client.get(reverse("video-list"))
+    sparse = client.get(reverse("video-list"), {"fields": "title,thumbnail_url"})
+
+    assert "video_file" not in full.data[0]
+    assert full.data[0]["created_at"].endswith("Z")
+    assert sparse.data == [
+        {"title": "Clip", "thumbnail_url": "http://testserver/media/thumbnails/1.jpg"}
+    ]
+
+
+@pytest.mark.django_db
+def test_sync_returns_changes_and_tombstones(enqueued, settings):
+    """A cursor from a full sync yields only later updates and deletions."""
+    settings.VIDEO_SYNC_SETTLE_SECONDS = 0
+    kept = Video.objects.create(title="Kept", category="A", video_file="videos/k.mp4")
+    gone = Video.objects.create(title="Gone", category="A", video_file="videos/g.mp4")
+    client = auth_client()
+
+    initial = client.get(reverse("video-sync"))
+    assert {v["title"] for v in initial.data["changed"]} == {"Kept", "Gone"}
+
+    kept.title = "Kept (remastered)"
+    kept.save()
+    gone.soft_delete()
+
+    delta = client.get(reverse("video-sync"), {"cursor": initial.data["cursor"]})
+
+    assert [v["title"] for v in delta.data["changed"]] == ["Kept (remastered)"]
+    assert delta.data["deleted"] == [gone.pk]
+    assert not Video.objects.filter(pk=gone.pk).exists()
+    assert "+" not in initial.data["cursor"]
+
+    settings.VIDEO_TOMBSTONE_DAYS = 0
+    expired = client.get(reverse("video-sync"), {"cursor": initial.data["cursor"]})
+    assert expired.status_code == 410
+
+
+@pytest.mark.django_db
+def test_purge_deleted_videos_removes_rows_and_files(enqueued, settings, tmp_path):
+    """Expired tombstones are hard-deleted together with all their media."""
+    settings.MEDIA_ROOT = tmp_path
+    settings.TRANSCODE_SCRATCH_DIR = ""
+    videos = tmp_path / "videos"
+    old = Video.objects.create(title="Old", category="A", video_file="videos/old.mp4")
+    new = Video.objects.create(title="New", category="A", video_file="videos/new.mp4")
+    for stem in ("old", "new"):
+        src = videos / f"{stem}.mp4"
+        src.parent.mkdir(exist_ok=True)
+        src.write_bytes(b"video")
+        work = videos / f"{stem}_hls_480p.work"
+        work.mkdir()
+        (work / "index.m3u8").write_text("#EXTM3U\n")
+        hls.publish_directory(work, videos / f"{stem}_hls_480p")
+        (videos / f"{stem}_hls_master.m3u8").write_text("#EXTM3U\n")
+    old.soft_delete()
+    new.soft_delete()
+    Video.all_objects.filter(pk=old.pk).update(
+        deleted_at=timezone.now() - timedelta(days=settings.VIDEO_TOMBSTONE_DAYS + 1)
+    )
+
+    assert tasks.purge_deleted_videos() == 1
+
+    assert list(Video.all_objects.values_list("pk", flat=True)) == [new.pk]
+    assert not [p for p in videos.iterdir() if p.name.startswith((".old", "old"))]
+    assert (videos / "new_hls_480p" / "index.m3u8").exists()
+
+
+@pytest.mark.django_db
+def test_async_hls_views_serve_files(enqueued, redis_conn, settings, tmp_path):
+    """Playlist and segment are served to authenticated users only."""
+    settings.MEDIA_ROOT = tmp_path
+    video = Video.objects.create(
+        title="Clip", category="Drama", video_file="videos/clip.mp4"
+    )
+    hls_dir = tmp_path / "videos" / "clip_hls_480p"
+    hls_dir.mkdir(parents=True)
+    (hls_dir / "index.m3u8").write_bytes(b"#EXTM3U\n")
+    (hls_dir / "000.ts").write_bytes(b"x" * 100_000)
+
+    master_url = reverse("video-master", args=[video.pk, "480p"])
+    segment_url = reverse("video-segment", args=[video.pk, "480p", "000.ts"])
+
+    assert APIClient().get(master_url).status_code == 401
+
+    client = auth_client()
+    master = client.get(master_url)
+    segment = client.get(segment_url)
+
+    assert master.status_code == 200
+    assert master.content == b"#EXTM3U\n"
+    assert segment["Content-Length"] == "100000"
+
+    async def body():
+        return b"".join([chunk async for chunk in segment.streaming_content])
+
+    assert async_to_sync(body)() == b"x" * 100_000
+    assert client.get(reverse("video-master", args=[video.pk, "4k"])).status_code == 404
+
+
+@pytest.mark.django_db
+def test_watch_progress_write_behind(enqueued, redis_conn):
+    """Heartbeats are read back from Redis and upserted by the flush job."""
+    video = Video.objects.create(title="Clip", category="A", video_file="videos/c.mp4")
+    client = auth_client()
+    url = reverse("video-progress", args=[video.pk])
+
+    for position in (5, 10, 42.5):
+        resp = client.put(url, {"position": position, "duration": 600}, format="json")
+        assert resp.status_code == 202
+    assert not WatchProgress.objects.exists()
+    assert client.get(url).data["position"] == 42.5
+
+    # Unknown videos are accepted without a query and dropped on flush
+    missing = reverse("video-progress", args=[video.pk + 1])
+    resp = client.put(missing, {"position": 5, "duration": 600}, format="json")
+    assert resp.status_code == 202
+
+    assert flush_progress() == 1
+    assert WatchProgress.objects.get().position == 42.5
+
+    # Redis entry expired: the read falls back to the flushed row
+    redis_conn.flushall()
+    assert client.get(url).data["position"] == 42.5
+
+
+@pytest.mark.django_db
+def test_playback_counters_roll_up_into_trending(
+    enqueued, redis_conn, settings, tmp_path
+):
+    """Plays are counted once per viewing session and surface in trending."""
+    settings.MEDIA_ROOT = tmp_path
+    hot = Video.objects.create(title="Hot", category="A", video_file="videos/hot.mp4")
+    Video.objects.create(title="Cold", category="A", video_file="videos/cold.mp4")
+    for res in ("720p", "480p", "audio"):
+        hls_dir = tmp_path / "videos" / f"hot_hls_{res}"
+        hls_dir.mkdir(parents=True)
+        (hls_dir / "index.m3u8").write_bytes(b"#EXTM3U\n")
+    (tmp_path / "videos" / "hot_hls_720p" / "000.ts").write_bytes(b"x")
+
+    # Reloads, a rendition switch and the shared audio are one play
+    client = auth_client()
+    for res in ("720p", "audio", "720p", "480p"):
+        client.get(reverse("video-master", args=[hot.pk, res]))
+    client.get(reverse("video-segment", args=[hot.pk, "720p", "000.ts"]))
+    auth_client("other@test.com").get(reverse("video-master", args=[hot.pk, "720p"]))
+
+    assert rollup_recent_hours() == 1
+    stats = VideoHourlyStats.objects.get()
+    assert (stats.resolution, stats.plays, stats.unique_viewers) == ("720p", 2, 2)
+    assert stats.segment_hits == 1
+
+    # The first viewer also watched an hour ago: still two distinct viewers
+    earlier = timezone.now() - timedelta(hours=1)
+    VideoHourlyStats.objects.create(
+        video=hot, hour=earlier, resolution="720p", plays=1, unique_viewers=1
+    )
+    key = analytics.VIDEO_VIEWERS_KEY.format(
+        hour=analytics.hour_bucket(earlier), video_id=hot.pk
+    )
+    redis_conn.pfadd(key, User.objects.get(email="viewer@test.com").pk)
+
+    trending = client.get(reverse("video-trending")).data
+    assert [(v["title"], v["plays"], v["unique_viewers"]) for v in trending] == [
+        ("Hot", 3, 2)
+    ]
+
+
+@pytest.mark.django_db
+def test_qoe_beacons_ingested_and_reported(redis_conn):
+    """Beacons land in the stream, are bulk-inserted and aggregated."""
+    client = auth_client()
+    url = reverse("video-telemetry")
+    beacon = {
+        "session": "s1",
+        "events": [
+            [1, "720p", "startup", 800],
+            [1, "720p", "play", 9000],
+            [1, "720p", "rebuffer", 1000],
+        ],
+    }
+
+    assert client.post(url, beacon, format="json").status_code == 202
+    bad = {"session": "s1", "events": [[1, "4k", "startup", 800]]}
+    assert client.post(url, bad, format="json").status_code == 400
+
+    assert ingest_playback_events() == 3
+    assert ingest_playback_events() == 0
+
+    User.objects.filter(email="viewer@test.com").update(is_staff=True)
+    report = client.get(reverse("video-telemetry-report")).data
+    assert report[0]["resolution"] == "720p"
+    assert report[0]["avg_startup_ms"] == 800
+    assert report[0]["rebuffer_ratio"] == pytest.approx(0.1)
+
+
+@pytest.mark.django_db
+def test_server_timing_header_for_sampled_requests(enqueued, settings):
+    """Sampled requests report DB, cache and auth time; others are untouched."""
+    Video.objects.create(title="A", category="Drama", video_file="videos/a.mp4")
+    client = auth_client()
+
+    settings.SERVER_TIMING_SAMPLE_RATE = 1
+    resp = client.get(reverse("video-rows"))
+    metrics = dict(
+        part.strip().split(";", 1) for part in resp["Server-Timing"].split(",")
+    )
+    assert set(metrics) == {"total", "db", "cache", "auth"}
+    assert 'desc="0 queries"' not in metrics["db"]
+
+    settings.SERVER_TIMING_SAMPLE_RATE = 0
+    assert not client.get(reverse("video-rows")).has_header("Server-Timing")
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint(monkeypatch, settings):
+    """/metrics reports route latency and RQ queue sizes; access is enforced."""
+    queue = SimpleNamespace(count=3, failed_job_registry=SimpleNamespace(count=1))
+    monkeypatch.setattr(django_rq, "get_queue", lambda *a, **kw: queue)
+    client = auth_client()
+    client.get(reverse("video-list"))
+
+    settings.METRICS_TOKEN = ""
+    assert APIClient().get(reverse("metrics")).status_code == 403
+    staff = APIClient()
+    staff.force_login(User.objects.create_user(username="ops", is_staff=True))
+    assert staff.get(reverse("metrics")).status_code == 200
+
+    settings.METRICS_TOKEN = "secret"
+    assert APIClient().get(reverse("metrics")).status_code == 401
+
+    resp = APIClient().get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret")
+    body = resp.content.decode()
+    assert resp.status_code == 200
+    assert 'route="video-list",status="200"' in body
+    assert 'videoflix_rq_queue_jobs{queue="default"} 3.0' in body
+    assert 'videoflix_rq_failed_jobs{queue="default"} 1.0' in body
+
+
+def test_asgi_stack_is_fully_async(caplog):
+    """No middleware is adapted to sync; static files bypass Django."""
+    from asgiref.testing import ApplicationCommunicator
+    from django.core.handlers.asgi import ASGIHandler
+
+    import core.asgi
+
+    caplog.set_level("DEBUG", logger="django.request")
+    ASGIHandler()
+    assert "adapted" not in caplog.text
+
+    async def fetch(path):
+        scope = {
+            "type": "http",
+            "http_version": "1.1",
+            "method": "GET",
+            "path": path,
+            "query_string": b"",
+            "headers": [],
+        }
+        app = ApplicationCommunicator(core.asgi.application, scope)
+        await app.send_input({"type": "http.request", "body": b""})
+        return (await app.receive_output(5))["status"]
+
+    assert async_to_sync(fetch)("/static/rest_framework/img/grid.png") == 200
+    assert async_to_sync(fetch)("/static/missing.css") == 404
+
+
+@pytest.mark.django_db
+def test_transcode_job_records_rendition_stats(
+    enqueued, redis_conn, monkeypatch, tmp_path
+):
+    """Each rendition stores its stats; a failing encode marks the job failed."""
+    src = tmp_path / "movie.mp4"
+    src.write_bytes(b"x")
+    video = Video.objects.create(title="A", category="Drama", video_file="a.mp4")
+    job = TranscodeJob.objects.get(video=video)
+    monkeypatch.setattr(tasks.subprocess, "run", fake_ffmpeg)
+
+    tasks.convert_to_hls(str(src), job_id=job.pk)
+
+    job.refresh_from_db()
+    assert job.status == TranscodeJob.STATUS_SUCCEEDED
+    assert job.renditions.count() == 3
+    output = job.renditions.get(resolution="720p")
+    assert (output.segment_count, output.output_bytes) == (2, 200)
+    assert output.media_duration == 10.0
+
+    def failing_ffmpeg(cmd, **kwargs):
+        raise tasks.subprocess.CalledProcessError(1, cmd, stderr="No such file")
+
+    monkeypatch.setattr(tasks.subprocess, "run", failing_ffmpeg)
+    other = tmp_path / "other.mp4"
+    other.write_bytes(b"x")
+    failed = TranscodeJob.objects.create(video=video, source=str(other))
+    with pytest.raises(tasks.TranscodeError):
+        tasks.convert_to_hls(str(other), job_id=failed.pk)
+    failed.refresh_from_db()
+    assert failed.status == TranscodeJob.STATUS_FAILED
+    assert "No such file" in RenditionOutput.objects.get(job=failed).error
+
+    client = auth_client()
+    User.objects.filter(email="viewer@test.com").update(is_staff=True)
+    stats = {
+        row["resolution"]: row
+        for row in client.get(reverse("video-transcode-stats")).data
+    }
+    assert stats["480p"]["encodes"] == 2
+    assert stats["480p"]["failed"] == 1
+    assert stats["720p"]["output_bytes"] == 200
+
+
+def test_convert_to_hls_resumes_after_crash(redis_conn, monkeypatch, tmp_path):
+    """A retry skips complete renditions and continues after the last segment."""
+    src = tmp_path / "movie.mp4"
+    src.write_bytes(b"x")
+
+    def crash_in_720p(cmd, **kwargs):
+        if "scale=-2:720" not in cmd:
+            return fake_ffmpeg(cmd)
+        out_dir = Path(cmd[-1]).parent
+        (out_dir / "000.ts").write_bytes(b"x" * 100)
+        (out_dir / "001.ts").write_bytes(b"partial")
+        Path(cmd[-1]).write_text("#EXTM3U\n#EXTINF:6.0,\n000.ts\n")
+        raise tasks.subprocess.CalledProcessError(-9, cmd, stderr="Killed")
+
+    monkeypatch.setattr(tasks.subprocess, "run", crash_in_720p)
+    with pytest.raises(tasks.TranscodeError):
+        tasks.convert_to_hls(str(src))
+
+    calls = []
+    monkeypatch.setattr(
+        tasks.subprocess, "run", lambda cmd, **kw: calls.append(cmd) or fake_ffmpeg(cmd)
+    )
+    tasks.convert_to_hls(str(src))
+
+    assert [c[c.index("-vf") + 1] for c in calls] == ["scale=-2:720", "scale=-2:1080"]
+    resumed = calls[0]
+    assert resumed[resumed.index("-ss") + 1] == "6.000000"
+    assert resumed[resumed.index("-start_number") + 1] == "1"
+
+    playlist = (tmp_path / "movie_hls_720p" / "index.m3u8").read_text()
+    assert [line for line in playlist.splitlines() if line.endswith(".ts")] == [
+        "000.ts",
+        "001.ts",
+    ]
+    assert playlist.rstrip().endswith("#EXT-X-ENDLIST")
+
+
+def test_convert_to_hls_survives_repeated_crashes(redis_conn, monkeypatch, tmp_path):
+    """Kept segments are counted once, however often a resumed encode dies."""
+    src = tmp_path / "movie.mp4"
+    src.write_bytes(b"x")
+    calls = []
+
+    def crash_in_720p(cmd, **kwargs):
+        calls.append(cmd)
+        if "scale=-2:720" not in cmd:
+            return fake_ffmpeg(cmd)
+        if "-ss" not in cmd:
+            (Path(cmd[-1]).parent / "000.ts").write_bytes(b"x" * 100)
+            Path(cmd[-1]).write_text("#EXTM3U\n#EXTINF:6.0,\n000.ts\n")
+        # A resumed attempt dies before it writes anything
+        raise tasks.subprocess.CalledProcessError(-9, cmd, stderr="Killed")
+
+    monkeypatch.setattr(tasks.subprocess, "run", crash_in_720p)
+    for _ in range(3):
+        with pytest.raises(tasks.TranscodeError):
+            tasks.convert_to_hls(str(src))
+
+    resumed = [c for c in calls if "scale=-2:720" in c][1:]
+    assert len(resumed) == 2
+    for cmd in resumed:
+        assert cmd[cmd.index("-ss") + 1] == "6.000000"
+        assert cmd[cmd.index("-start_number") + 1] == "1"
+
+
+def test_convert_to_hls_discards_partial_output_of_replaced_source(
+    redis_conn, monkeypatch, tmp_path
+):
+    """A new source file is encoded from scratch, not resumed."""
+    src = tmp_path / "movie.mp4"
+    src.write_bytes(b"x")
+
+    def crash_in_720p(cmd, **kwargs):
+        if "scale=-2:720" not in cmd:
+            return fake_ffmpeg(cmd)
+        (Path(cmd[-1]).parent / "000.ts").write_bytes(b"old")
+        Path(cmd[-1]).write_text("#EXTM3U\n#EXTINF:6.0,\n000.ts\n")
+        raise tasks.subprocess.CalledProcessError(-9, cmd, stderr="Killed")
+
+    monkeypatch.setattr(tasks.subprocess, "run", crash_in_720p)
+    with pytest.raises(tasks.TranscodeError):
+        tasks.convert_to_hls(str(src))
+
+    src.write_bytes(b"new source")
+    calls = []
+    monkeypatch.setattr(
+        tasks.subprocess, "run", lambda cmd, **kw: calls.append(cmd) or fake_ffmpeg(cmd)
+    )
+    tasks.convert_to_hls(str(src))
+
+    assert len(calls) == 3 and not any("-ss" in c for c in calls)
+    assert (tmp_path / "movie_hls_720p" / "000.ts").read_bytes() == b"x" * 100
+
+
+def test_convert_to_hls_encodes_long_sources_in_chunks(
+    redis_conn, monkeypatch, settings, tmp_path
+):
+    """Chunks are encoded at their offsets and renumbered consecutively."""
+    settings.TRANSCODE_CHUNK_SECONDS = 300
+    settings.TRANSCODE_CHUNK_MIN_DURATION = 600
+    src = tmp_path / "film.mp4"
+    src.write_bytes(b"x")
+    calls = []
+    monkeypatch.setattr(tasks, "probe_duration", lambda path: 700.0)
+    monkeypatch.setattr(tasks, "probe_has_audio", lambda path: True)
+    monkeypatch.setattr(
+        tasks.subprocess, "run", lambda cmd, **kw: calls.append(cmd) or fake_ffmpeg(cmd)
+    )
+
+    tasks.convert_to_hls(str(src))
+
+    first = [c for c in calls if "scale=-2:480" in c]
+    assert sorted(c[c.index("-ss") + 1] for c in first if "-ss" in c) == [
+        "300.000000",
+        "600.000000",
+    ]
+    assert all(c[c.index("-t") + 1] == "300.000000" for c in first)
+
+    # The audio is encoded once per rendition and copied into every chunk
+    audio = [c for c in calls if "-vn" in c]
+    assert [c[c.index("-b:a") + 1] for c in audio] == ["128k", "128k", "192k"]
+    assert all("-ss" not in c and "-t" not in c for c in audio)
+    for cmd in first:
+        assert cmd[cmd.index("-c:a") + 1] == "copy"
+        assert Path(cmd[cmd.index("-i", cmd.index("-i") + 1) + 1]).name == "audio.m4a"
+
+    out_dir = tmp_path / "film_hls_480p"
+    playlist = (out_dir / "index.m3u8").read_text().splitlines()
+    segments = [line for line in playlist if line.endswith(".ts")]
+    assert segments == [f"{n:03d}.ts" for n in range(6)]
+    assert sorted(p.name for p in out_dir.iterdir()) == segments + ["index.m3u8"]
+
+
+def test_core_scheduler_admits_jobs_within_host_budget(redis_conn, settings):
+    """ffmpeg processes share the host core budget and get a thread budget."""
+    settings.TRANSCODE_CORE_BUDGET = 4
+    settings.TRANSCODE_MAX_THREADS = 3
+    settings.TRANSCODE_MIN_THREADS = 2
+    cores = scheduler.CoreScheduler()
+
+    with cores.lease() as lease:
+        assert lease.threads == 3
+        # Only one core is left, below the admission threshold
+        assert cores.try_acquire("other") == []
+
+        cmd = tasks.hls_command(
+            Path("movie.mp4"),
+            tasks.RENDITIONS["480p"],
+            Path("index.m3u8"),
+            Path("%03d.ts"),
+            threads=lease.threads,
+        )
+        assert cmd[cmd.index("-x264-params") + 1] == "threads=3"
+
+    assert cores.try_acquire("other") == [0, 1, 2]
+
+
+@pytest.mark.django_db
+def test_upload_rejects_files_without_video_stream(
+    enqueued, monkeypatch, settings, tmp_path
+):
+    """Uploads are probed first; audio-only files get a 400 and queue nothing."""
+    settings.MEDIA_ROOT = tmp_path
+    streams = {"audio": [{"codec_type": "audio", "codec_name": "mp3"}]}
+    streams["video"] = streams["audio"] + [
+        {
+            "codec_type": "video",
+            "codec_name": "h264",
+            "width": 1920,
+            "height": 1080,
+            "avg_frame_rate": "25/1",
+        }
+    ]
+
+    def fake_probe(path):
+        kind = "video" if Path(path).read_bytes() == b"video" else "audio"
+        return {"format": {"duration": "42.5"}, "streams": streams[kind]}
+
+    monkeypatch.setattr(probe, "run_ffprobe", fake_probe)
+    client = auth_client()
+    User.objects.filter(email="viewer@test.com").update(is_staff=True)
+
+    def upload(content):
+        data = {
+            "title": "Clip",
+            "category": "Drama",
+            "video_file": SimpleUploadedFile("clip.mp4", content),
+        }
+        return client.post(reverse("video-upload"), data, format="multipart")
+
+    resp = upload(b"audio")
+    assert resp.status_code == 400
+    assert resp.data["video_file"] == ["The file has no video stream."]
+    assert not Video.objects.exists() and enqueued == []
+
+    resp = upload(b"video")
+    assert resp.status_code == 201
+    video = Video.objects.get()
+    assert video.duration == 42.5
+    assert video.media_info["video"]["height"] == 1080
+    assert convert_to_hls in enqueued
+
+
+def test_convert_to_hls_shares_one_audio_rendition(
+    redis_conn, monkeypatch, settings, tmp_path
+):
+    """Audio is encoded once and referenced as an audio group by all variants."""
+    settings.HLS_SHARED_AUDIO = True
+    src = tmp_path / "movie.mp4"
+    src.write_bytes(b"x")
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        fake_ffmpeg(cmd)
+        if "-vn" in cmd:
+            # Audio running slightly longer than the video adds a segment
+            playlist = Path(cmd[-1])
+            (playlist.parent / "099.ts").write_bytes(b"x" * 5)
+            playlist.write_text(
+                playlist.read_text()
+                .replace("#EXTINF:6.0,", "#EXTINF:6.016,")
+                .replace("#EXT-X-ENDLIST", "#EXTINF:0.3,\n099.ts\n#EXT-X-ENDLIST")
+            )
+
+    monkeypatch.setattr(tasks.subprocess, "run", fake_run)
+    monkeypatch.setattr(tasks, "probe_has_audio", lambda src: True)
+
+    tasks.convert_to_hls(str(src))
+
+    audio = [cmd for cmd in calls if "-vn" in cmd]
+    assert len(audio) == 1 and "libx264" not in audio[0]
+    assert sum("-an" in cmd for cmd in calls) == 3
+
+    master = (tmp_path / "movie_hls_master.m3u8").read_text()
+    assert '#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aud"' in master
+    assert 'URI="audio/index.m3u8"' in master
+    assert master.count('AUDIO="aud"') == 3
+    assert 'CODECS="avc1.4d401f,mp4a.40.2"' in master
+    assert 'CODECS="avc1.64002a,mp4a.40.2"' in master
+    # Peak segment: 100 bytes in 4 s = 200 bit/s, for video plus audio
+    assert "BANDWIDTH=400," in master
+
+
+@pytest.mark.django_db
+def test_per_title_profile_for_simple_content(
+    enqueued, redis_conn, monkeypatch, settings, tmp_path
+):
+    """Easy-to-compress videos get a lower maxrate and a higher CRF."""
+    settings.TRANSCODE_REFERENCE_COMPLEXITY = 400
+    settings.MEDIA_ROOT = tmp_path
+    src = tmp_path / "talk.mp4"
+    src.write_bytes(b"x")
+    video = Video.objects.create(title="Talk", category="Talk", video_file="talk.mp4")
+    Video.objects.filter(pk=video.pk).update(duration=60)
+    job = TranscodeJob.objects.get(video=video)
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        if cmd[-2] == "h264":
+            # Probe encode at 100 kbit/s, a quarter of the reference
+            seconds = float(cmd[cmd.index("-t") + 1])
+            Path(cmd[-1]).write_bytes(b"x" * int(100_000 / 8 * seconds))
+        else:
+            fake_ffmpeg(cmd)
+
+    monkeypatch.setattr(tasks.subprocess, "run", fake_run)
+
+    tasks.convert_to_hls(str(src), job_id=job.pk)
+
+    assert sum(cmd[-2] == "h264" for cmd in calls) == 4
+    video.refresh_from_db()
+    assert video.encoding_profile["complexity"] == 100
+    ladder = video.encoding_profile["renditions"]
+    assert ladder["480p"] == {"crf": 24, "maxrate": "480k", "bufsize": "960k"}
+
+    encode = next(cmd for cmd in calls if "scale=-2:1080" in cmd)
+    assert encode[encode.index("-maxrate") + 1] == "2000k"
+    assert encode[encode.index("-crf") + 1] == "24"
+
+
+@pytest.mark.django_db
+def test_lowest_rendition_is_published_first(
+    enqueued, redis_conn, monkeypatch, settings, tmp_path
+):
+    """480p is encoded fast and playable first, then re-encoded at the end."""
+    settings.TRANSCODE_PUBLISH_EARLY = True
+    settings.MEDIA_ROOT = tmp_path
+    src = tmp_path / "new.mp4"
+    src.write_bytes(b"x")
+    video = Video.objects.create(title="New", category="News", video_file="new.mp4")
+    job = TranscodeJob.objects.get(video=video)
+    Video.objects.filter(pk=video.pk).update(duration=60)
+    seen = {"encodes": []}
+
+    def fake_run(cmd, **kwargs):
+        if "scale=-2:720" in cmd:
+            seen["master"] = (tmp_path / "new_hls_master.m3u8").read_text()
+            seen["ready"] = Video.objects.get(pk=video.pk).ready_renditions
+        if "-hls_time" in cmd:
+            vf, preset = cmd[cmd.index("-vf") + 1], cmd[cmd.index("-preset") + 1]
+            seen["encodes"].append(f"{vf} {preset}")
+        else:
+            seen["encodes"].append("analysis")
+        fake_ffmpeg(cmd)
+
+    monkeypatch.setattr(tasks.subprocess, "run", fake_run)
+
+    tasks.convert_to_hls(str(src), job_id=job.pk)
+
+    # The complexity analysis only starts once 480p is playable
+    assert seen["encodes"] == [
+        f"scale=-2:480 {settings.TRANSCODE_EARLY_PRESET}",
+        *["analysis"] * settings.TRANSCODE_ANALYSIS_SAMPLES,
+        "scale=-2:720 veryfast",
+        "scale=-2:1080 veryfast",
+        "scale=-2:480 veryfast",
+    ]
+    assert seen["ready"] == ["480p"]
+    assert "480p/index.m3u8" in seen["master"] and "720p" not in seen["master"]
+    video.refresh_from_db()
+    assert video.ready_renditions == ["480p", "720p", "1080p"]
+
+    # A retry keeps the final 480p encode
+    seen["encodes"].clear()
+    tasks.convert_to_hls(str(src), job_id=job.pk)
+    assert seen["encodes"] == []
+
+
+def test_renditions_must_share_segment_timeline(
+    redis_conn, monkeypatch, settings, tmp_path
+):
+    """Keyframes are forced on the configured grid; drift fails the rendition."""
+    settings.HLS_SEGMENT_SECONDS = 2
+    src = tmp_path / "clip.mp4"
+    src.write_bytes(b"x")
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append(cmd)
+        fake_ffmpeg(cmd)
+        if "scale=-2:1080" in cmd:
+            playlist = Path(cmd[-1])
+            playlist.write_text(
+                playlist.read_text().replace("#EXTINF:6.0,", "#EXTINF:5.5,")
+            )
+
+    monkeypatch.setattr(tasks.subprocess, "run", fake_run)
+
+    with pytest.raises(tasks.TranscodeError, match="segment 0 of 1080p ends at 5.500s"):
+        tasks.convert_to_hls(str(src))
+
+    for cmd in calls:
+        assert cmd[cmd.index("-hls_time") + 1] == "2"
+        assert cmd[cmd.index("-force_key_frames") + 1] == "expr:gte(t,n_forced*2)"
+
+    # The misaligned rendition is not published, and a retry encodes it again
+    assert not (tmp_path / "clip_hls_1080p").exists()
+    assert "1080p" not in (tmp_path / "clip_hls_master.m3u8").read_text()
+    calls.clear()
+    monkeypatch.setattr(
+        tasks.subprocess, "run", lambda cmd, **kw: calls.append(cmd) or fake_ffmpeg(cmd)
+    )
+    tasks.convert_to_hls(str(src))
+    assert [c[c.index("-vf") + 1] for c in calls] == ["scale=-2:1080"]
+
+
+def ts_packet(pid, payload=b"", start=False, keyframe=False):
+    """Build one MPEG-TS packet; keyframes carry the random access indicator."""
+    header = bytes([0x47, (0x40 if start else 0) | pid >> 8, pid & 0xFF])
+    header += bytes([0x30, 1, 0x40]) if keyframe else bytes([0x10])
+    return (header + payload).ljust(188, b"\xff")
+
+
+def video_pes(pts):
+    """Start of a video PES packet with a PTS (seconds)."""
+    t = round(pts * 90000)
+    stamp = bytes(
+        [
+            0x21 | (t >> 29) & 0x0E,
+            (t >> 22) & 0xFF,
+            (t >> 14) & 0xFE | 1,
+            (t >> 7) & 0xFF,
+            (t << 1) & 0xFE | 1,
+        ]
+    )
+    return b"\x00\x00\x01\xe0\x00\x00\x80\x80\x05" + stamp
+
+
+@pytest.mark.django_db
+def test_iframe_playlist_lists_keyframe_byte_ranges(
+    enqueued, redis_conn, settings, tmp_path
+):
+    """Keyframes become byte ranges that the segment view serves with 206."""
+    settings.MEDIA_ROOT = tmp_path
+    video = Video.objects.create(
+        title="Clip", category="Drama", video_file="videos/clip.mp4"
+    )
+    hls_dir = tmp_path / "videos" / "clip_hls_480p"
+    hls_dir.mkdir(parents=True)
+    pat = ts_packet(0, b"\x00pat", start=True)
+    (hls_dir / "000.ts").write_bytes(
+        pat
+        + ts_packet(256, video_pes(1.4), start=True, keyframe=True)
+        + ts_packet(256)
+        + ts_packet(257, b"\x00\x00\x01\xc0", start=True)  # audio
+        + ts_packet(256, video_pes(1.44), start=True)
+        + ts_packet(256, video_pes(3.4), start=True, keyframe=True)
+    )
+    (hls_dir / "001.ts").write_bytes(
+        pat + ts_packet(256, video_pes(7.4), start=True, keyframe=True)
+    )
+    (hls_dir / "index.m3u8").write_text(
+        hls.render_vod_playlist([(6.0, "000.ts"), (4.0, "001.ts")])
+    )
+
+    assert hls.write_iframe_playlist(hls_dir)
+    lines = (hls_dir / "iframes.m3u8").read_text().splitlines()
+    assert "#EXT-X-I-FRAMES-ONLY" in lines
+    ranges = [line for line in lines if line.startswith("#EXT-X-BYTERANGE")]
+    assert ranges == [
+        "#EXT-X-BYTERANGE:564@188",
+        "#EXT-X-BYTERANGE:188@940",
+        "#EXT-X-BYTERANGE:188@188",
+    ]
+    assert [line for line in lines if line.startswith("#EXTINF")] == [
+        "#EXTINF:2.000000,",
+        "#EXTINF:4.000000,",
+        "#EXTINF:4.000000,",
+    ]
+
+    client = auth_client()
+    playlist = client.get(reverse("video-iframes", args=[video.pk, "480p"]))
+    assert playlist.status_code == 200
+
+    url = reverse("video-segment", args=[video.pk, "480p", "000.ts"])
+    part = client.get(url, HTTP_RANGE="bytes=188-751")
+    assert part.status_code == 206
+    assert part["Content-Range"] == "bytes 188-751/1128"
+
+    async def body():
+        return b"".join([chunk async for chunk in part.streaming_content])
+
+    assert async_to_sync(body)()[:5] == bytes([0x47, 0x41, 0x00, 0x30, 1])
+    assert client.get(url, HTTP_RANGE="bytes=5000-").status_code == 416
+
+
+def test_convert_to_hls_writes_iframe_playlists_by_default(
+    redis_conn, monkeypatch, tmp_path
+):
+    """Without any setting, video renditions get an I-frame playlist."""
+    src = tmp_path / "movie.mp4"
+    src.write_bytes(b"x")
+
+    def fake_run(cmd, **kwargs):
+        fake_ffmpeg(cmd)
+        if "-hls_segment_filename" in cmd:
+            for n, segment in enumerate(sorted(Path(cmd[-1]).parent.glob("*.ts"))):
+                segment.write_bytes(
+                    ts_packet(0, b"\x00pat", start=True)
+                    + ts_packet(256, video_pes(1.4 + 6 * n), start=True, keyframe=True)
+                )
+
+    monkeypatch.setattr(tasks.subprocess, "run", fake_run)
+
+    tasks.convert_to_hls(str(src))
+
+    for res in ("480p", "720p", "1080p"):
+        assert (tmp_path / f"movie_hls_{res}" / "iframes.m3u8").is_file()
+    text = (tmp_path / "movie_hls_master.m3u8").read_text()
+    assert text.count("#EXT-X-I-FRAME-STREAM-INF:") == 3
+    assert 'URI="480p/iframes.m3u8"' in text
+
+
+def test_renditions_are_encoded_in_scratch_and_published_whole(
+    redis_conn, monkeypatch, settings, tmp_path
+):
+    """ffmpeg writes to the scratch dir; renditions appear in one rename."""
+    scratch = tmp_path / "scratch"
+    media = tmp_path / "media"
+    media.mkdir()
+    settings.TRANSCODE_SCRATCH_DIR = str(scratch)
+    src = media / "movie.mp4"
+    src.write_bytes(b"x")
+    (media / "movie_hls_1080p").mkdir()
+    (media / "movie_hls_1080p" / "stale.ts").write_bytes(b"old")
+
+    def fake_run(cmd, **kwargs):
+        assert Path(cmd[-1]).parent.parent == scratch
+        if "scale=-2:720" in cmd:
+            assert not (media / "movie_hls_720p").exists()
+        fake_ffmpeg(cmd)
+
+    # Scratch on another file system: the rendition is copied, then renamed
+    real_rename = os.rename
+
+    def rename(source, target):
+        if Path(source).parent == scratch:
+            raise OSError(errno.EXDEV, "cross-device link")
+        real_rename(source, target)
+
+    monkeypatch.setattr(tasks.subprocess, "run", fake_run)
+    monkeypatch.setattr(hls.os, "rename", rename)
+
+    tasks.convert_to_hls(str(src))
+
+    versions = set()
+    for res in ("480p", "720p", "1080p"):
+        published = media / f"movie_hls_{res}"
+        assert published.is_symlink()
+        versions.add(os.readlink(published))
+        assert sorted(p.name for p in published.iterdir()) == [
+            "000.ts",
+            "001.ts",
+            "index.m3u8",
+        ]
+    assert list(scratch.iterdir()) == []
+    assert {p.name for p in media.iterdir() if p.name.startswith(".")} == versions
+
+    # Republishing swaps the link; the rendition never disappears
+    published = media / "movie_hls_480p"
+    seen = []
+    real_replace = os.replace
+
+    def replace(source, target):
+        seen.append(published.exists())
+        real_replace(source, target)
+
+    monkeypatch.setattr(hls.os, "replace", replace)
+    new = scratch / "movie_hls_480p"
+    new.mkdir()
+    (new / "index.m3u8").write_text("#EXTM3U\n")
+    hls.publish_directory(new, published)
+
+    assert seen == [True]
+    assert [p.name for p in published.iterdir()] == ["index.m3u8"]
+    hidden = {p.name for p in media.iterdir() if p.name.startswith(".")}
+    assert len(hidden) == 3 and os.readlink(published) in hidden - versions